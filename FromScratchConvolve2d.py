@@ -1,31 +1,178 @@
 import numpy as np
-import matplotlib.pyplot as plt
-import cv2
-import kagglehub
-from FromScratchGaussianBlur import FromScratchGaussianBlur
-
-def myconvolve2d(img, kernel):
-    kernel_height = kernel.shape[0]
-    kernel_height_halved = int((kernel_height-1)/2)
-    kernel_width = kernel.shape[1]
-    kernel_width_halved = int((kernel_width-1)/2)
-    img = np.pad(img, ((kernel_height_halved, kernel_height_halved), 
-                    (kernel_width_halved, kernel_width_halved)), 
-                mode='constant', constant_values=0)
-    img_height = img.shape[0]
-    img_width = img.shape[1]
-    convolution = []
-    # start at row kernel_height_halved, end at row img_height-kernel_height_halved
-    for i in range(kernel_height_halved, img_height-kernel_height_halved):
-        lst = []
-        # start at col kernel_width_halved, end at col img_width-kernel_height_halved
-        for j in range(kernel_width_halved, img_width-kernel_width_halved):
-            lst.append((img[i-kernel_height_halved:i+kernel_height_halved+1,
-                            j-kernel_width_halved:j+kernel_width_halved+1] * kernel).sum().item())
-        convolution.append(lst)
-    return np.array(convolution)
+
+# Implementation behind myconvolve2d and FromScratchHarrisCorners: "numpy"
+# (vectorized taps, below) or "numba" (compiled, see FromScratchNumba)
+BACKENDS = ("numpy", "numba")
+_backend = "numpy"
+_numba_kernels = None
+
+# Arithmetic the from-scratch kernels run in. Throughput on large images is
+# bound by memory traffic, so the default halves it against float64:
+#   "float64": reference; matches the original implementation to rounding
+#   "float32": default; a few 1e-7 relative error against float64
+#   "fixed":   integer images with kernels that are integers up to a power of
+#              two (Sobel) are read as int16 and summed exactly in int32;
+#              other images and kernels (Gaussian) run as float32
+PRECISIONS = ("float64", "float32", "fixed")
+_precision = "float32"
+
+# Largest power-of-two kernel scale tried to make a kernel integer in "fixed"
+FIXED_MAX_SHIFT = 8
+# Image dtypes "fixed" reads as int16 without loss
+FIXED_IMAGE_DTYPES = (np.bool_, np.uint8, np.int8, np.int16)
+
+def set_backend(name):
+    """
+    Select the from-scratch kernel backend at runtime
+
+    Args:
+        name: "numpy", "numba", or "auto" for numba when it is installed
+
+    Returns:
+        Name of the backend now in use ("numpy" if numba was requested but
+        cannot be imported)
+    """
+    global _backend, _numba_kernels
+    if name not in BACKENDS + ("auto",):
+        raise ValueError(f"Unknown backend {name!r}, expected one of {BACKENDS + ('auto',)}")
+    if name != "numpy":
+        try:
+            import FromScratchNumba
+            _numba_kernels = FromScratchNumba
+            name = "numba"
+        except ImportError as e:
+            if name == "numba":
+                print(f"Warning: numba backend unavailable ({e}); using numpy")
+            name = "numpy"
+    _backend = name
+    return _backend
+
+def get_backend():
+    """Name of the from-scratch kernel backend in use"""
+    return _backend
+
+def set_precision(name):
+    """
+    Select the arithmetic of the from-scratch kernels at runtime
+
+    Args:
+        name: One of PRECISIONS
+
+    Returns:
+        Name of the precision now in use
+    """
+    global _precision
+    if name not in PRECISIONS:
+        raise ValueError(f"Unknown precision {name!r}, expected one of {PRECISIONS}")
+    _precision = name
+    return _precision
+
+def get_precision():
+    """Name of the from-scratch arithmetic in use"""
+    return _precision
+
+def working_dtype(precision=None):
+    """
+    Floating point dtype intermediate images are kept in
+
+    Args:
+        precision: One of PRECISIONS (default: the one in use)
+
+    Returns:
+        np.float64 for "float64", np.float32 otherwise
+    """
+    return np.float64 if (precision or _precision) == "float64" else np.float32
+
+def fixed_point_kernel(kernel, img=None):
+    """
+    Integer form of a kernel for fixed-point convolution
+
+    Args:
+        kernel: 2D kernel
+        img: Optional image; its dtype must be one of FIXED_IMAGE_DTYPES so
+            that the int32 sum cannot overflow
+
+    Returns:
+        Tuple of (int32 kernel, shift) with kernel == int_kernel / 2**shift,
+        or None if the kernel (or image) has no exact fixed-point form
+    """
+    if img is not None and img.dtype not in FIXED_IMAGE_DTYPES:
+        return None
+    for shift in range(FIXED_MAX_SHIFT + 1):
+        scaled = np.asarray(kernel, dtype=np.float64) * (1 << shift)
+        if np.all(scaled == np.round(scaled)):
+            # Every term of the sum fits int16 x kernel; the total fits int32
+            if np.abs(scaled).sum() * 32768 < 2 ** 31:
+                return scaled.astype(np.int32), shift
+            return None
+    return None
+
+def _tap_accumulate(img, kernel, dtype):
+    # Zero-padded correlation as one multiply-add of a shifted view per
+    # kernel tap: every pass streams the image once in the working dtype,
+    # instead of gathering a window per output pixel
+    kernel_height, kernel_width = kernel.shape
+    ry = (kernel_height - 1) // 2
+    rx = (kernel_width - 1) // 2
+    height, width = img.shape
+    padded = np.pad(img.astype(dtype, copy=False), ((ry, ry), (rx, rx)),
+                    mode='constant', constant_values=0)
+    convolution = np.zeros((height, width), dtype=dtype)
+    term = np.empty_like(convolution)
+    for u in range(kernel_height):
+        for v in range(kernel_width):
+            if kernel[u, v] != 0:
+                np.multiply(padded[u:u + height, v:v + width], kernel[u, v], out=term)
+                convolution += term
+    return convolution
+
+def myconvolve2d(img, kernel, precision=None):
+    """
+    Zero-padded 2D correlation with a same-size output
+
+    Args:
+        img: 2D image
+        kernel: 2D kernel with odd sides
+        precision: One of PRECISIONS (default: the one in use, see
+            set_precision)
+
+    Returns:
+        float64 image for "float64", float32 otherwise
+    """
+    precision = precision or _precision
+    dtype = working_dtype(precision)
+    img = np.asarray(img)
+    kernel = np.asarray(kernel)
+    if kernel.size == 0:
+        return np.zeros(img.shape, dtype=dtype)
+
+    fixed = fixed_point_kernel(kernel, img) if precision == "fixed" else None
+    if fixed is not None:
+        kernel, shift = fixed
+        img, accumulator = img.astype(np.int16, copy=False), np.int32
+    else:
+        kernel, accumulator = kernel.astype(dtype), dtype
+
+    if _backend == "numba":
+        convolution = _numba_kernels.convolve2d(img, kernel, accumulator)
+    else:
+        convolution = _tap_accumulate(img, kernel, accumulator)
+
+    if fixed is not None:
+        # Exact as float32 while the integer sums stay below 2**24, which
+        # 8-bit images with Sobel-sized kernels do by a wide margin
+        convolution = convolution.astype(np.float32)
+        if shift:
+            convolution *= np.float32(1.0 / (1 << shift))
+    return convolution
 
 if __name__ == "__main__":
+    # Only the demo needs these; importing the module stays numpy-only
+    import matplotlib.pyplot as plt
+    import cv2
+    import kagglehub
+    from FromScratchGaussianBlur import FromScratchGaussianBlur
+
     path = kagglehub.dataset_download("joosthazelzet/lego-brick-images")
     IMG_DIR = path + "/LEGO brick images v1/2357 Brick corner 1x2x2/"
     img = plt.imread(IMG_DIR + "/201706171206-0243.png", cv2.IMREAD_GRAYSCALE)
@@ -34,4 +181,4 @@ if __name__ == "__main__":
     sigmaX = 2.0
     gb = FromScratchGaussianBlur(ksize, sigmaX)
     print("Gaussian Blur")
-    plt.imsave("gaussian_blur.png", myconvolve2d(img, gb.kernel))
\ No newline at end of file
+    plt.imsave("gaussian_blur.png", myconvolve2d(img, gb.kernel))
@@ -1,7 +1,5 @@
 import math
 import numpy as np
-import matplotlib.pyplot as plt
-import cv2
 
 class FromScratchGaussianBlur():
     def __init__(self, ksize=(3,3), sigmaX=1.0):
@@ -46,6 +44,8 @@ def myGaussianKernel(ksize=(3,3), sigmaX=1.0):
     # return kernel_np/sum
     
 if __name__ == "__main__":
+    import cv2
+
     kernel_height = 5
     kernel_width = 5
     sigmaX = 2.0
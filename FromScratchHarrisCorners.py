@@ -1,8 +1,5 @@
 import numpy as np
-import matplotlib.pyplot as plt
-import cv2
-from scipy.signal import convolve2d
-from FromScratchConvolve2d import myconvolve2d
+from FromScratchConvolve2d import get_backend, myconvolve2d, working_dtype
 from FromScratchGaussianBlur import FromScratchGaussianBlur
 from FromScratchSobel import FromScratchSobel
 
@@ -22,6 +19,15 @@ class FromScratchHarrisCorners():
     def getCorners(self):
         gaussian_blur = FromScratchGaussianBlur(self.ksize_gaussian, self.sigmaX)
         sobel = FromScratchSobel(self.ksize_sobel, self.alpha)
+        if get_backend() == "numba":
+            # One fused pass; there are no intermediate images to print.
+            # Its gradients of 8-bit images are exact in float32 already, so
+            # "fixed" runs it in float32
+            from FromScratchNumba import harris_response
+            self.corners = harris_response(self.img, sobel.Gx, sobel.Gy, gaussian_blur.kernel,
+                                           dtype=working_dtype())
+            return self.corners
+
         print("sobel_x", sobel.Gx)
         print("sobel_y", sobel.Gy)
 
@@ -47,6 +53,10 @@ class FromScratchHarrisCorners():
         return self.corners
 
     def show_corners(self):
+        # Plotting dependencies are only needed here
+        import matplotlib.pyplot as plt
+        import cv2
+
         img = cv2.cvtColor(self.img, cv2.COLOR_GRAY2RGB)
         for i in range(self.img.shape[0]):
             for j in range(self.img.shape[1]):
@@ -60,6 +70,8 @@ class FromScratchHarrisCorners():
         return self.corners
 
 if __name__ == "__main__":
+    import cv2
+
     img = cv2.imread("/Users/anvay-coder/document-scanner/bbc.jpg", cv2.IMREAD_GRAYSCALE)
     ksize_sobel = (3,3)
     ksize_gaussian = (3,3)
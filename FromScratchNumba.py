@@ -0,0 +1,131 @@
+import numpy as np
+from numba import njit, prange
+
+# Rows of Harris response computed per parallel task. Each task keeps the
+# gradient products for its rows (plus the window halo) in a small buffer
+# that stays in cache, instead of five full-size intermediate images.
+HARRIS_BAND_ROWS = 32
+
+
+@njit(cache=True)
+def _accumulate_row(acc, row, kernel_row, rx):
+    # acc[j] += sum_v row[j + v - rx] * kernel_row[v], one tap at a
+    # time so the inner loop runs over contiguous memory and vectorizes
+    w = acc.shape[0]
+    for v in range(kernel_row.shape[0]):
+        k = kernel_row[v]
+        shift = v - rx
+        for j in range(max(0, -shift), min(w, w - shift)):
+            acc[j] += row[j + shift] * k
+
+
+@njit(parallel=True, cache=True)
+def _convolve2d(img, kernel, out):
+    h, w = img.shape
+    kh, kw = kernel.shape
+    ry = (kh - 1) // 2
+    rx = (kw - 1) // 2
+    for i in prange(h):
+        # Zero padding: rows and columns outside the image are skipped
+        for u in range(max(0, ry - i), min(kh, h - i + ry)):
+            _accumulate_row(out[i], img[i + u - ry], kernel[u], rx)
+    return out
+
+
+@njit(parallel=True, cache=True)
+def _harris_response(img, gx_kernel, gy_kernel, window, band, out):
+    h, w = img.shape
+    sh = gx_kernel.shape[0]
+    sry = (sh - 1) // 2
+    srx = (gx_kernel.shape[1] - 1) // 2
+    wh = window.shape[0]
+    wry = (wh - 1) // 2
+    wrx = (window.shape[1] - 1) // 2
+    n_bands = (h + band - 1) // band
+    for b in prange(n_bands):
+        r0 = b * band
+        r1 = min(h, r0 + band)
+        # Product rows the window needs for this band
+        p0 = max(0, r0 - wry)
+        p1 = min(h, r1 + wry)
+        # Buffers in the output's dtype (float32 halves their traffic)
+        ixx = np.empty((p1 - p0, w), out.dtype)
+        iyy = np.empty((p1 - p0, w), out.dtype)
+        ixy = np.empty((p1 - p0, w), out.dtype)
+        gx = np.empty(w, out.dtype)
+        gy = np.empty(w, out.dtype)
+        sxx = np.empty(w, out.dtype)
+        syy = np.empty(w, out.dtype)
+        sxy = np.empty(w, out.dtype)
+
+        # Pass 1: both gradients and their products, row by row
+        for i in range(p0, p1):
+            gx[:] = 0.0
+            gy[:] = 0.0
+            for u in range(max(0, sry - i), min(sh, h - i + sry)):
+                row = img[i + u - sry]
+                _accumulate_row(gx, row, gx_kernel[u], srx)
+                _accumulate_row(gy, row, gy_kernel[u], srx)
+            for j in range(w):
+                ixx[i - p0, j] = gx[j] * gx[j]
+                iyy[i - p0, j] = gy[j] * gy[j]
+                ixy[i - p0, j] = gx[j] * gy[j]
+
+        # Pass 2: window all three products and form det(M)
+        for i in range(r0, r1):
+            sxx[:] = 0.0
+            syy[:] = 0.0
+            sxy[:] = 0.0
+            for u in range(max(0, wry - i), min(wh, h - i + wry)):
+                y = i + u - wry - p0
+                _accumulate_row(sxx, ixx[y], window[u], wrx)
+                _accumulate_row(syy, iyy[y], window[u], wrx)
+                _accumulate_row(sxy, ixy[y], window[u], wrx)
+            for j in range(w):
+                out[i, j] = sxx[j] * syy[j] - sxy[j] * sxy[j]
+
+
+def convolve2d(img, kernel, dtype=np.float64):
+    """
+    Compiled equivalent of myconvolve2d (zero-padded correlation, same size
+    output), parallel over rows
+
+    Args:
+        img: 2D image
+        kernel: 2D kernel with odd sides
+        dtype: Accumulator and output dtype; np.int32 for fixed point, with
+            an integer image and kernel
+
+    Returns:
+        Image of the same shape as img
+    """
+    out = np.zeros(img.shape, dtype=dtype)
+    if np.size(kernel) == 0:
+        return out
+    _convolve2d(np.ascontiguousarray(img), np.ascontiguousarray(kernel, dtype=dtype), out)
+    return out
+
+
+def harris_response(img, gx_kernel, gy_kernel, window, band=HARRIS_BAND_ROWS, dtype=np.float64):
+    """
+    Compiled equivalent of FromScratchHarrisCorners.getCorners: gradients,
+    their products, the windowed sums and det(M) fused per band of rows
+
+    Args:
+        img: 2D image
+        gx_kernel, gy_kernel: Gradient kernels (e.g. FromScratchSobel Gx, Gy)
+        window: Window kernel (e.g. FromScratchGaussianBlur kernel)
+        band: Rows per parallel task
+        dtype: Floating point dtype of the buffers and the result
+
+    Returns:
+        Response image of the same shape as img
+    """
+    if np.size(window) == 0:
+        return np.zeros(img.shape, dtype=dtype)
+    out = np.empty(img.shape, dtype=dtype)
+    _harris_response(np.ascontiguousarray(img),
+                     np.ascontiguousarray(gx_kernel, dtype=dtype),
+                     np.ascontiguousarray(gy_kernel, dtype=dtype),
+                     np.ascontiguousarray(window, dtype=dtype), band, out)
+    return out
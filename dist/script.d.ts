@@ -51,6 +51,33 @@ declare class CVUtils {
     static nonMaximumSuppression(corners: Corner[], radius: number): Corner[];
     static gaussianBlur(imageData: ImageData, kernelSize?: number, sigma?: number): ImageData;
 }
+interface BackendResult {
+    frameId: number;
+    status: number;
+    processingMs: number;
+    corners: Point[] | null;
+}
+declare class BackendDetector {
+    static readonly FRAME_HEADER_SIZE = 9;
+    static readonly RESULT_HEADER_SIZE = 9;
+    static readonly FLAG_GATE = 1;
+    static readonly STATUS_OK = 0;
+    static readonly STATUS_DROPPED = 2;
+    private socket;
+    private canvas;
+    private ctx;
+    private nextFrameId;
+    private inFlight;
+    private readonly maxInFlight;
+    private readonly width;
+    private scale;
+    latest: BackendResult | null;
+    constructor(url: string, width?: number);
+    get connected(): boolean;
+    submit(video: HTMLVideoElement): boolean;
+    private onResult;
+    close(): void;
+}
 declare class DocumentScanner {
     private video;
     private overlayCanvas;
@@ -64,6 +91,7 @@ declare class DocumentScanner {
     private toggleDetectionBtn;
     private resultsContainer;
     stream: MediaStream | null;
+    private backend;
     private detectionEnabled;
     private isProcessing;
     private documentCount;
@@ -78,6 +106,8 @@ declare class DocumentScanner {
     private startDetectionLoop;
     private detectCorners;
     private drawColoredCorners;
+    closeBackend(): void;
+    private drawDocumentQuad;
     private drawDocumentOutline;
     private captureDocument;
     private createDocumentItem;
@@ -168,9 +168,91 @@ class CVUtils {
         return this.convolve2D(imageData, kernel);
     }
 }
+// Streams downscaled grayscale frames to the Python backend (src/ws_server.py)
+// and keeps the latest detected document corners
+class BackendDetector {
+    constructor(url, width = 480) {
+        this.nextFrameId = 0;
+        this.inFlight = 0;
+        this.maxInFlight = 2;
+        this.scale = 1;
+        this.latest = null;
+        this.width = width;
+        this.canvas = document.createElement('canvas');
+        this.ctx = this.canvas.getContext('2d', { willReadFrequently: true });
+        this.socket = new WebSocket(url);
+        this.socket.binaryType = 'arraybuffer';
+        this.socket.onmessage = (event) => this.onResult(event.data);
+        this.socket.onclose = () => { this.inFlight = 0; };
+    }
+    get connected() {
+        return this.socket.readyState === WebSocket.OPEN;
+    }
+    submit(video) {
+        // Drop frames here too: never queue more than maxInFlight on the socket
+        if (!this.connected || this.inFlight >= this.maxInFlight)
+            return false;
+        this.scale = video.videoWidth / this.width;
+        const height = Math.round(video.videoHeight / this.scale);
+        if (this.canvas.width !== this.width || this.canvas.height !== height) {
+            this.canvas.width = this.width;
+            this.canvas.height = height;
+        }
+        this.ctx.drawImage(video, 0, 0, this.width, height);
+        const rgba = this.ctx.getImageData(0, 0, this.width, height).data;
+        // Header (frame id, width, height, flags) followed by one byte per pixel
+        const message = new ArrayBuffer(BackendDetector.FRAME_HEADER_SIZE + this.width * height);
+        const header = new DataView(message, 0, BackendDetector.FRAME_HEADER_SIZE);
+        header.setUint32(0, this.nextFrameId++, true);
+        header.setUint16(4, this.width, true);
+        header.setUint16(6, height, true);
+        header.setUint8(8, BackendDetector.FLAG_GATE);
+        const gray = new Uint8Array(message, BackendDetector.FRAME_HEADER_SIZE);
+        for (let i = 0, j = 0; j < gray.length; i += 4, j++) {
+            gray[j] = (77 * rgba[i] + 150 * rgba[i + 1] + 29 * rgba[i + 2]) >> 8;
+        }
+        this.socket.send(message);
+        this.inFlight++;
+        return true;
+    }
+    onResult(data) {
+        this.inFlight = Math.max(0, this.inFlight - 1);
+        const view = new DataView(data);
+        const status = view.getUint8(4);
+        // A dropped frame carries no corners; keep showing the last real result
+        if (status === BackendDetector.STATUS_DROPPED)
+            return;
+        let corners = null;
+        if (status === BackendDetector.STATUS_OK && data.byteLength >= BackendDetector.RESULT_HEADER_SIZE + 32) {
+            corners = [];
+            for (let k = 0; k < 4; k++) {
+                const offset = BackendDetector.RESULT_HEADER_SIZE + 8 * k;
+                corners.push({
+                    x: view.getFloat32(offset, true) * this.scale,
+                    y: view.getFloat32(offset + 4, true) * this.scale
+                });
+            }
+        }
+        this.latest = {
+            frameId: view.getUint32(0, true),
+            status,
+            processingMs: view.getUint32(5, true) / 1000,
+            corners
+        };
+    }
+    close() {
+        this.socket.close();
+    }
+}
+BackendDetector.FRAME_HEADER_SIZE = 9;
+BackendDetector.RESULT_HEADER_SIZE = 9;
+BackendDetector.FLAG_GATE = 1;
+BackendDetector.STATUS_OK = 0;
+BackendDetector.STATUS_DROPPED = 2;
 class DocumentScanner {
     constructor() {
         this.stream = null;
+        this.backend = null;
         this.detectionEnabled = true;
         this.isProcessing = false;
         this.documentCount = 0;
@@ -197,6 +279,11 @@ class DocumentScanner {
         this.captureBtn = document.getElementById('capture');
         this.toggleDetectionBtn = document.getElementById('toggle-detection');
         this.resultsContainer = document.getElementById('results-container');
+        // Optional Python backend, e.g. index.html?backend=ws://localhost:8765
+        const backendUrl = new URLSearchParams(window.location.search).get('backend');
+        if (backendUrl) {
+            this.backend = new BackendDetector(backendUrl);
+        }
         this.initializeEventListeners();
         this.initializeParameterControls();
         this.showMessage('Document scanner ready! Custom computer vision algorithms loaded.', 'success');
@@ -265,6 +352,16 @@ class DocumentScanner {
             this.frameCount++;
             // Clear overlay
             this.overlayCtx.clearRect(0, 0, this.overlayCanvas.width, this.overlayCanvas.height);
+            // Let the Python backend detect the document when it is connected
+            if (this.backend?.connected) {
+                this.backend.submit(this.video);
+                const result = this.backend.latest;
+                if (result?.corners) {
+                    this.drawDocumentQuad(result.corners);
+                }
+                this.updatePerformanceInfo(result ? result.processingMs : 0, result?.corners ? 4 : 0);
+                return;
+            }
             // Draw video frame to hidden canvas for processing
             this.hiddenCtx.drawImage(this.video, 0, 0, this.hiddenCanvas.width, this.hiddenCanvas.height);
             // Get image data
@@ -341,6 +438,25 @@ class DocumentScanner {
         this.overlayCtx.textAlign = 'left';
         this.overlayCtx.fillText(`Corners detected: ${corners.length}`, 20, 35);
     }
+    closeBackend() {
+        this.backend?.close();
+    }
+    drawDocumentQuad(corners) {
+        this.overlayCtx.strokeStyle = '#00FFFF';
+        this.overlayCtx.lineWidth = 3;
+        this.overlayCtx.beginPath();
+        corners.forEach((corner, index) => {
+            if (index === 0) {
+                this.overlayCtx.moveTo(corner.x, corner.y);
+            }
+            else {
+                this.overlayCtx.lineTo(corner.x, corner.y);
+            }
+        });
+        this.overlayCtx.closePath();
+        this.overlayCtx.stroke();
+        this.drawColoredCorners(corners.map(corner => ({ ...corner, response: 0 })));
+    }
     drawDocumentOutline(edgeImageData) {
         const { width, height, data } = edgeImageData;
         // Use configurable parameters
@@ -637,5 +753,6 @@ document.addEventListener('DOMContentLoaded', () => {
 // Handle page unload to clean up camera stream
 window.addEventListener('beforeunload', () => {
     scanner?.stream?.getTracks().forEach(track => track.stop());
+    scanner?.closeBackend();
 });
 //# sourceMappingURL=script.js.map
\ No newline at end of file
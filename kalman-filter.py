@@ -1,3 +1,5 @@
+import warnings
+
 import numpy as np
 class KalmanFilter:
     def __init__(self, F, B, H, Q, R, x0, P0):
@@ -9,6 +11,8 @@ class KalmanFilter:
         self.R = R
         self.x = x0
         self.P = P0
+        # identity matrix of dim(P), built once
+        self.I = np.eye(P0.shape[0])
 
     def predict(self, u):
         # x = F*x + B*u
@@ -21,16 +25,164 @@ class KalmanFilter:
         # calculate Kalman gain
         # S = H*P*H^T + R
         S = np.dot(np.dot(self.H, self.P), self.H.T) + self.R
-        # K = P*H^T*S^-1
-        K = np.dot(np.dot(self.P, self.H.T), np.linalg.inv(S))
+        # K = P*H^T*S^-1, solved as (S^-1 * H*P^T)^T since S is symmetric
+        K = np.linalg.solve(S, np.dot(self.H, self.P.T)).T
         # update state estimate and cov matrix
         # y = z - H*x
         y = z - np.dot(self.H, self.x)
         # x = x + K*y
         self.x = self.x + np.dot(K, y)
-        # get identity matrix of dim(P)
-        I = np.eye(self.P.shape[0])
         # P = ((I - K*H) * P) * (I - (K*H)^T) + K*R*K^T
-        self.P = np.dot(np.dot(I - np.dot(K, self.H), self.P), 
-                        (I - np.dot(K, self.H)).T) + np.dot(np.dot(K, self.R), K.T)
+        A = self.I - np.dot(K, self.H)
+        self.P = np.dot(np.dot(A, self.P), A.T) + np.dot(np.dot(K, self.R), K.T)
+        return self.x
+
+
+def steady_state_gain(F, H, Q, R, tol=1e-9, max_iter=10000):
+    """
+    Iterate the Riccati recursion until the Kalman gain stops changing
+
+    Args:
+        F, H, Q, R: Constant model matrices shared by every track
+        tol: Convergence threshold on the change in predicted covariance
+        max_iter: Maximum number of iterations
+
+    Returns:
+        Tuple of (K, P) with the steady-state gain (n, m) and the
+        steady-state predicted covariance (n, n); a RuntimeWarning is
+        issued if the recursion has not converged after max_iter steps
+    """
+    n = F.shape[0]
+    I = np.eye(n)
+    P = np.array(Q, dtype=float)
+    change = np.inf
+    for _ in range(max_iter):
+        S = H @ P @ H.T + R
+        K = np.linalg.solve(S, H @ P.T).T
+        A = I - K @ H
+        P_post = A @ P @ A.T + K @ R @ K.T
+        P_next = F @ P_post @ F.T + Q
+        change = np.abs(P_next - P).max()
+        if change < tol:
+            return K, P_next
+        P = P_next
+    warnings.warn(f"Riccati recursion did not converge in {max_iter} iterations "
+                  f"(last change {change:.3g}, tol {tol:g}); "
+                  "the model may be unobservable or unstable", RuntimeWarning, stacklevel=2)
+    return K, P
+
+
+class BatchedKalmanFilter:
+    """
+    N independent Kalman filters stored as stacked arrays
+
+    States are held as x (N, n) and covariances as P (N, n, n), and every
+    predict/update advances all tracks with batched matmul. Model matrices
+    may be shared (2-D) or given per track (3-D, leading dimension N).
+
+    With steady_state=True the model matrices must be shared, the gain is
+    precomputed once with steady_state_gain and covariances are no longer
+    propagated, so each step is a single batched matrix-vector product.
+    """
+
+    def __init__(self, F, B, H, Q, R, x0, P0=None, steady_state=False):
+        self.F = np.asarray(F, dtype=float)
+        self.B = None if B is None else np.asarray(B, dtype=float)
+        self.H = np.asarray(H, dtype=float)
+        self.Q = np.asarray(Q, dtype=float)
+        self.R = np.asarray(R, dtype=float)
+        self.x = np.array(x0, dtype=float, ndmin=2)
+        n = self.x.shape[1]
+        self.I = np.eye(n)
+        self.steady_state = steady_state
+
+        if steady_state:
+            if any(m.ndim != 2 for m in (self.F, self.H, self.Q, self.R)):
+                raise ValueError("steady_state requires F, H, Q and R shared by all tracks")
+            self.K, self.P_steady = steady_state_gain(self.F, self.H, self.Q, self.R)
+            self.P = None
+        else:
+            self.K = None
+            P0 = self.I if P0 is None else np.asarray(P0, dtype=float)
+            self.P = np.broadcast_to(P0, (len(self.x), n, n)).copy()
+
+    def __len__(self):
+        return len(self.x)
+
+    def add_tracks(self, x0, P0=None):
+        """
+        Append new tracks
+
+        Args:
+            x0: Initial states, shape (k, n)
+            P0: Initial covariance, (n, n) or (k, n, n); identity if None
+
+        Returns:
+            Indices of the new tracks
+        """
+        x0 = np.array(x0, dtype=float, ndmin=2)
+        start = len(self.x)
+        self.x = np.concatenate([self.x, x0])
+        if not self.steady_state:
+            n = self.x.shape[1]
+            P0 = self.I if P0 is None else np.asarray(P0, dtype=float)
+            self.P = np.concatenate([self.P, np.broadcast_to(P0, (len(x0), n, n))])
+        return np.arange(start, len(self.x))
+
+    def remove_tracks(self, indices):
+        """
+        Drop tracks; the remaining tracks keep their relative order
+
+        Args:
+            indices: Indices of the tracks to remove
+        """
+        self.x = np.delete(self.x, indices, axis=0)
+        if not self.steady_state:
+            self.P = np.delete(self.P, indices, axis=0)
+
+    def predict(self, u=None):
+        # x = F*x + B*u, for all tracks at once
+        self.x = (self.F @ self.x[..., None])[..., 0]
+        if u is not None:
+            self.x += (self.B @ np.asarray(u, dtype=float)[..., None])[..., 0]
+        # P = F*P*F^T + Q
+        if not self.steady_state:
+            self.P = self.F @ self.P @ np.swapaxes(self.F, -1, -2) + self.Q
         return self.x
+
+    def update(self, z, mask=None):
+        """
+        Incorporate measurements z (N, m); tracks where mask is False are
+        left untouched (e.g. corners not seen in this frame)
+        """
+        z = np.asarray(z, dtype=float)
+        if mask is not None:
+            idx = np.flatnonzero(mask)
+            self.x[idx], P = self._update(self.x[idx], None if self.P is None else self.P[idx],
+                                          z[idx], idx)
+            if P is not None:
+                self.P[idx] = P
+        else:
+            self.x, self.P = self._update(self.x, self.P, z, slice(None))
+        return self.x
+
+    def _update(self, x, P, z, idx):
+        # per-track model matrices follow the selected tracks
+        H = self.H if self.H.ndim == 2 else self.H[idx]
+        R = self.R if self.R.ndim == 2 else self.R[idx]
+        # y = z - H*x
+        y = z - (H @ x[..., None])[..., 0]
+        if self.steady_state:
+            return x + y @ self.K.T, None
+        Ht = np.swapaxes(H, -1, -2)
+        # S = H*P*H^T + R
+        S = H @ P @ Ht + R
+        # K = P*H^T*S^-1, solved as (S^-1 * H*P^T)^T since S and P are symmetric
+        K = np.swapaxes(np.linalg.solve(S, H @ P), -1, -2)
+        # x = x + K*y
+        x = x + (K @ y[..., None])[..., 0]
+        # P = (I - K*H) * P * (I - K*H)^T + K*R*K^T
+        A = self.I - K @ H
+        Kt = np.swapaxes(K, -1, -2)
+        P = A @ P @ np.swapaxes(A, -1, -2) + K @ R @ Kt
+        return x, P
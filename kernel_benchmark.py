@@ -0,0 +1,326 @@
+import contextlib
+import io
+import json
+import os
+import time
+import numpy as np
+import cv2
+from FromScratchConvolve2d import (PRECISIONS, get_backend, get_precision, myconvolve2d,
+                                   set_backend, set_precision)
+from FromScratchGaussianBlur import myGaussianKernel
+from FromScratchSobel import FromScratchSobel
+from FromScratchHarrisCorners import FromScratchHarrisCorners
+
+# Maximum allowed error, relative to the largest magnitude in the OpenCV
+# result. uint8 is loose because cv2.GaussianBlur rounds to integers.
+TOLERANCES = {
+    "uint8": 5e-3,
+    "float32": 1e-4,
+    "float64": 1e-7,
+}
+
+# Maximum allowed error of each precision against the float64 from-scratch
+# result of the same op, relative to its largest magnitude. This is the
+# accuracy each mode of FromScratchConvolve2d.set_precision guarantees;
+# "fixed" is exact where it applies and float32 elsewhere.
+PRECISION_TOLERANCES = {
+    "float64": 0.0,
+    "float32": 1e-6,
+    "fixed": 1e-6,
+}
+
+# Kernel sizes an op has an OpenCV counterpart for (other ops run at every
+# requested size)
+KERNEL_SIZES = {
+    "sobel": (3,),
+}
+
+
+def make_test_image(size, dtype="uint8", seed=0):
+    """
+    Build a deterministic test image with texture and a few strong corners
+
+    Args:
+        size: Side length of the square image
+        dtype: Name of the numpy dtype to return (values stay in 0-255)
+        seed: Random seed for the texture
+
+    Returns:
+        Image of shape (size, size)
+    """
+    rng = np.random.default_rng(seed)
+    img = rng.integers(0, 64, size=(size, size)).astype(np.float64)
+    img = cv2.GaussianBlur(img, (5, 5), 0)
+    # Bright rectangle gives the Harris detectors real corners to agree on
+    img[size // 4:3 * size // 4, size // 3:2 * size // 3] += 160
+    return np.clip(img, 0, 255).astype(dtype)
+
+
+def time_call(fn, repeats=3):
+    """
+    Time a callable, returning the median of several runs
+
+    Args:
+        fn: Zero-argument callable to time
+        repeats: Number of timed runs (after one warm-up run)
+
+    Returns:
+        Tuple of (median_seconds, last_result)
+    """
+    result = fn()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)), result
+
+
+def _harris_from_scratch(img, ksize):
+    # FromScratchHarrisCorners prints every intermediate array
+    with contextlib.redirect_stdout(io.StringIO()):
+        return FromScratchHarrisCorners(img, (3, 3), (ksize, ksize), sigmaX=1).corners
+
+
+def _harris_opencv(img, ksize):
+    # det(M) with a Gaussian window, matching FromScratchHarrisCorners:
+    # cv2.cornerHarris would sum the gradient products over a box window
+    img = np.asarray(img, dtype=np.float64)
+    ix = cv2.Sobel(img, cv2.CV_64F, 1, 0, ksize=3, scale=0.5, borderType=cv2.BORDER_CONSTANT)
+    iy = cv2.Sobel(img, cv2.CV_64F, 0, 1, ksize=3, scale=0.5, borderType=cv2.BORDER_CONSTANT)
+
+    def window(product):
+        return cv2.GaussianBlur(product, (ksize, ksize), 1, borderType=cv2.BORDER_CONSTANT)
+
+    return window(ix * ix) * window(iy * iy) - window(ix * iy) ** 2
+
+
+def _ddepth(img):
+    # OpenCV cannot filter float32 into float64, so keep float32 at float32
+    return cv2.CV_32F if img.dtype == np.float32 else cv2.CV_64F
+
+
+def _normalize(response):
+    peak = np.abs(response).max()
+    return response / peak if peak > 0 else response
+
+
+def kernel_ops():
+    """
+    From-scratch operations paired with their OpenCV counterparts
+
+    Each entry maps an op name to (from_scratch_fn, opencv_fn, normalize),
+    where both functions take (img, ksize). When normalize is True the two
+    responses are compared after scaling each by its own peak, because the
+    detectors only agree up to a constant factor. Ops listed in
+    KERNEL_SIZES only run at those kernel sizes.
+
+    Returns:
+        Dictionary of op name to (from_scratch_fn, opencv_fn, normalize)
+    """
+    random_kernels = {}
+
+    def random_kernel(ksize):
+        # Asymmetric kernel so a flipped (true convolution) result would fail
+        if ksize not in random_kernels:
+            rng = np.random.default_rng(ksize)
+            random_kernels[ksize] = rng.normal(size=(ksize, ksize))
+        return random_kernels[ksize]
+
+    return {
+        "convolve2d": (
+            lambda img, k: myconvolve2d(img, random_kernel(k)),
+            lambda img, k: cv2.filter2D(img, _ddepth(img), random_kernel(k),
+                                        borderType=cv2.BORDER_CONSTANT),
+            False,
+        ),
+        # The from-scratch Sobel kernel is OpenCV's 3x3 Sobel scaled by 1/2;
+        # larger from-scratch kernels are i/(i^2+j^2), which OpenCV has no
+        # counterpart for
+        "sobel": (
+            lambda img, k: myconvolve2d(img, FromScratchSobel((k, k)).Gx),
+            lambda img, k: cv2.Sobel(img, _ddepth(img), 1, 0, ksize=k, scale=0.5,
+                                     borderType=cv2.BORDER_CONSTANT),
+            False,
+        ),
+        "gaussian_blur": (
+            lambda img, k: myconvolve2d(img, myGaussianKernel((k, k), 1.0)),
+            lambda img, k: cv2.GaussianBlur(img, (k, k), 1.0,
+                                            borderType=cv2.BORDER_CONSTANT),
+            False,
+        ),
+        "harris": (
+            lambda img, k: _harris_from_scratch(img, k),
+            _harris_opencv,
+            True,
+        ),
+    }
+
+
+def available_backends():
+    """
+    From-scratch backends that can run here
+
+    Returns:
+        Tuple of backend names ("numpy", plus "numba" when installed)
+    """
+    previous = get_backend()
+    backends = tuple(dict.fromkeys(["numpy", set_backend("auto")]))
+    set_backend(previous)
+    return backends
+
+
+def run_benchmarks(image_sizes=(32, 64, 128), kernel_sizes=(3, 5),
+                   dtypes=("uint8", "float32", "float64"), ops=None, repeats=3,
+                   backends=("numpy",), precisions=PRECISIONS):
+    """
+    Time every from-scratch op against OpenCV and measure their agreement
+
+    Args:
+        image_sizes: Square image side lengths to test
+        kernel_sizes: Odd kernel sizes to test
+        dtypes: Input dtype names to test
+        ops: Optional list of op names to restrict the run to
+        repeats: Timed runs per case
+        backends: From-scratch backends to run (see available_backends)
+        precisions: From-scratch precisions to run; each is also checked
+            against float64 (see PRECISION_TOLERANCES)
+
+    Returns:
+        List of result dictionaries, one per (backend, op, size, ksize,
+        dtype, precision) case
+    """
+    previous = get_backend(), get_precision()
+    try:
+        return [row for backend in backends
+                for row in _run_backend(backend, image_sizes, kernel_sizes, dtypes, ops, repeats,
+                                        precisions)]
+    finally:
+        set_backend(previous[0])
+        set_precision(previous[1])
+
+
+def _run_backend(backend, image_sizes, kernel_sizes, dtypes, ops, repeats, precisions):
+    if set_backend(backend) != backend:
+        return []
+    rows = []
+    for name, (mine, reference, normalize) in kernel_ops().items():
+        if ops is not None and name not in ops:
+            continue
+        for size in image_sizes:
+            for ksize in kernel_sizes:
+                if ksize not in KERNEL_SIZES.get(name, (ksize,)):
+                    continue
+                for dtype in dtypes:
+                    img = make_test_image(size, dtype)
+                    ref_s, ref_out = time_call(lambda: reference(img, ksize), repeats)
+                    ref_out = np.asarray(ref_out, dtype=np.float64)
+                    set_precision("float64")
+                    exact = np.asarray(mine(img, ksize), dtype=np.float64)
+                    for precision in precisions:
+                        set_precision(precision)
+                        mine_s, mine_out = time_call(lambda: mine(img, ksize), repeats)
+                        error, precision_error = _errors(mine_out, ref_out, exact, normalize)
+                        tolerance = max(TOLERANCES[dtype], PRECISION_TOLERANCES[precision])
+                        rows.append({
+                            "backend": backend,
+                            "op": name,
+                            "image_size": size,
+                            "kernel_size": ksize,
+                            "dtype": dtype,
+                            "precision": precision,
+                            "from_scratch_ms": mine_s * 1000,
+                            "opencv_ms": ref_s * 1000,
+                            "slowdown": mine_s / ref_s if ref_s > 0 else float("inf"),
+                            "max_rel_error": error,
+                            "tolerance": tolerance,
+                            "passed": bool(error <= tolerance),
+                            "precision_error": precision_error,
+                            "precision_tolerance": PRECISION_TOLERANCES[precision],
+                            "precision_passed": bool(precision_error <= PRECISION_TOLERANCES[precision]),
+                        })
+    return rows
+
+
+def _errors(mine_out, ref_out, exact, normalize):
+    # Relative errors against OpenCV and against the float64 from-scratch result
+    mine_out = np.asarray(mine_out, dtype=np.float64)
+    if normalize:
+        mine_out, ref_out, exact = _normalize(mine_out), _normalize(ref_out), _normalize(exact)
+    return (float(np.abs(mine_out - ref_out).max() / max(1.0, np.abs(ref_out).max())),
+            float(np.abs(mine_out - exact).max() / max(1.0, np.abs(exact).max())))
+
+
+def assert_parity(rows, ops=None):
+    """
+    Raise AssertionError if any benchmarked case exceeded its tolerance
+    against OpenCV or its precision's tolerance against float64
+
+    Args:
+        rows: Results from run_benchmarks
+        ops: Optional list of op names to check (defaults to all)
+    """
+    failures = [r for r in rows if not (r["passed"] and r["precision_passed"])
+                and (ops is None or r["op"] in ops)]
+    assert not failures, "Parity failures:\n" + "\n".join(
+        f"  {r['op']} size={r['image_size']} k={r['kernel_size']} {r['dtype']} {r['precision']}: "
+        f"error {r['max_rel_error']:.2e} (tolerance {r['tolerance']:.0e}), "
+        f"vs float64 {r['precision_error']:.2e} (tolerance {r['precision_tolerance']:.0e})"
+        for r in failures)
+
+
+def print_report(rows):
+    """
+    Print a benchmark table, a per-op readiness summary and the accuracy of
+    each precision
+
+    Args:
+        rows: Results from run_benchmarks
+    """
+    print(f"{'backend':<8}{'op':<14}{'size':>6}{'k':>4}{'dtype':>9}{'precision':>10}{'scratch ms':>12}"
+          f"{'opencv ms':>11}{'slowdown':>10}{'rel err':>10}{'vs f64':>10}  parity")
+    print("-" * 112)
+    for r in rows:
+        print(f"{r['backend']:<8}{r['op']:<14}{r['image_size']:>6}{r['kernel_size']:>4}{r['dtype']:>9}"
+              f"{r['precision']:>10}{r['from_scratch_ms']:>12.3f}{r['opencv_ms']:>11.3f}"
+              f"{r['slowdown']:>9.0f}x{r['max_rel_error']:>10.1e}{r['precision_error']:>10.1e}  "
+              f"{'PASS' if r['passed'] and r['precision_passed'] else 'FAIL'}")
+
+    print("\nReadiness:")
+    for backend, op in dict.fromkeys((r["backend"], r["op"]) for r in rows):
+        op_rows = [r for r in rows if r["backend"] == backend and r["op"] == op]
+        passed = sum(r["passed"] for r in op_rows)
+        worst = max(r["slowdown"] for r in op_rows)
+        status = "ready" if passed == len(op_rows) else "NOT ready"
+        print(f"  {op} [{backend}]: {status} ({passed}/{len(op_rows)} cases within tolerance, "
+              f"up to {worst:.0f}x slower than OpenCV)")
+
+    print("\nPrecision (largest error against float64, relative to the peak):")
+    for precision in dict.fromkeys(r["precision"] for r in rows):
+        worst = {}
+        for r in rows:
+            if r["precision"] == precision:
+                worst[r["op"]] = max(worst.get(r["op"], 0.0), r["precision_error"])
+        within = all(r["precision_passed"] for r in rows if r["precision"] == precision)
+        print(f"  {precision}: " + ", ".join(f"{op} {error:.1e}" for op, error in worst.items())
+              + ("" if within else "  (exceeds PRECISION_TOLERANCES)"))
+
+
+def save_report(rows, output_path="kernel_benchmark_results/kernel_benchmark.json"):
+    """
+    Save benchmark results as JSON
+
+    Args:
+        rows: Results from run_benchmarks
+        output_path: Destination JSON file
+    """
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    rows = run_benchmarks(backends=available_backends())
+    print_report(rows)
+    save_report(rows)
+    assert_parity(rows)
@@ -1,31 +1,347 @@
 import cv2
 import numpy as np
 import os
-import matplotlib.pyplot as plt
 import json
+from collections.abc import Sequence
 
+# Hyperparameters recorded in every summary entry
+PARAM_NAMES = ['blur_kernel', 'canny_low', 'canny_high', 'epsilon_factor', 'min_area']
 
-def analyze_results(base_output_dir="hyperparameter_results"):
+# Columns loaded per summary file, keyed by path and invalidated by mtime/size
+_COLUMNS_CACHE = {}
+
+# Longest side of the thumbnails drawn in the visualization grids
+THUMBNAIL_SIZE = 480
+
+
+def _summary_columns(results):
     """
-    Analyze and visualize hyperparameter tuning results
+    Convert parsed summary entries into columnar numpy arrays
     
     Args:
-        base_output_dir: Directory containing hyperparameter results
+        results: List of summary dictionaries
     
     Returns:
-        Sorted results by performance
+        Dictionary of column name to array, one row per entry
+    """
+    n = len(results)
+    columns = {
+        'num_quadrilaterals': np.fromiter((r['num_quadrilaterals'] for r in results),
+                                          dtype=np.int64, count=n),
+        'combination': np.fromiter((r.get('combination', 0) for r in results),
+                                   dtype=np.int64, count=n),
+        'directory': np.array([r['directory'] or "" for r in results], dtype=str),
+    }
+    for param in PARAM_NAMES:
+        columns[param] = np.array([r['parameters'][param] for r in results])
+    if n and 'image' in results[0]:
+        columns['image'] = np.array([r['image'] for r in results], dtype=str)
+    return columns
+
+
+def load_results(base_output_dir="hyperparameter_results"):
+    """
+    Load a hyperparameter summary once into columnar arrays
+    
+    Parsing the JSON is the slow part for large sweeps, so the columns are
+    kept in memory and also stored next to the summary as summary_columns.npz.
+    Both are reused until the summary file changes.
+    
+    Args:
+        base_output_dir: Directory containing hyperparameter_summary.json
+    
+    Returns:
+        Dictionary of column name to array, or None if there is no summary
     """
-    # Load summary
     summary_file = os.path.join(base_output_dir, "hyperparameter_summary.json")
     if not os.path.exists(summary_file):
+        return None
+    
+    stat = os.stat(summary_file)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    cached = _COLUMNS_CACHE.get(summary_file)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    
+    columns_file = os.path.join(base_output_dir, "summary_columns.npz")
+    columns = None
+    if os.path.exists(columns_file):
+        with np.load(columns_file) as data:
+            if tuple(data['_stamp']) == stamp:
+                columns = {key: data[key] for key in data.files if key != '_stamp'}
+    
+    if columns is None:
+        with open(summary_file, "r") as f:
+            columns = _summary_columns(json.load(f))
+        try:
+            np.savez(columns_file, _stamp=np.array(stamp), **columns)
+        except OSError:
+            # Read-only result directories still work, just without the disk cache
+            pass
+    
+    _COLUMNS_CACHE[summary_file] = (stamp, columns)
+    return columns
+
+
+def result_rows(columns, indices):
+    """
+    Rebuild summary dictionaries for selected rows
+    
+    Args:
+        columns: Columns from load_results()
+        indices: Row indices
+    
+    Returns:
+        List of dictionaries in the hyperparameter_summary.json format
+    """
+    rows = []
+    for i in indices:
+        row = {
+            'combination': int(columns['combination'][i]),
+            'parameters': {param: columns[param][i].item() for param in PARAM_NAMES},
+            'num_quadrilaterals': int(columns['num_quadrilaterals'][i]),
+            'directory': str(columns['directory'][i]),
+        }
+        if 'image' in columns:
+            row['image'] = str(columns['image'][i])
+        rows.append(row)
+    return rows
+
+
+def top_k(values, k):
+    """
+    Indices of the k largest values, largest first
+    
+    Selects with argpartition and only sorts the k winners. Ties keep
+    their original order, exactly like a stable sort in descending order.
+    
+    Args:
+        values: 1D array
+        k: Number of indices to return
+    
+    Returns:
+        int array of at most k indices
+    """
+    values = np.asarray(values)
+    n = len(values)
+    if k >= n:
+        return np.argsort(-values, kind='stable')
+    if k <= 0:
+        return np.array([], dtype=np.intp)
+    
+    kth = values[np.argpartition(values, n - k)[n - k]]
+    above = np.flatnonzero(values > kth)
+    ties = np.flatnonzero(values == kth)[:k - len(above)]
+    chosen = np.concatenate([above, ties])
+    return chosen[np.argsort(-values[chosen], kind='stable')]
+
+
+class SortedResults(Sequence):
+    """
+    Summary entries ordered best first, built only when accessed
+    
+    Holds the columns and the row order instead of one dictionary per row,
+    which dominates the cost of a multi-million-row sweep. Indexing and
+    iteration rebuild just the rows touched (see result_rows). A leading
+    slice such as results[:10] is selected with top_k; anything else sorts
+    the whole column once.
+    """
+    
+    def __init__(self, columns, metric='num_quadrilaterals'):
+        self.columns = columns
+        self.metric = metric
+        self._order = None
+    
+    @property
+    def order(self):
+        """Row indices, best first (stable for ties)"""
+        if self._order is None:
+            self._order = top_k(self.columns[self.metric], len(self))
+        return self._order
+    
+    def __len__(self):
+        return len(self.columns[self.metric])
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if self._order is None and start == 0 and step == 1:
+                return result_rows(self.columns, top_k(self.columns[self.metric], stop))
+            return result_rows(self.columns, self.order[index])
+        return result_rows(self.columns, [self.order[index]])[0]
+    
+    def __iter__(self):
+        for i in self.order:
+            yield result_rows(self.columns, [i])[0]
+
+
+def group_stats(columns, param, metric='num_quadrilaterals'):
+    """
+    Per-value aggregates of a metric, grouped by one hyperparameter
+    
+    Args:
+        columns: Columns from load_results()
+        param: Hyperparameter to group by
+        metric: Column to aggregate
+    
+    Returns:
+        Dictionary with 'values', 'count', 'mean' and 'std' arrays
+    """
+    values, inverse = np.unique(columns[param], return_inverse=True)
+    metric_values = columns[metric].astype(np.float64)
+    count = np.bincount(inverse, minlength=len(values))
+    total = np.bincount(inverse, weights=metric_values, minlength=len(values))
+    total_sq = np.bincount(inverse, weights=metric_values ** 2, minlength=len(values))
+    
+    mean = total / np.maximum(count, 1)
+    std = np.sqrt(np.maximum(total_sq / np.maximum(count, 1) - mean ** 2, 0.0))
+    return {'values': values, 'count': count, 'mean': mean, 'std': std}
+
+
+def parameter_effects(columns, metric='num_quadrilaterals'):
+    """
+    group_stats() for every hyperparameter
+    
+    Args:
+        columns: Columns from load_results()
+        metric: Column to aggregate
+    
+    Returns:
+        Dictionary of parameter name to group_stats() results
+    """
+    return {param: group_stats(columns, param, metric) for param in PARAM_NAMES}
+
+
+def group_values(columns, param, metric='num_quadrilaterals'):
+    """
+    Metric values of every row, grouped by one hyperparameter
+    
+    Args:
+        columns: Columns from load_results()
+        param: Hyperparameter to group by
+        metric: Column to group
+    
+    Returns:
+        Dictionary of parameter value to list of metric values, with values
+        in order of first appearance and rows in summary order
+    """
+    values, first, inverse = np.unique(columns[param], return_index=True, return_inverse=True)
+    rows = np.argsort(inverse, kind='stable')
+    groups = np.split(columns[metric][rows], np.cumsum(np.bincount(inverse))[:-1])
+    return {values[k].item(): groups[k].tolist() for k in np.argsort(first)}
+
+
+def interaction_stats(columns, param_a, param_b, metric='num_quadrilaterals'):
+    """
+    Mean of a metric for every pair of values of two hyperparameters
+    
+    Args:
+        columns: Columns from load_results()
+        param_a: Hyperparameter along the rows
+        param_b: Hyperparameter along the columns
+        metric: Column to aggregate
+    
+    Returns:
+        Dictionary with 'values_a', 'values_b', and 'count' and 'mean'
+        arrays of shape (len(values_a), len(values_b))
+    """
+    values_a, ia = np.unique(columns[param_a], return_inverse=True)
+    values_b, ib = np.unique(columns[param_b], return_inverse=True)
+    shape = (len(values_a), len(values_b))
+    cell = ia * shape[1] + ib
+    
+    count = np.bincount(cell, minlength=shape[0] * shape[1])
+    total = np.bincount(cell, weights=columns[metric].astype(np.float64),
+                        minlength=shape[0] * shape[1])
+    mean = np.where(count > 0, total / np.maximum(count, 1), np.nan)
+    return {'values_a': values_a, 'values_b': values_b,
+            'count': count.reshape(shape), 'mean': mean.reshape(shape)}
+
+
+def load_thumbnail(image_path, max_size=THUMBNAIL_SIZE):
+    """
+    Small RGB version of a result image, cached on disk next to it
+    
+    The JPEG is decoded at reduced resolution (IMREAD_REDUCED_COLOR_*) so
+    large result images are never materialized at full size.
+    
+    Args:
+        image_path: Path to the full-size image
+        max_size: Longest side of the thumbnail
+    
+    Returns:
+        RGB image, or None if the image does not exist
+    """
+    if not os.path.exists(image_path):
+        return None
+    
+    root, ext = os.path.splitext(image_path)
+    thumb_path = f"{root}_thumb{max_size}{ext}"
+    if (os.path.exists(thumb_path)
+            and os.path.getmtime(thumb_path) >= os.path.getmtime(image_path)):
+        img = cv2.imread(thumb_path)
+    else:
+        # Decode at 1/8 first; small images are decoded again at the largest
+        # reduction that still covers max_size
+        img = cv2.imread(image_path, cv2.IMREAD_REDUCED_COLOR_8)
+        if img is None:
+            return None
+        if max(img.shape[:2]) < max_size:
+            factor = 8 * max(img.shape[:2]) // max_size
+            flag = (cv2.IMREAD_REDUCED_COLOR_4 if factor >= 4 else
+                    cv2.IMREAD_REDUCED_COLOR_2 if factor >= 2 else cv2.IMREAD_COLOR)
+            img = cv2.imread(image_path, flag)
+        scale = max_size / max(img.shape[:2])
+        if scale < 1:
+            img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        cv2.imwrite(thumb_path, img)
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+
+def _plot_result_grid(base_output_dir, rows, output_name, dpi):
+    import matplotlib.pyplot as plt
+    
+    fig, axes = plt.subplots(2, 3, figsize=(18, 12))
+    axes = axes.flatten()
+    
+    for i, result in enumerate(rows[:len(axes)]):
+        img_rgb = load_thumbnail(os.path.join(base_output_dir, result['directory'], "contours.jpg"))
+        if img_rgb is not None:
+            axes[i].imshow(img_rgb)
+            axes[i].set_title(f"Rank {i+1}: {result['num_quadrilaterals']} quads\n"
+                            f"blur={result['parameters']['blur_kernel']}, "
+                            f"canny={result['parameters']['canny_low']}-{result['parameters']['canny_high']}\n"
+                            f"eps={result['parameters']['epsilon_factor']}, "
+                            f"area={result['parameters']['min_area']}")
+        else:
+            axes[i].text(0.5, 0.5, f"Image not found\n{result['directory']}",
+                       ha='center', va='center', transform=axes[i].transAxes)
+        axes[i].axis('off')
+    
+    plt.tight_layout()
+    plt.savefig(os.path.join(base_output_dir, output_name), dpi=dpi, bbox_inches='tight')
+    plt.show()
+
+
+def analyze_results(base_output_dir="hyperparameter_results", dpi=100):
+    """
+    Analyze and visualize hyperparameter tuning results
+    
+    Args:
+        base_output_dir: Directory containing hyperparameter results
+        dpi: Resolution of the saved parameter_effects.png
+    
+    Returns:
+        SortedResults, ordered by number of quadrilaterals found. It is a
+        read-only Sequence of the same dictionaries the sorted list used to
+        hold, built as they are accessed; list() it where a list is needed
+    """
+    columns = load_results(base_output_dir)
+    if columns is None:
         print("No summary file found. Run hyperparameter tuning first.")
         return []
     
-    with open(summary_file, "r") as f:
-        results = json.load(f)
-    
-    # Sort by number of quadrilaterals found
-    sorted_results = sorted(results, key=lambda x: x['num_quadrilaterals'], reverse=True)
+    sorted_results = SortedResults(columns)
     
     print("Top 10 hyperparameter combinations:")
     print("=" * 80)
@@ -35,147 +351,75 @@ def analyze_results(base_output_dir="hyperparameter_results"):
         print(f"   Parameters: {result['parameters']}")
         print()
     
-    # Create visualization of parameter effects
-    param_effects = {}
-    for param in ['blur_kernel', 'canny_low', 'canny_high', 'epsilon_factor', 'min_area']:
-        param_effects[param] = {}
-        for result in results:
-            value = result['parameters'][param]
-            if value not in param_effects[param]:
-                param_effects[param][value] = []
-            param_effects[param][value].append(result['num_quadrilaterals'])
-    
     # Plot parameter effects
+    import matplotlib.pyplot as plt
     fig, axes = plt.subplots(2, 3, figsize=(15, 10))
     axes = axes.flatten()
     
-    for i, (param, values) in enumerate(param_effects.items()):
-        if i < len(axes):
-            param_values = sorted(values.keys())
-            avg_quads = [np.mean(values[v]) for v in param_values]
-            
-            axes[i].bar(range(len(param_values)), avg_quads)
-            axes[i].set_title(f'Effect of {param}')
-            axes[i].set_xlabel(param)
-            axes[i].set_ylabel('Avg. Quadrilaterals Found')
-            axes[i].set_xticks(range(len(param_values)))
-            axes[i].set_xticklabels(param_values)
+    for i, param in enumerate(PARAM_NAMES):
+        stats = group_stats(columns, param)
+        axes[i].bar(range(len(stats['values'])), stats['mean'])
+        axes[i].set_title(f'Effect of {param}')
+        axes[i].set_xlabel(param)
+        axes[i].set_ylabel('Avg. Quadrilaterals Found')
+        axes[i].set_xticks(range(len(stats['values'])))
+        axes[i].set_xticklabels(stats['values'])
     
     # Remove empty subplot
-    if len(param_effects) < len(axes):
+    if len(PARAM_NAMES) < len(axes):
         fig.delaxes(axes[-1])
     
     plt.tight_layout()
-    plt.savefig(os.path.join(base_output_dir, "parameter_effects.png"), dpi=300, bbox_inches='tight')
+    plt.savefig(os.path.join(base_output_dir, "parameter_effects.png"), dpi=dpi, bbox_inches='tight')
     plt.show()
     
     return sorted_results
 
 
-def visualize_top_results(base_output_dir="hyperparameter_results", top_n=6):
+def visualize_top_results(base_output_dir="hyperparameter_results", top_n=6, dpi=100):
     """
     Visualize results from the top N hyperparameter combinations
     
     Args:
         base_output_dir: Directory containing hyperparameter results
         top_n: Number of top results to visualize
+        dpi: Resolution of the saved figure
     """
-    # Check if summary file exists
-    summary_file = os.path.join(base_output_dir, "hyperparameter_summary.json")
-    if not os.path.exists(summary_file):
-        print(f"Summary file not found: {summary_file}")
+    columns = load_results(base_output_dir)
+    if columns is None:
+        print(f"Summary file not found: {os.path.join(base_output_dir, 'hyperparameter_summary.json')}")
         print("Please run hyperparameter tuning first!")
         return
     
-    # Load summary
-    with open(summary_file, "r") as f:
-        results = json.load(f)
-    
-    # Sort by number of quadrilaterals found
-    sorted_results = sorted(results, key=lambda x: x['num_quadrilaterals'], reverse=True)
-    
-    # Create visualization
-    fig, axes = plt.subplots(2, 3, figsize=(18, 12))
-    axes = axes.flatten()
-    
-    for i, result in enumerate(sorted_results[:top_n]):
-        if i < len(axes):
-            # Load contours image
-            img_path = os.path.join(base_output_dir, result['directory'], "contours.jpg")
-            if os.path.exists(img_path):
-                img = cv2.imread(img_path)
-                img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-                
-                axes[i].imshow(img_rgb)
-                axes[i].set_title(f"Rank {i+1}: {result['num_quadrilaterals']} quads\n"
-                                f"blur={result['parameters']['blur_kernel']}, "
-                                f"canny={result['parameters']['canny_low']}-{result['parameters']['canny_high']}\n"
-                                f"eps={result['parameters']['epsilon_factor']}, "
-                                f"area={result['parameters']['min_area']}")
-                axes[i].axis('off')
-            else:
-                axes[i].text(0.5, 0.5, f"Image not found\n{result['directory']}", 
-                           ha='center', va='center', transform=axes[i].transAxes)
-                axes[i].axis('off')
-    
-    plt.tight_layout()
-    plt.savefig(os.path.join(base_output_dir, "top_results_visualization.png"), dpi=300, bbox_inches='tight')
-    plt.show()
+    top = result_rows(columns, top_k(columns['num_quadrilaterals'], top_n))
+    _plot_result_grid(base_output_dir, top, "top_results_visualization.png", dpi)
 
 
-def visualize_quick_results(base_output_dir="quick_test_results"):
+def visualize_quick_results(base_output_dir="quick_test_results", dpi=100):
     """
     Visualize results from the quick hyperparameter test
     
     Args:
         base_output_dir: Directory containing quick test results
+        dpi: Resolution of the saved figure
     """
-    summary_file = os.path.join(base_output_dir, "hyperparameter_summary.json")
-    if not os.path.exists(summary_file):
-        print(f"Summary file not found: {summary_file}")
+    columns = load_results(base_output_dir)
+    if columns is None:
+        print(f"Summary file not found: {os.path.join(base_output_dir, 'hyperparameter_summary.json')}")
         return
     
-    with open(summary_file, "r") as f:
-        results = json.load(f)
-    
-    # Sort by number of quadrilaterals found
-    sorted_results = sorted(results, key=lambda x: x['num_quadrilaterals'], reverse=True)
+    top = result_rows(columns, top_k(columns['num_quadrilaterals'], 6))
     
     print("Top 5 results from quick test:")
     print("=" * 60)
-    for i, result in enumerate(sorted_results[:5]):
+    for i, result in enumerate(top[:5]):
         print(f"{i+1}. Quadrilaterals: {result['num_quadrilaterals']}")
         print(f"   Parameters: {result['parameters']}")
         print(f"   Directory: {result['directory']}")
         print()
     
     # Create visualization of top 6 results
-    fig, axes = plt.subplots(2, 3, figsize=(18, 12))
-    axes = axes.flatten()
-    
-    for i, result in enumerate(sorted_results[:6]):
-        if i < len(axes):
-            # Load contours image
-            img_path = os.path.join(base_output_dir, result['directory'], "contours.jpg")
-            if os.path.exists(img_path):
-                img = cv2.imread(img_path)
-                img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-                
-                axes[i].imshow(img_rgb)
-                axes[i].set_title(f"Rank {i+1}: {result['num_quadrilaterals']} quads\n"
-                                f"blur={result['parameters']['blur_kernel']}, "
-                                f"canny={result['parameters']['canny_low']}-{result['parameters']['canny_high']}\n"
-                                f"eps={result['parameters']['epsilon_factor']}, "
-                                f"area={result['parameters']['min_area']}")
-                axes[i].axis('off')
-            else:
-                axes[i].text(0.5, 0.5, "Image not found", 
-                           ha='center', va='center', transform=axes[i].transAxes)
-                axes[i].axis('off')
-    
-    plt.tight_layout()
-    plt.savefig(os.path.join(base_output_dir, "quick_test_visualization.png"), dpi=300, bbox_inches='tight')
-    plt.show()
+    _plot_result_grid(base_output_dir, top, "quick_test_visualization.png", dpi)
 
 
 def compare_hyperparameter_effects(base_output_dir="hyperparameter_results"):
@@ -184,34 +428,41 @@ def compare_hyperparameter_effects(base_output_dir="hyperparameter_results"):
     
     Args:
         base_output_dir: Directory containing hyperparameter results
+    
+    Returns:
+        Dictionary of parameter name to {value: [quadrilateral counts]};
+        parameter_effects() gives the same grouping as columnar statistics
     """
-    summary_file = os.path.join(base_output_dir, "hyperparameter_summary.json")
-    if not os.path.exists(summary_file):
+    columns = load_results(base_output_dir)
+    if columns is None:
         print("No summary file found. Run hyperparameter tuning first.")
         return
     
-    with open(summary_file, "r") as f:
-        results = json.load(f)
-    
-    # Create parameter effect analysis
-    param_stats = {}
-    for param in ['blur_kernel', 'canny_low', 'canny_high', 'epsilon_factor', 'min_area']:
-        param_stats[param] = {}
-        for result in results:
-            value = result['parameters'][param]
-            if value not in param_stats[param]:
-                param_stats[param][value] = []
-            param_stats[param][value].append(result['num_quadrilaterals'])
+    param_stats = parameter_effects(columns)
     
     # Calculate statistics
     print("Parameter Effect Analysis:")
     print("=" * 50)
     
-    for param, values in param_stats.items():
+    for param, stats in param_stats.items():
         print(f"\n{param.upper()}:")
-        for value, quad_counts in values.items():
-            mean_quads = np.mean(quad_counts)
-            std_quads = np.std(quad_counts)
+        for value, mean_quads, std_quads in zip(stats['values'], stats['mean'], stats['std']):
             print(f"  {value}: {mean_quads:.2f} ± {std_quads:.2f} quadrilaterals")
     
-    return param_stats
+    # Strongest pairwise interaction: largest spread of the pair means
+    # beyond what the two parameters explain on their own
+    best = None
+    for a in range(len(PARAM_NAMES)):
+        for b in range(a + 1, len(PARAM_NAMES)):
+            inter = interaction_stats(columns, PARAM_NAMES[a], PARAM_NAMES[b])
+            additive = (param_stats[PARAM_NAMES[a]]['mean'][:, None]
+                        + param_stats[PARAM_NAMES[b]]['mean'][None, :]
+                        - columns['num_quadrilaterals'].mean())
+            strength = np.nanmax(np.abs(inter['mean'] - additive))
+            if best is None or strength > best[0]:
+                best = (strength, PARAM_NAMES[a], PARAM_NAMES[b])
+    if best is not None:
+        print(f"\nStrongest interaction: {best[1]} x {best[2]} "
+              f"(±{best[0]:.2f} quadrilaterals beyond the individual effects)")
+    
+    return {param: group_values(columns, param) for param in PARAM_NAMES}
@@ -0,0 +1,162 @@
+import cv2
+import numpy as np
+import json
+import threading
+from collections import OrderedDict
+
+# Undistortion grids kept per profile; a 12 MP grid is about 96 MB
+DEFAULT_MAX_MAPS = 4
+
+
+class CameraProfile:
+    """
+    Intrinsics and lens distortion of one camera.
+
+    The profile is measured once (e.g. with cv2.calibrateCamera) at a
+    reference resolution and rescaled to whatever resolution frames arrive
+    at. Undistortion grids are cached per resolution in a small LRU shared
+    by all threads, so a camera streaming at a fixed size builds its grid
+    once.
+    """
+
+    def __init__(self, camera_matrix, dist_coeffs, image_size, name="camera",
+                 max_maps=DEFAULT_MAX_MAPS):
+        """
+        Args:
+            camera_matrix: 3x3 intrinsic matrix at the reference resolution
+            dist_coeffs: OpenCV distortion coefficients (k1, k2, p1, p2[, k3...])
+            image_size: Reference resolution as (width, height)
+            name: Identifier for the camera
+            max_maps: Number of resolutions whose undistortion grid is kept
+        """
+        self.camera_matrix = np.asarray(camera_matrix, dtype=np.float64)
+        self.dist_coeffs = np.asarray(dist_coeffs, dtype=np.float64).ravel()
+        self.image_size = (int(image_size[0]), int(image_size[1]))
+        self.name = name
+        self.max_maps = max_maps
+        self._maps = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Ship only the calibration to worker processes; they build their
+        # own grids
+        state = self.__dict__.copy()
+        state["_maps"] = OrderedDict()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a profile saved with save()
+
+        Args:
+            path: JSON file path
+
+        Returns:
+            CameraProfile
+        """
+        with open(path, "r") as f:
+            data = json.load(f)
+        return cls(data["camera_matrix"], data["dist_coeffs"], data["image_size"],
+                   data.get("name", "camera"))
+
+    def save(self, path):
+        """
+        Save the profile as JSON
+
+        Args:
+            path: JSON file path
+        """
+        with open(path, "w") as f:
+            json.dump({
+                "name": self.name,
+                "camera_matrix": self.camera_matrix.tolist(),
+                "dist_coeffs": self.dist_coeffs.tolist(),
+                "image_size": list(self.image_size),
+            }, f, indent=2)
+
+    def scaled_matrix(self, size):
+        """
+        Intrinsic matrix for frames of the given resolution
+
+        Args:
+            size: Frame resolution as (width, height)
+
+        Returns:
+            3x3 intrinsic matrix
+        """
+        sx = size[0] / self.image_size[0]
+        sy = size[1] / self.image_size[1]
+        return self.camera_matrix * np.array([[sx], [sy], [1.0]])
+
+    def undistort_map(self, size):
+        """
+        Grid giving, for every undistorted pixel, its position in the raw frame
+
+        Args:
+            size: Frame resolution as (width, height)
+
+        Returns:
+            float32 array of shape (height, width, 2), cached per resolution
+        """
+        size = (int(size[0]), int(size[1]))
+        with self._lock:
+            grid = self._maps.get(size)
+            if grid is not None:
+                self._maps.move_to_end(size)
+                return grid
+
+        # Built outside the lock; two threads racing on a new size both
+        # build it and the second result wins
+        K = self.scaled_matrix(size)
+        grid, _ = cv2.initUndistortRectifyMap(K, self.dist_coeffs, None, K, size, cv2.CV_32FC2)
+        with self._lock:
+            self._maps[size] = grid
+            self._maps.move_to_end(size)
+            while len(self._maps) > self.max_maps:
+                self._maps.popitem(last=False)
+        return grid
+
+    def undistort_points(self, points, size):
+        """
+        Map raw (distorted) pixel coordinates to undistorted pixel coordinates
+
+        Args:
+            points: Array of shape (N, 2)
+            size: Frame resolution as (width, height)
+
+        Returns:
+            float32 array of shape (N, 2)
+        """
+        K = self.scaled_matrix(size)
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 1, 2)
+        return cv2.undistortPoints(points, K, self.dist_coeffs, P=K).reshape(-1, 2).astype(np.float32)
+
+    def rectify(self, image, M, out_size, interpolation=cv2.INTER_LINEAR):
+        """
+        Undistort and perspective-warp in a single resampling of the image
+
+        The homography M is defined in undistorted coordinates. Warping the
+        cached undistortion grid with M gives, for every output pixel, where
+        to sample the raw frame, so only the output-sized grid is built per
+        page and the frame itself is resampled once.
+
+        Args:
+            image: Raw (distorted) frame
+            M: 3x3 perspective matrix from undistorted frame to output
+            out_size: Output size as (width, height)
+            interpolation: Interpolation used when sampling the frame
+
+        Returns:
+            Rectified output image
+        """
+        h, w = image.shape[:2]
+        grid = cv2.warpPerspective(self.undistort_map((w, h)), M, tuple(out_size),
+                                   flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT,
+                                   borderValue=(-1, -1))
+        return cv2.remap(image, grid, None, interpolation, borderMode=cv2.BORDER_CONSTANT)
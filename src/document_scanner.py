@@ -1,6 +1,32 @@
+import os
+import threading
+import time
 import cv2
 import numpy as np
-import matplotlib.pyplot as plt
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from .edge_params import DEFAULT_EDGE_PARAMS, EDGE_PARAM_CACHE, estimate_edge_params
+from .frame import as_frame
+from .frame_gate import gate_frame
+from .line_quad import find_line_quad, outline_support
+from .output import open_document, pack_page, save_page
+from .scheduler import SCAN_STAGE_MIX, iter_plan, resolve_plan, run_plan
+from .sources import (DEFAULT_PREFETCH_ITEMS, as_source_list, common_root, iter_images, prefetch,
+                      source_stem, unique_stem)
+from .workspace import as_workspace, workspace_buffer
+from . import geometry
+
+# How far find_document_corners had to fall back to find a document outline
+FALLBACK_QUAD = 0            # 4-point contour at the normal approximation
+FALLBACK_RELAXED = 1         # 4-point contour at the relaxed approximation
+FALLBACK_MIN_AREA_RECT = 2   # Rotated bounding box of the largest contour
+FALLBACK_INSET = 3           # No contour at all: fixed inset of the frame
+FALLBACK_LEVELS = ("quad", "relaxed", "min_area_rect", "inset")
+
+# Per-process count of detections per fallback level (see fallback_stats);
+# updated from scan threads, so only touched under _FALLBACK_LOCK
+FALLBACK_COUNTS = Counter()
+_FALLBACK_LOCK = threading.Lock()
 
 
 def find_edges(img):
@@ -8,14 +34,16 @@ def find_edges(img):
     Simple edge detection function
     
     Args:
-        img: Input image
+        img: Input image or Frame
         
     Returns:
         gray_img, img_blur, edge_img: Processed images
     """
-    gray_img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    img_blur = cv2.GaussianBlur(gray_img, (3, 3), 0)
-    edge_img = cv2.Canny(img, 100, 200)
+    frame = as_frame(img)
+    gray_img = frame.gray
+    img_blur = frame.blurred((3, 3), 0)
+    # Canny on the color image uses the strongest gradient across channels
+    edge_img = frame.cached(("canny_color", 100, 200), lambda: cv2.Canny(frame.image, 100, 200))
     edge_img = cv2.cvtColor(edge_img, cv2.COLOR_GRAY2BGR)
     return gray_img, img_blur, edge_img
 
@@ -30,18 +58,9 @@ def order_corners(pts):
     Returns:
         Ordered corner points
     """
-    rect = np.zeros((4, 2), dtype=np.float32)
-    
-    # Sum and difference of coordinates
-    s = pts.sum(axis=1)
-    diff = np.diff(pts, axis=1)
-    
-    rect[0] = pts[np.argmin(s)]      # Top-left (smallest sum)
-    rect[2] = pts[np.argmax(s)]      # Bottom-right (largest sum)
-    rect[1] = pts[np.argmin(diff)]   # Top-right (smallest diff)
-    rect[3] = pts[np.argmax(diff)]   # Bottom-left (largest diff)
-    
-    return rect
+    # Top-left has the smallest x+y, bottom-right the largest; top-right has
+    # the smallest y-x, bottom-left the largest (see geometry.order_corners)
+    return geometry.order_corners(pts)[0]
 
 
 def distance(p1, p2):
@@ -57,55 +76,193 @@ def distance(p1, p2):
     return np.sqrt((p1[0] - p2[0])**2 + (p1[1] - p2[1])**2)
 
 
-def document_scanner(image, debug=False):
+def warp_document(image, corners, size=None, M=None, fast_path_tolerance=0.005, info=None,
+                  camera=None, workspace=None):
     """
-    Document scanner that detects paper corners within the image.
+    Warp a document quadrilateral to a rectangle and binarize it
+    
+    Nearly axis-aligned quads (flatbeds, overhead rigs) are cropped as a
+    zero-copy view and parallelograms such as rotated pages use warpAffine;
+    only genuinely perspective-distorted quads pay for warpPerspective.
+    With a camera profile, lens undistortion and the perspective warp are
+    fused into a single remap of the raw frame.
     
     Args:
-        image: Input color image containing a document
-        debug: If True, shows intermediate processing steps
+        image: Color image containing the document
+        corners: Ordered corners (TL, TR, BR, BL) as a (4, 2) float32 array
+        size: Optional precomputed (width, height) of the output
+        M: Optional precomputed perspective matrix (see geometry.warp_targets)
+        fast_path_tolerance: Allowed deviation from a crop or affine warp, as a
+            fraction of the page size (0 or None always warps in perspective)
+        info: Optional dict; "warp_path" is set to the path taken
+        camera: Optional CameraProfile of the (distorted) image; corners are
+            then raw image coordinates and size/M are ignored
+        workspace: Optional Workspace receiving the warped (except the
+            camera remap), gray and scanned pages
         
     Returns:
-        Tuple of (original, corners_visualization, scanned_document)
+        Tuple of (warped, scanned); (None, None) when three corners are
+        collinear (warp_path "degenerate") or M is not a valid homography
     """
-    original = image.copy()
-    h, w = image.shape[:2]
-    
-    # Resize for processing if too large
-    if h > 1000:
-        scale = 1000 / h
-        image = cv2.resize(image, None, fx=scale, fy=scale)
+    if geometry.is_degenerate(corners)[0] or (
+            M is not None and not geometry.valid_homographies([M])[0]):
+        path = geometry.WARP_DEGENERATE
+    elif camera is not None:
+        path = geometry.WARP_REMAP
+    else:
+        path = geometry.warp_paths(corners, fast_path_tolerance)[0]
+    if info is not None:
+        info["warp_path"] = path
+    
+    if path == geometry.WARP_DEGENERATE:
+        return None, None
+    elif path == geometry.WARP_REMAP:
+        # Rectify in undistorted coordinates, sampling the raw frame once
         h, w = image.shape[:2]
+        corners = camera.undistort_points(corners, (w, h))
+        size = geometry.output_sizes(corners)[0]
+        M = cv2.getPerspectiveTransform(corners, geometry.rectangle_corners(size)[0])
+        warped = camera.rectify(image, M, size)
+    elif path == geometry.WARP_CROP:
+        # Average opposite edges and slice; the crop is a view, not a copy
+        h, w = image.shape[:2]
+        x0 = int(round(max(0, (corners[0][0] + corners[3][0]) / 2)))
+        x1 = int(round(min(w, (corners[1][0] + corners[2][0]) / 2)))
+        y0 = int(round(max(0, (corners[0][1] + corners[1][1]) / 2)))
+        y1 = int(round(min(h, (corners[2][1] + corners[3][1]) / 2)))
+        warped = image[y0:y1, x0:x1]
+    else:
+        # Calculate width and height of output rectangle
+        if size is None:
+            size = geometry.output_sizes(corners)[0]
+        max_width, max_height = int(size[0]), int(size[1])
+        dst_corners = geometry.rectangle_corners(size)[0]
+        
+        if path == geometry.WARP_AFFINE:
+            # Three corners define the affine map of a parallelogram
+            A = cv2.getAffineTransform(corners[[0, 1, 3]], dst_corners[[0, 1, 3]])
+            warped = cv2.warpAffine(image, A, (max_width, max_height),
+                                    dst=_page_buffer(workspace, "warped", image, size))
+        else:
+            # Get perspective transform matrix
+            if M is None:
+                M = cv2.getPerspectiveTransform(corners, dst_corners)
+            
+            # Apply transformation to original image
+            warped = cv2.warpPerspective(image, M, (max_width, max_height),
+                                         dst=_page_buffer(workspace, "warped", image, size))
     
-    # STEP 1: Preprocessing to enhance document edges
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    # Enhance scanned document
+    page_shape = warped.shape[:2]
+    warped_gray = cv2.cvtColor(warped, cv2.COLOR_BGR2GRAY,
+                               dst=workspace_buffer(workspace, "warped_gray", page_shape))
+    
+    # Apply adaptive thresholding for clean text
+    scanned = cv2.adaptiveThreshold(
+        warped_gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
+        cv2.THRESH_BINARY, 11, 10, dst=workspace_buffer(workspace, "scanned", page_shape)
+    )
+    
+    return warped, scanned
+
+
+def _page_buffer(workspace, key, image, size):
+    return workspace_buffer(workspace, key, (int(size[1]), int(size[0])) + image.shape[2:],
+                            image.dtype)
+
+
+def draw_corners(image, corners, labels=('TL', 'TR', 'BR', 'BL')):
+    """
+    Draw labelled corners and the quadrilateral outline in place
+    
+    Args:
+        image: Color image to draw on
+        corners: Ordered corners as a (4, 2) array
+        labels: Text drawn next to each corner
+    """
+    colors = [(0, 255, 0), (255, 0, 0), (0, 0, 255), (255, 255, 0)]
+    
+    for corner, label, color in zip(corners, labels, colors):
+        cv2.circle(image, tuple(corner.astype(int)), 10, color, -1)
+        cv2.putText(image, label, (int(corner[0])+15, int(corner[1])-10), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
+    
+    # Draw edges between corners
+    for i in range(4):
+        pt1 = tuple(corners[i].astype(int))
+        pt2 = tuple(corners[(i + 1) % 4].astype(int))
+        cv2.line(image, pt1, pt2, (0, 255, 255), 3)
+
+
+def find_document_corners(frame, params=None, info=None, device=None, detector="contour"):
+    """
+    Detect the document in an image without warping it (the detection-only
+    part of document_scanner)
+    
+    Args:
+        frame: Image or Frame to search, at processing resolution
+        params: EdgeParams for the edge detection, or "adaptive" to derive
+            them from the image (see estimate_edge_params); None keeps the
+            fixed DEFAULT_EDGE_PARAMS
+        info: Optional dict; "fallback_level" is set to the FALLBACK_* level
+            the document was found at, "edge_params" to the params used and
+            "confidence" to the share of the outline lying on edges (0-1)
+        device: With params="adaptive", a key (camera, caller, connection)
+            under which parameters that found the document on the first
+            pass are cached and reused for that device's next frame
+        detector: "contour" (outline of the largest edge region) or "lines"
+            (four dominant straight sides, see find_line_quad; falls back to
+            the contour search when no quad qualifies). info["detector"]
+            reports which one produced the corners
+        
+    Returns:
+        Tuple of (corners, combined_edges): float32 corners (4, 2) ordered
+        TL, TR, BR, BL in the frame's pixel coordinates, and the edge map
+        they were found on
+    """
+    frame = as_frame(frame)
+    h, w = frame.image.shape[:2]
+    adaptive = params == "adaptive"
+    if adaptive:
+        params = (device is not None and EDGE_PARAM_CACHE.get(device)) or estimate_edge_params(frame)
+    params = params or DEFAULT_EDGE_PARAMS
+    
+    if detector == "lines":
+        corners, line_edges = find_line_quad(frame, params)
+        if corners is not None:
+            _record_detection(FALLBACK_QUAD, params, info, device if adaptive else None, "lines")
+            _record_confidence(info, corners, line_edges, h)
+            return corners, line_edges
     
+    # STEP 1: Preprocessing to enhance document edges
     # Apply bilateral filter to reduce noise while preserving edges
-    filtered = cv2.bilateralFilter(gray, 9, 75, 75)
+    bilateral = (9, 75, 75)
     
     # STEP 2: Enhanced edge detection for document boundaries
-    # Use adaptive threshold to handle varying lighting
-    adaptive_thresh = cv2.adaptiveThreshold(
-        filtered, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-        cv2.THRESH_BINARY, 11, 10
-    )
-    
     # Canny edge detection with optimized parameters
-    edges = cv2.Canny(filtered, 30, 80, apertureSize=3)
+    edges = frame.canny(params.canny_low, params.canny_high, bilateral=bilateral, aperture=3)
     
-    # Combine both edge detection methods
-    combined_edges = cv2.bitwise_or(edges, adaptive_thresh)
+    # Combine with an adaptive threshold to handle varying lighting
+    if params.block_size:
+        adaptive_thresh = frame.adaptive_threshold(params.block_size, params.c, bilateral=bilateral)
+        combined_edges = cv2.bitwise_or(edges, adaptive_thresh,
+                                        dst=frame.buffer("combined_edges", edges.shape))
+    else:
+        combined_edges = edges
     
     # Morphological operations to connect nearby edges
     kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
-    combined_edges = cv2.morphologyEx(combined_edges, cv2.MORPH_CLOSE, kernel)
-    combined_edges = cv2.dilate(combined_edges, kernel, iterations=1)
+    closed = cv2.morphologyEx(combined_edges, cv2.MORPH_CLOSE, kernel,
+                              dst=frame.buffer("closed_edges", edges.shape))
+    combined_edges = cv2.dilate(closed, kernel, dst=frame.buffer("combined_edges", edges.shape),
+                                iterations=1)
     
     # STEP 3: Find document contour
     contours, _ = cv2.findContours(combined_edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     contours = sorted(contours, key=cv2.contourArea, reverse=True)
     
     document_contour = None
+    level = FALLBACK_QUAD
     
     # Look for the largest rectangular contour (the document)
     for contour in contours:
@@ -130,6 +287,7 @@ def document_scanner(image, debug=False):
     
     # If no good 4-corner contour found, try with more relaxed parameters
     if document_contour is None:
+        level = FALLBACK_RELAXED
         for contour in contours:
             area = cv2.contourArea(contour)
             if area < w * h * 0.01:
@@ -145,74 +303,159 @@ def document_scanner(image, debug=False):
     
     # Last fallback: use the largest contour and get its bounding rectangle
     if document_contour is None and len(contours) > 0:
+        level = FALLBACK_MIN_AREA_RECT
         largest_contour = contours[0]
         rect = cv2.minAreaRect(largest_contour)
         document_contour = np.int32(cv2.boxPoints(rect))
     
     # Ultimate fallback: use entire image (but this shouldn't happen with real documents)
     if document_contour is None:
+        level = FALLBACK_INSET
         document_contour = np.array([[50, 50], [w-50, 50], [w-50, h-50], [50, h-50]], dtype=np.float32)
     
     # STEP 4: Extract and order corners
     corners = document_contour.reshape(4, 2).astype(np.float32)
     corners = order_corners(corners)
     
-    # STEP 5: Calculate output dimensions
-    # Calculate width and height of output rectangle
-    width_top = distance(corners[0], corners[1])
-    width_bottom = distance(corners[3], corners[2])
-    height_left = distance(corners[0], corners[3])
-    height_right = distance(corners[1], corners[2])
+    _record_detection(level, params, info, device if adaptive else None, "contour")
+    # Scored on the Canny edges; the closed, dilated map covers too much
+    _record_confidence(info, corners, edges, h)
     
-    max_width = int(max(width_top, width_bottom))
-    max_height = int(max(height_left, height_right))
-    
-    # STEP 6: Perspective transformation
-    dst_corners = np.array([
-        [0, 0],
-        [max_width - 1, 0],
-        [max_width - 1, max_height - 1],
-        [0, max_height - 1]
-    ], dtype=np.float32)
-    
-    # Get perspective transform matrix
-    M = cv2.getPerspectiveTransform(corners, dst_corners)
+    return corners, combined_edges
+
+
+def _record_detection(level, params, info, device, detector):
+    with _FALLBACK_LOCK:
+        FALLBACK_COUNTS[level] += 1
+    if device is not None:
+        EDGE_PARAM_CACHE.record(device, params, level)
+    if info is not None:
+        info["fallback_level"] = level
+        info["edge_params"] = params
+        info["detector"] = detector
+
+
+def _record_confidence(info, corners, edges, height):
+    if info is not None:
+        # The edge map may be downscaled (detector="lines")
+        scale = edges.shape[0] / height
+        info["confidence"] = float(outline_support(edges, corners * scale).mean())
+
+
+def fallback_stats(results=None, reset=False):
+    """
+    How often find_document_corners ended at each fallback level
     
-    # Apply transformation to original image
-    warped = cv2.warpPerspective(image, M, (max_width, max_height))
+    Args:
+        results: Optional scan_batch results to count instead of the
+            detections made in this process (worker processes keep their
+            own counters)
+        reset: If True, zero this process's counters after reading them
+        
+    Returns:
+        Dictionary mapping level name to {"count", "rate"}
+    """
+    # Read and reset in one step so no detection is counted twice or lost
+    with _FALLBACK_LOCK:
+        counts = Counter(FALLBACK_COUNTS)
+        if reset:
+            FALLBACK_COUNTS.clear()
+    if results is not None:
+        counts = Counter(r["info"]["fallback_level"] for r in results
+                         if "fallback_level" in r["info"])
+    total = sum(counts.values())
+    return {name: {"count": counts[level], "rate": counts[level] / total if total else 0.0}
+            for level, name in enumerate(FALLBACK_LEVELS)}
+
+
+def document_scanner(image, debug=False, gate=None, info=None, fast_path_tolerance=0.005,
+                     camera=None, params=None, device=None, detector="contour", workspace=None):
+    """
+    Document scanner that detects paper corners within the image.
     
-    # STEP 7: Enhance scanned document
-    warped_gray = cv2.cvtColor(warped, cv2.COLOR_BGR2GRAY)
+    Args:
+        image: Input color image (or Frame) containing a document
+        debug: If True, shows intermediate processing steps
+        gate: If True (or a dict of gate_frame threshold overrides), first run
+            the cheap frame gate and skip blurry, badly exposed or empty frames
+        info: Optional dict, filled with diagnostics about the run
+            ("gate" holds the GateResult when the gate ran, "warp_path" the
+            rectification path: "crop", "affine", "perspective" or
+            "degenerate",
+            "fallback_level", "edge_params" and "confidence" as in
+            find_document_corners, "timings_ms" the time spent per stage)
+        fast_path_tolerance: How far the page may deviate from axis-aligned or
+            a parallelogram and still take the crop/affine fast path, as a
+            fraction of its size (0 or None disables the fast path)
+        camera: Optional CameraProfile for the camera that took the image.
+            Corners are found on the raw frame and only they are
+            undistorted; the page is then undistorted and rectified in one
+            remap instead of undistorting the whole frame first
+        params, device: Edge detection parameters, as for
+            find_document_corners (params="adaptive" tunes them per image)
+        detector: "contour" or "lines", as for find_document_corners
+        workspace: None, True (a reusable workspace per input resolution
+            and thread, see workspace.WORKSPACES) or a Workspace. Every
+            intermediate and returned image then lives in its buffers, so a
+            steady stream of frames allocates no image memory; the returned
+            images are overwritten by the workspace's next frame
+        
+    Returns:
+        Tuple of (original, corners_visualization, scanned_document); the
+        last two are None when the gate rejected the frame or the detected
+        corners were degenerate
+    """
+    timings = {}
+    start = time.perf_counter()
+    frame = as_frame(image)
+    workspace = as_workspace(workspace, frame.image.shape)
+    if workspace is not None and frame is not image:
+        # A Frame made here has an empty cache; one passed in keeps its own
+        frame.workspace = workspace
+    
+    # STEP 0: Reject unusable frames before any full-resolution work
+    if gate:
+        gate_result = gate_frame(frame, **(gate if isinstance(gate, dict) else {}))
+        start = _lap(timings, "gate", start)
+        if info is not None:
+            info["gate"] = gate_result
+            info["timings_ms"] = timings
+        if not gate_result.accepted:
+            return frame.image, None, None
+    
+    original = frame.image.copy() if workspace is None else workspace.copy("original", frame.image)
     
-    # Apply adaptive thresholding for clean text
-    scanned = cv2.adaptiveThreshold(
-        warped_gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-        cv2.THRESH_BINARY, 11, 10
-    )
+    # Resize for processing if too large
+    frame = frame.resized(1000)
+    image = frame.image
+    start = _lap(timings, "resize", start)
+    
+    # STEP 1-4: Find the document and order its corners
+    corners, combined_edges = find_document_corners(frame, params, info, device, detector)
+    start = _lap(timings, "detect", start)
+    
+    # STEP 5-7: Perspective transformation and enhancement
+    warped, scanned = warp_document(image, corners, fast_path_tolerance=fast_path_tolerance,
+                                    info=info, camera=camera, workspace=workspace)
+    start = _lap(timings, "warp", start)
+    if scanned is None:
+        if info is not None:
+            info["timings_ms"] = timings
+        return original, None, None
     
     # STEP 8: Visualize corners and edges
-    corners_viz = image.copy()
-    
-    # Draw detected corners with labels
-    corner_labels = ['TL', 'TR', 'BR', 'BL']
-    colors = [(0, 255, 0), (255, 0, 0), (0, 0, 255), (255, 255, 0)]
-    
-    for i, (corner, label, color) in enumerate(zip(corners, corner_labels, colors)):
-        cv2.circle(corners_viz, tuple(corner.astype(int)), 10, color, -1)
-        cv2.putText(corners_viz, label, (int(corner[0])+15, int(corner[1])-10), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
-    
-    # Draw edges between corners
-    for i in range(4):
-        pt1 = tuple(corners[i].astype(int))
-        pt2 = tuple(corners[(i + 1) % 4].astype(int))
-        cv2.line(corners_viz, pt1, pt2, (0, 255, 255), 3)
+    corners_viz = image.copy() if workspace is None else workspace.copy("corners_viz", image)
+    draw_corners(corners_viz, corners)
+    _lap(timings, "visualize", start)
+    if info is not None:
+        info["timings_ms"] = timings
     
     # Debug visualization
     if debug:
+        import matplotlib.pyplot as plt
         plt.figure(figsize=(20, 5))
         plt.subplot(1, 5, 1), plt.imshow(cv2.cvtColor(original, cv2.COLOR_BGR2RGB)), plt.title('Original')
-        plt.subplot(1, 5, 2), plt.imshow(filtered, cmap='gray'), plt.title('Filtered')
+        plt.subplot(1, 5, 2), plt.imshow(frame.bilateral(9, 75, 75), cmap='gray'), plt.title('Filtered')
         plt.subplot(1, 5, 3), plt.imshow(combined_edges, cmap='gray'), plt.title('Combined Edges')
         plt.subplot(1, 5, 4), plt.imshow(cv2.cvtColor(corners_viz, cv2.COLOR_BGR2RGB)), plt.title('Document Corners')
         plt.subplot(1, 5, 5), plt.imshow(scanned, cmap='gray'), plt.title('Scanned Document')
@@ -222,24 +465,30 @@ def document_scanner(image, debug=False):
     return original, corners_viz, scanned
 
 
+def _lap(timings, stage, start):
+    now = time.perf_counter()
+    timings[stage] = (now - start) * 1000
+    return now
+
+
 def test_scanner(image_path):
     """
     Test the document scanner
     
     Args:
-        image_path: Path to the image file
+        image_path: Path to the image file, image array or Frame
         
     Returns:
         Tuple of (original, corners_viz, scanned)
     """
-    image = cv2.imread(image_path)
-    if image is None:
-        print(f"Error: Could not load image from {image_path}")
+    frame = as_frame(image_path)
+    if frame is None:
         return None, None, None
     
-    original, corners_viz, scanned = document_scanner(image, debug=True)
+    original, corners_viz, scanned = document_scanner(frame, debug=True)
     
     # Display final results
+    import matplotlib.pyplot as plt
     plt.figure(figsize=(15, 5))
     plt.subplot(1, 3, 1), plt.imshow(cv2.cvtColor(original, cv2.COLOR_BGR2RGB)), plt.title('Original Image')
     plt.subplot(1, 3, 2), plt.imshow(cv2.cvtColor(corners_viz, cv2.COLOR_BGR2RGB)), plt.title('Paper Corner Detection')
@@ -250,28 +499,19 @@ def test_scanner(image_path):
     return original, corners_viz, scanned
 
 
-def simple_quadrilateral_detection(image_path):
+def find_quadrilaterals(edges, epsilon_factor=0.02, min_area=1000, max_area=None):
     """
-    Simple quadrilateral detection function
+    Find every convex quadrilateral outline in an edge map
     
     Args:
-        image_path: Path to the image file
+        edges: Binary edge image
+        epsilon_factor: Contour approximation factor (fraction of perimeter)
+        min_area: Minimum quadrilateral area in pixels
+        max_area: Optional maximum quadrilateral area in pixels
         
     Returns:
-        List of quadrilaterals found
+        List of (area, approx) tuples sorted by area, largest first
     """
-    img = cv2.imread(image_path)
-    if img is None:
-        print(f"Error: Could not load image from {image_path}")
-        return []
-    
-    original = img.copy()
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    
-    # Preprocess
-    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-    edges = cv2.Canny(blurred, 50, 150)
-    
     # Find contours
     contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     
@@ -280,17 +520,261 @@ def simple_quadrilateral_detection(image_path):
     
     for cnt in contours:
         # Approximate contour
-        epsilon = 0.02 * cv2.arcLength(cnt, True)
+        epsilon = epsilon_factor * cv2.arcLength(cnt, True)
         approx = cv2.approxPolyDP(cnt, epsilon, True)
         
         # Check if it's a quadrilateral
         if len(approx) == 4 and cv2.isContourConvex(approx):
             area = cv2.contourArea(approx)
-            if area > 1000:  # discard very small areas
+            if area > min_area and (max_area is None or area < max_area):
                 quads.append((area, approx))
     
     # Sort by area, largest first
-    quads = sorted(quads, key=lambda x: x[0], reverse=True)
+    return sorted(quads, key=lambda x: x[0], reverse=True)
+
+
+def _overlap_ratio(quad_a, quad_b):
+    """Intersection area divided by the area of the smaller quadrilateral"""
+    a = quad_a.reshape(4, 2).astype(np.float32)
+    b = quad_b.reshape(4, 2).astype(np.float32)
+    intersection, _ = cv2.intersectConvexConvex(a, b)
+    smaller = min(cv2.contourArea(a), cv2.contourArea(b))
+    return intersection / smaller if smaller > 0 else 0.0
+
+
+def multi_document_scanner(image, max_pages=10, min_area_ratio=0.005, max_overlap=0.1,
+                           workers=None, debug=False, camera=None):
+    """
+    Extract every document (e.g. several receipts on a table) from one photo
+    
+    Edges are computed once on the downscaled frame; all non-overlapping
+    page quadrilaterals found there are then warped from the full-resolution
+    image, optionally in parallel threads (OpenCV releases the GIL).
+    
+    Args:
+        image: Input color image (or Frame) containing one or more documents
+        max_pages: Maximum number of pages to return
+        min_area_ratio: Minimum page area as a fraction of the image area
+        max_overlap: Largest allowed overlap (fraction of the smaller quad)
+            between two accepted pages
+        workers: Number of threads used for the warps (None or 1 = serial)
+        debug: If True, shows the detected pages
+        camera: Optional CameraProfile, as for document_scanner
+        
+    Returns:
+        Tuple of (original, corners_visualization, pages), where pages is a
+        list of dicts with "corners" (in original image coordinates),
+        "scanned" and "warp_path", largest page first (None, None, [] if
+        an image path could not be loaded)
+    """
+    frame = as_frame(image)
+    if frame is None:
+        return None, None, []
+    original = frame.image
+    small = frame.resized(1000)
+    h, w = small.image.shape[:2]
+    scale = original.shape[0] / h
+    
+    # Shared preprocessing: one edge map, closed so page outlines connect
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+    edges = small.cached(("multi_page_edges",), lambda: cv2.dilate(
+        small.canny(50, 150, blur=(5, 5)), kernel, iterations=1))
+    
+    # Greedily keep the largest quads that do not overlap an accepted one
+    accepted = []
+    for area, quad in find_quadrilaterals(edges, epsilon_factor=0.02,
+                                          min_area=w * h * min_area_ratio,
+                                          max_area=w * h * 0.95):
+        if all(_overlap_ratio(quad, other) <= max_overlap for other in accepted):
+            accepted.append(quad)
+            if len(accepted) == max_pages:
+                break
+    
+    # Order corners, size outputs and solve all homographies in one batch
+    quads = geometry.as_quads(accepted) * scale
+    corners_list, sizes, matrices = geometry.warp_targets(quads)
+    # Quads with three collinear corners have no homography; skip them
+    valid = geometry.valid_homographies(matrices)
+    corners_list, sizes, matrices = corners_list[valid], sizes[valid], matrices[valid]
+    
+    # Batch the warps
+    def warp(i):
+        page = {"corners": corners_list[i]}
+        page["scanned"] = warp_document(original, corners_list[i], sizes[i], matrices[i],
+                                        info=page, camera=camera)[1]
+        return page
+    
+    if workers and workers > 1 and len(corners_list) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pages = list(pool.map(warp, range(len(corners_list))))
+    else:
+        pages = [warp(i) for i in range(len(corners_list))]
+    
+    corners_viz = original.copy()
+    for i, page in enumerate(pages):
+        draw_corners(corners_viz, page["corners"], labels=[f"{i+1}"] * 4)
+    
+    if debug:
+        import matplotlib.pyplot as plt
+        n = len(pages) + 1
+        plt.figure(figsize=(4 * n, 5))
+        plt.subplot(1, n, 1), plt.imshow(cv2.cvtColor(corners_viz, cv2.COLOR_BGR2RGB)), plt.title('Detected Pages')
+        for i, page in enumerate(pages):
+            plt.subplot(1, n, i + 2), plt.imshow(page["scanned"], cmap='gray'), plt.title(f'Page {i+1}')
+        plt.tight_layout()
+        plt.show()
+    
+    return original, corners_viz, pages
+
+
+def _scan_batch_item(task):
+    image_path, stem, output_dir, output_format, pack, scanner_kwargs = task
+    return _scan_item(as_frame(image_path), image_path, stem, output_dir, output_format, pack,
+                      scanner_kwargs)
+
+
+def _scan_item(frame, image_path, stem, output_dir, output_format, pack, scanner_kwargs):
+    result = {"path": image_path, "info": {}}
+    if frame is None:
+        result["info"]["error"] = "load_failed"
+        return result
+    
+    _, _, scanned = document_scanner(frame, info=result["info"], **scanner_kwargs)
+    if scanned is None:
+        return result
+    if pack:
+        # Packed pages are 8x cheaper to send back from a worker process
+        result["packed"] = pack_page(scanned)
+    elif output_dir is None:
+        # A workspace page is overwritten by the next frame
+        result["scanned"] = scanned.copy() if scanner_kwargs.get("workspace") else scanned
+    else:
+        result["output"] = os.path.join(output_dir, f"{stem}.{output_format}")
+        save_page(result["output"], scanned)
+    return result
+
+
+def scan_batch(image_paths, output_dir=None, plan=None, output_format="png", document=None,
+               **scanner_kwargs):
+    """
+    Scan many images, optionally across worker processes
+    
+    Args:
+        image_paths: Paths to the input images
+        output_dir: Directory for the scanned pages (<name>.<output_format>,
+            with the path below the folder holding every input in the name,
+            see sources.source_stem); when None the scanned images are
+            returned instead
+        plan: None to run serially, "auto" to let the scheduler pick processes
+            and OpenCV threads, or a scheduler.ExecutionPlan
+        output_format: "png" (1-bit), "tif" or "pdf" for pages in output_dir
+        document: Optional .tif or .pdf path; every page is streamed into this
+            one multi-page file in input order, instead of output_dir
+        **scanner_kwargs: Forwarded to document_scanner (debug is not supported)
+    
+    Returns:
+        List of dictionaries with "path", "info" and either "output",
+        "page" (index in document) or "scanned", in input order
+    """
+    image_paths = list(image_paths)
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    plan = resolve_plan(plan, len(image_paths), SCAN_STAGE_MIX)
+    root, seen = common_root(image_paths), {}
+    tasks = [(path, unique_stem(source_stem(path, root), seen), output_dir, output_format,
+              document is not None, scanner_kwargs)
+             for path in image_paths]
+    if document is None:
+        return run_plan(_scan_batch_item, tasks, plan)
+    
+    results = []
+    with open_document(document) as writer:
+        for result in iter_plan(_scan_batch_item, tasks, plan):
+            packed = result.pop("packed", None)
+            if packed is not None:
+                result["page"] = writer.pages
+                writer.add_page(packed)
+            results.append(result)
+    return results
+
+
+def scan_stream(sources, output_dir=None, output_format="png", document=None,
+                every_nth_frame=1, prefetch_items=DEFAULT_PREFETCH_ITEMS, workspace=True,
+                trace=None, **scanner_kwargs):
+    """
+    Scan every image in directories, zip/tar archives and videos as they
+    are read, without extracting anything to disk
+    
+    Reading and decoding run on a background thread, at most prefetch_items
+    images ahead of the scanner, so memory stays bounded however large the
+    upload is.
+    
+    Args:
+        sources: Path or list of paths (see sources.iter_images)
+        output_dir: Directory for the scanned pages, named by their path
+            below the source directory (see sources.source_stem); when None
+            the scanned images are returned instead
+        output_format: "png" (1-bit), "tif" or "pdf" for pages in output_dir
+        document: Optional .tif or .pdf path receiving every page, in order
+        every_nth_frame: Keep every n-th video frame
+        prefetch_items: Decoded images allowed to wait for the scanner
+        workspace: Reuse scanner buffers from frame to frame (see
+            document_scanner); None allocates fresh ones per image
+        trace: Optional trace.TraceRecorder logging every image
+        **scanner_kwargs: Forwarded to document_scanner (debug is not supported)
+    
+    Yields:
+        Dictionaries as for scan_batch; "path" is the image reference
+        ("<archive>::<member>" for archive members and video frames)
+    """
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    sources = as_source_list(sources)
+    images = prefetch(iter_images(sources, every_nth_frame), max_items=prefetch_items)
+    scanner_kwargs = dict(scanner_kwargs, workspace=workspace)
+    writer = open_document(document) if document is not None else None
+    seen = {}
+    try:
+        for ref, image in images:
+            start = time.perf_counter()
+            stem = unique_stem(source_stem(ref, sources), seen)
+            result = _scan_item(as_frame(image), ref, stem, output_dir, output_format,
+                                writer is not None, scanner_kwargs)
+            if trace is not None:
+                trace.record(image, result["info"], time.perf_counter() - start, entry="stream",
+                             source=ref)
+            packed = result.pop("packed", None)
+            if packed is not None:
+                result["page"] = writer.pages
+                writer.add_page(packed)
+            yield result
+    finally:
+        images.close()
+        if writer is not None:
+            writer.close()
+
+
+def simple_quadrilateral_detection(image_path):
+    """
+    Simple quadrilateral detection function
+    
+    Args:
+        image_path: Path to the image file, image array or Frame
+        
+    Returns:
+        List of quadrilaterals found
+    """
+    frame = as_frame(image_path)
+    if frame is None:
+        return []
+    
+    original = frame.image.copy()
+    
+    # Preprocess
+    edges = frame.canny(50, 150, blur=(5, 5))
+    
+    # Find and filter quadrilaterals, discarding very small areas
+    quads = find_quadrilaterals(edges, epsilon_factor=0.02, min_area=1000)
     
     # Draw all plausible quadrilaterals
     for area, quad in quads:
@@ -304,20 +788,17 @@ def harris_corner_detection(image_path):
     Harris corner detection function
     
     Args:
-        image_path: Path to the image file
+        image_path: Path to the image file, image array or Frame
         
     Returns:
         Image with corners marked
     """
-    img = cv2.imread(image_path)
-    if img is None:
-        print(f"Error: Could not load image from {image_path}")
+    frame = as_frame(image_path)
+    if frame is None:
         return None
     
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    gray = np.float32(gray)
-    
-    gray = cv2.GaussianBlur(gray, (3, 3), 0)
+    img = frame.image.copy()
+    gray = frame.blurred((3, 3), 0, dtype=np.float32)
     
     dst = cv2.cornerHarris(gray, 3, 3, 0.04)
     # Result is dilated for marking the corners
@@ -0,0 +1,148 @@
+import threading
+import cv2
+import numpy as np
+from collections import OrderedDict, namedtuple
+from .frame import as_frame
+
+EdgeParams = namedtuple("EdgeParams", [
+    "canny_low",   # Canny hysteresis thresholds (on the L1 Sobel magnitude)
+    "canny_high",
+    "block_size",  # Adaptive threshold neighbourhood (odd; 0 leaves the threshold out)
+    "c",           # Constant subtracted from the adaptive threshold's local mean
+])
+
+# The fixed settings document_scanner has always used
+DEFAULT_EDGE_PARAMS = EdgeParams(30, 80, 11, 10)
+
+# Tuning of estimate_edge_params()
+EDGE_PARAM_TUNING = {
+    "strong_edge_fraction": 0.15,  # Share of pixels treated as strong edges
+    "low_ratio": 0.4,              # canny_low / canny_high
+    "min_high": 24,
+    "max_high": 240,
+    "block_fraction": 1 / 60,      # Adaptive block size relative to the shorter side
+    "c_per_intensity": 0.065,      # C relative to the median intensity
+    "min_c": 3,
+    "max_c": 15,
+    "max_threshold_fill": 0.5,     # Drop the threshold map if it covers more than this
+}
+
+
+def estimate_edge_params(image, bilateral=(9, 75, 75), **tuning):
+    """
+    Derive Canny and adaptive-threshold parameters from cheap image statistics
+
+    The Canny high threshold is the gradient magnitude exceeded by the
+    strongest strong_edge_fraction of pixels, so it follows the contrast of
+    the image instead of assuming a fixed one; the adaptive threshold's C
+    follows the median intensity and its window follows the image size.
+    Statistics are computed on every other pixel of the smoothed image that
+    detection uses anyway.
+
+    The adaptive threshold marks everything not darker than its
+    surroundings, so on evenly lit frames it covers nearly the whole image
+    and merges the page with the background into one contour. When it
+    would cover more than max_threshold_fill of the frame it is left out
+    (block_size 0) and detection runs on the Canny edges alone.
+
+    Args:
+        image: Image or Frame at processing resolution
+        bilateral: Bilateral filter parameters used by detection
+        **tuning: Overrides for any key of EDGE_PARAM_TUNING
+
+    Returns:
+        EdgeParams
+    """
+    t = dict(EDGE_PARAM_TUNING, **tuning)
+    frame = as_frame(image)
+    sample = frame.bilateral(*bilateral)[::2, ::2]
+
+    # Median intensity from the histogram (no full sort)
+    hist = cv2.calcHist([sample], [0], None, [256], [0, 256]).ravel()
+    median = int(np.searchsorted(np.cumsum(hist), sample.size / 2))
+
+    # Gradient histogram of the same L1 magnitude Canny thresholds
+    gx = cv2.Sobel(sample, cv2.CV_16S, 1, 0)
+    gy = cv2.Sobel(sample, cv2.CV_16S, 0, 1)
+    magnitude = cv2.add(cv2.convertScaleAbs(gx, alpha=0.25), cv2.convertScaleAbs(gy, alpha=0.25))
+    grad_hist = np.cumsum(cv2.calcHist([magnitude], [0], None, [256], [0, 256]).ravel())
+    level = np.searchsorted(grad_hist, magnitude.size * (1 - t["strong_edge_fraction"]))
+    high = int(np.clip(level * 4, t["min_high"], t["max_high"]))
+    low = int(round(high * t["low_ratio"]))
+
+    h, w = frame.image.shape[:2]
+    block = max(11, int(min(h, w) * t["block_fraction"]) | 1)
+    c = int(np.clip(round(median * t["c_per_intensity"]), t["min_c"], t["max_c"]))
+
+    sample_block = max(3, (block // 2) | 1)
+    fill = cv2.countNonZero(cv2.adaptiveThreshold(
+        sample, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, sample_block, c))
+    if fill > sample.size * t["max_threshold_fill"]:
+        block = 0
+    return EdgeParams(low, high, block, c)
+
+
+class EdgeParamCache:
+    """
+    Small LRU cache of edge parameters that worked, keyed per device or caller.
+
+    Frames from one camera (or one caller) tend to look alike, so settings
+    that found the document on the first pass are reused for the next frame
+    and the estimate is skipped. Settings that needed a fallback are dropped
+    and re-estimated next time. The cache is shared by detection threads
+    (e.g. the ws_server executor), so every access holds a lock.
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        Cached parameters for key
+
+        Args:
+            key: Device or caller identifier
+
+        Returns:
+            EdgeParams, or None
+        """
+        with self._lock:
+            params = self._entries.get(key)
+            if params is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return params
+
+    def record(self, key, params, fallback_level):
+        """
+        Remember parameters that found the document on the first pass
+
+        Args:
+            key: Device or caller identifier
+            params: EdgeParams used
+            fallback_level: Fallback level the detection ended at
+        """
+        with self._lock:
+            if fallback_level == 0:
+                self._entries[key] = params
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            else:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# Shared cache used by document_scanner(params="adaptive", device=...)
+EDGE_PARAM_CACHE = EdgeParamCache()
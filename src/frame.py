@@ -0,0 +1,275 @@
+import cv2
+import numpy as np
+from collections import OrderedDict
+from .sources import read_image
+from .workspace import workspace_buffer
+
+# Default memory budget for the derived representations of one frame
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def _nbytes(value):
+    """
+    Approximate memory held by a cached value
+
+    Args:
+        value: Array, or (nested) list/tuple of arrays
+
+    Returns:
+        Size in bytes
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (list, tuple)):
+        return sum(_nbytes(v) for v in value)
+    if isinstance(value, Frame):
+        return value.image.nbytes
+    return 0
+
+
+def _ksize(ksize):
+    return (ksize, ksize) if np.isscalar(ksize) else tuple(ksize)
+
+
+class Frame:
+    """
+    An image plus lazily computed, cached derived representations.
+
+    Each derived representation (grayscale, blurs, edge maps, gradients...)
+    is computed on first access and reused by every detector that asks for
+    it with the same parameters. Cached values are shared, so callers must
+    treat them as read-only. When the cache grows past max_bytes the least
+    recently used entries are dropped and recomputed on demand.
+
+    With a workspace, derived images are computed into its buffers instead
+    of newly allocated arrays; they then stay valid only until the
+    workspace's next frame.
+    """
+
+    def __init__(self, image, max_bytes=DEFAULT_MAX_BYTES, workspace=None, namespace=()):
+        self.image = image
+        self.max_bytes = max_bytes
+        self.workspace = workspace
+        # Keeps a downscaled frame's buffers apart from its parent's
+        self.namespace = namespace
+        self._cache = OrderedDict()
+        self._cache_bytes = 0
+
+    def __getstate__(self):
+        # Ship only the image to worker processes; they rebuild their own
+        # cache (and use their own workspace)
+        return {"image": self.image, "max_bytes": self.max_bytes}
+
+    def __setstate__(self, state):
+        self.__init__(state["image"], state["max_bytes"])
+
+    @classmethod
+    def from_path(cls, image_path, **kwargs):
+        """
+        Load a frame from disk
+
+        Args:
+            image_path: Path to the image file, or an "<archive>::<member>"
+                reference (see sources.read_image)
+
+        Returns:
+            Frame, or None if the image could not be loaded
+        """
+        image = read_image(image_path)
+        if image is None:
+            print(f"Error: Could not load image from {image_path}")
+            return None
+        return cls(image, **kwargs)
+
+    @property
+    def shape(self):
+        return self.image.shape
+
+    @property
+    def cache_bytes(self):
+        return self._cache_bytes
+
+    def cached(self, key, compute):
+        """
+        Return the cached value for key, computing and storing it if needed
+
+        Args:
+            key: Hashable cache key describing the representation
+            compute: Zero-argument callable producing the value
+
+        Returns:
+            Cached value
+        """
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key][0]
+
+        value = compute()
+        size = _nbytes(value)
+        self._cache[key] = (value, size)
+        self._cache_bytes += size
+
+        # Evict least recently used entries, but always keep the newest one
+        while self._cache_bytes > self.max_bytes and len(self._cache) > 1:
+            _, (_, evicted_size) = self._cache.popitem(last=False)
+            self._cache_bytes -= evicted_size
+        return value
+
+    def clear(self):
+        """Drop every cached representation"""
+        self._cache.clear()
+        self._cache_bytes = 0
+
+    def buffer(self, key, shape, dtype=np.uint8):
+        """
+        dst= argument for a derived image of this frame
+
+        Args:
+            key: Hashable name of the derived image
+            shape, dtype: Its shape and dtype
+
+        Returns:
+            A workspace buffer, or None without a workspace (OpenCV then
+            allocates the result)
+        """
+        return workspace_buffer(self.workspace, (self.namespace, key), shape, dtype)
+
+    @property
+    def gray(self):
+        """Grayscale version of the image (the image itself if already gray)"""
+        if self.image.ndim == 2:
+            return self.image
+        return self.cached("gray", lambda: cv2.cvtColor(
+            self.image, cv2.COLOR_BGR2GRAY, dst=self.buffer("gray", self.image.shape[:2])))
+
+    def resized(self, max_height):
+        """
+        Downscaled copy of this frame, with its own derived-representation cache
+
+        Args:
+            max_height: Height above which the image is downscaled
+
+        Returns:
+            Frame (self if the image is already small enough)
+        """
+        h, w = self.image.shape[:2]
+        if h <= max_height:
+            return self
+        scale = max_height / h
+
+        def compute():
+            # Same rounding as OpenCV's size from fx/fy, so the buffer fits
+            size = (int(np.round(h * scale)), int(np.round(w * scale)))
+            dst = self.buffer(("resized", max_height), size + self.image.shape[2:], self.image.dtype)
+            image = cv2.resize(self.image, None, dst=dst, fx=scale, fy=scale)
+            return Frame(image, max_bytes=self.max_bytes, workspace=self.workspace,
+                         namespace=self.namespace + (max_height,))
+
+        return self.cached(("resized", max_height), compute)
+
+    def blurred(self, ksize=(5, 5), sigma=0, dtype=None):
+        """
+        Gaussian-blurred grayscale image
+
+        Args:
+            ksize: Kernel size, int or (height, width)
+            sigma: Gaussian sigma (0 derives it from the kernel size)
+            dtype: Optional dtype to convert the gray image to before blurring
+
+        Returns:
+            Blurred image
+        """
+        ksize = _ksize(ksize)
+
+        def compute():
+            if dtype is not None:
+                return cv2.GaussianBlur(self.gray.astype(dtype), ksize, sigma)
+            return cv2.GaussianBlur(self.gray, ksize, sigma,
+                                    dst=self.buffer(("blurred", ksize, sigma), self.gray.shape))
+
+        return self.cached(("blurred", ksize, sigma, dtype and np.dtype(dtype).str), compute)
+
+    def bilateral(self, d=9, sigma_color=75, sigma_space=75):
+        """Edge-preserving bilateral filter of the grayscale image"""
+        key = ("bilateral", d, sigma_color, sigma_space)
+        return self.cached(key, lambda: cv2.bilateralFilter(
+            self.gray, d, sigma_color, sigma_space, dst=self.buffer(key, self.gray.shape)))
+
+    def _smoothed(self, blur, bilateral):
+        if bilateral:
+            return self.bilateral(*bilateral)
+        if blur:
+            return self.blurred(blur)
+        return self.gray
+
+    def canny(self, low, high, blur=0, bilateral=None, aperture=3):
+        """
+        Canny edge map of the grayscale image
+
+        Args:
+            low, high: Canny hysteresis thresholds
+            blur: Gaussian kernel size applied first (0 for none)
+            bilateral: Optional (d, sigma_color, sigma_space) bilateral filter
+                applied first instead of the Gaussian blur
+            aperture: Sobel aperture size used by Canny
+
+        Returns:
+            Binary edge image
+        """
+        key = ("canny", low, high, blur and _ksize(blur), bilateral and tuple(bilateral), aperture)
+        return self.cached(key, lambda: cv2.Canny(self._smoothed(blur, bilateral), low, high,
+                                                  edges=self.buffer(key, self.gray.shape),
+                                                  apertureSize=aperture))
+
+    def adaptive_threshold(self, block_size=11, c=10, blur=0, bilateral=None):
+        """
+        Gaussian adaptive threshold of the grayscale image
+
+        Args:
+            block_size: Neighbourhood size for the local threshold
+            c: Constant subtracted from the weighted mean
+            blur, bilateral: Optional smoothing, as for canny()
+
+        Returns:
+            Binary image
+        """
+        key = ("adaptive_threshold", block_size, c, blur and _ksize(blur),
+               bilateral and tuple(bilateral))
+        return self.cached(key, lambda: cv2.adaptiveThreshold(
+            self._smoothed(blur, bilateral), 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+            cv2.THRESH_BINARY, block_size, c, dst=self.buffer(key, self.gray.shape)))
+
+    def gradients(self, ksize=3):
+        """
+        Sobel gradients of the grayscale image
+
+        Args:
+            ksize: Sobel kernel size
+
+        Returns:
+            Tuple of (gx, gy) float32 images
+        """
+        shape = self.gray.shape
+        return self.cached(("gradients", ksize), lambda: (
+            cv2.Sobel(self.gray, cv2.CV_32F, 1, 0, ksize=ksize,
+                      dst=self.buffer(("gx", ksize), shape, np.float32)),
+            cv2.Sobel(self.gray, cv2.CV_32F, 0, 1, ksize=ksize,
+                      dst=self.buffer(("gy", ksize), shape, np.float32)),
+        ))
+
+
+def as_frame(source):
+    """
+    Normalize a detector input to a Frame
+
+    Args:
+        source: Frame, image array or path to an image file
+
+    Returns:
+        Frame, or None if a path could not be loaded
+    """
+    if isinstance(source, Frame):
+        return source
+    if isinstance(source, np.ndarray):
+        return Frame(source)
+    return Frame.from_path(source)
@@ -0,0 +1,141 @@
+import cv2
+import numpy as np
+from collections import namedtuple
+from .frame import as_frame
+
+# Reason codes reported by gate_frame
+GATE_OK = "ok"
+GATE_BLURRY = "blurry"
+GATE_UNDEREXPOSED = "underexposed"
+GATE_OVEREXPOSED = "overexposed"
+GATE_NO_DOCUMENT = "no_document"
+
+GateResult = namedtuple("GateResult", [
+    "accepted",         # True if the frame is worth running the full pipeline on
+    "reason",           # One of the GATE_* reason codes
+    "blur",             # Sharpest tile's Laplacian variance (higher is sharper)
+    "mean",             # Mean intensity of the thumbnail (0-255)
+    "dark_fraction",    # Fraction of thumbnail pixels at or below 10
+    "bright_fraction",  # Fraction of thumbnail pixels at or above 245
+    "edge_fraction",    # Fraction of thumbnail pixels with a strong Laplacian response
+])
+
+# Default thresholds, tuned on 160 px wide thumbnails (exposure and edges)
+# and 128 px full-resolution tiles (blur)
+GATE_DEFAULTS = {
+    "thumbnail_width": 160,
+    "blur_tile": 128,
+    "min_blur": 60.0,
+    "min_mean": 25.0,
+    "max_mean": 245.0,
+    "max_clipped": 0.8,
+    "edge_threshold": 20.0,
+    "min_edge_fraction": 0.01,
+}
+
+
+def gate_thumbnail(frame, width=GATE_DEFAULTS["thumbnail_width"]):
+    """
+    Small grayscale thumbnail used by the gate, cached on the frame
+
+    Nearest-neighbour decimation only touches the sampled pixels, so this
+    costs the same for a 1 MP and a 12 MP frame.
+
+    Args:
+        frame: Frame to sample
+        width: Thumbnail width in pixels
+
+    Returns:
+        uint8 grayscale thumbnail
+    """
+    def compute():
+        h, w = frame.image.shape[:2]
+        size = (width, max(1, int(round(h * width / w))))
+        thumb = cv2.resize(frame.image, size, interpolation=cv2.INTER_NEAREST)
+        return thumb if thumb.ndim == 2 else cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY)
+
+    return frame.cached(("gate_thumbnail", width), compute)
+
+
+def gate_sharpness(frame, tile=GATE_DEFAULTS["blur_tile"], grid=3, span=0.6):
+    """
+    Resolution-independent blur score, cached on the frame
+
+    A thumbnail shrinks the blur along with the frame (a 15 px blur on a
+    4000 px frame is under 1 px at 160 px), so sharpness is measured on a
+    grid of tiles cut from the central part of the full-resolution frame,
+    each binned 2x2 with INTER_AREA to average out sensor noise. The score
+    is the highest tile Laplacian variance, so blank paper or background in
+    some tiles does not make a sharp page look blurry. The tiles have a
+    fixed size, so this costs the same for a 1 MP and a 12 MP frame.
+
+    Args:
+        frame: Frame to sample
+        tile: Tile side length in full-resolution pixels
+        grid: Tiles per row and column
+        span: Fraction of the frame width and height the tile centres cover
+
+    Returns:
+        Blur score (higher is sharper)
+    """
+    def compute():
+        h, w = frame.image.shape[:2]
+        size = max(2, min(tile, h // grid, w // grid))
+        best = 0.0
+        for fy in np.linspace(0.5 - span / 2, 0.5 + span / 2, grid):
+            for fx in np.linspace(0.5 - span / 2, 0.5 + span / 2, grid):
+                y = min(max(0, int(fy * h - size / 2)), h - size)
+                x = min(max(0, int(fx * w - size / 2)), w - size)
+                patch = frame.image[y:y + size, x:x + size]
+                if patch.ndim == 3:
+                    patch = cv2.cvtColor(patch, cv2.COLOR_BGR2GRAY)
+                patch = cv2.resize(patch, (size // 2, size // 2), interpolation=cv2.INTER_AREA)
+                best = max(best, float(cv2.Laplacian(patch, cv2.CV_16S).var()))
+        return best
+
+    return frame.cached(("gate_sharpness", tile, grid, span), compute)
+
+
+def gate_frame(image, **thresholds):
+    """
+    Cheap check deciding whether a frame is worth scanning
+
+    Looks at sharpness (Laplacian variance of full-resolution tiles, see
+    gate_sharpness), exposure (mean and clipped pixels) and whether there
+    is enough edge mass for a document to be present (both on a small
+    thumbnail).
+
+    Args:
+        image: Input image or Frame
+        **thresholds: Overrides for any key of GATE_DEFAULTS
+
+    Returns:
+        GateResult
+    """
+    params = dict(GATE_DEFAULTS, **thresholds)
+    frame = as_frame(image)
+    thumb = gate_thumbnail(frame, params["thumbnail_width"])
+    blur = gate_sharpness(frame, params["blur_tile"])
+
+    laplacian = cv2.Laplacian(thumb, cv2.CV_16S)
+    edge_fraction = np.count_nonzero(np.abs(laplacian) > params["edge_threshold"]) / thumb.size
+
+    mean = float(thumb.mean())
+    hist = cv2.calcHist([thumb], [0], None, [256], [0, 256]).ravel() / thumb.size
+    dark_fraction = float(hist[:11].sum())
+    bright_fraction = float(hist[245:].sum())
+
+    # Exposure is checked first: a black frame is also "blurry" and edgeless
+    if mean < params["min_mean"] or dark_fraction > params["max_clipped"]:
+        reason = GATE_UNDEREXPOSED
+    elif mean > params["max_mean"] or bright_fraction > params["max_clipped"]:
+        reason = GATE_OVEREXPOSED
+    elif edge_fraction < params["min_edge_fraction"]:
+        reason = GATE_NO_DOCUMENT
+    elif blur < params["min_blur"]:
+        reason = GATE_BLURRY
+    else:
+        reason = GATE_OK
+
+    return GateResult(reason == GATE_OK, reason, blur, mean,
+                      dark_fraction, bright_fraction, float(edge_fraction))
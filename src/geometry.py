@@ -0,0 +1,280 @@
+import numpy as np
+
+
+def as_quads(quads):
+    """
+    Normalize quadrilaterals to a float64 (N, 4, 2) array
+
+    Args:
+        quads: A single quad (4, 2), a batch (N, 4, 2) or OpenCV contours
+            (N, 4, 1, 2)
+
+    Returns:
+        Array of shape (N, 4, 2)
+    """
+    quads = np.asarray(quads, dtype=np.float64)
+    return quads.reshape(-1, 4, 2)
+
+
+def order_corners(quads):
+    """
+    Order the corners of every quad as top-left, top-right, bottom-right,
+    bottom-left (same rule as document_scanner.order_corners)
+
+    Args:
+        quads: Array of shape (N, 4, 2)
+
+    Returns:
+        float32 array of shape (N, 4, 2)
+    """
+    quads = as_quads(quads)
+    s = quads.sum(axis=2)
+    diff = quads[:, :, 1] - quads[:, :, 0]
+    idx = np.stack([
+        np.argmin(s, axis=1),     # Top-left (smallest sum)
+        np.argmin(diff, axis=1),  # Top-right (smallest diff)
+        np.argmax(s, axis=1),     # Bottom-right (largest sum)
+        np.argmax(diff, axis=1),  # Bottom-left (largest diff)
+    ], axis=1)
+    return np.take_along_axis(quads, idx[:, :, None], axis=1).astype(np.float32)
+
+
+def side_lengths(quads):
+    """
+    Length of each side of every ordered quad
+
+    Args:
+        quads: Ordered quads of shape (N, 4, 2)
+
+    Returns:
+        Array of shape (N, 4): top, right, bottom, left
+    """
+    quads = as_quads(quads)
+    return np.linalg.norm(np.roll(quads, -1, axis=1) - quads, axis=2)
+
+
+def output_sizes(quads):
+    """
+    Size of the rectangle each ordered quad is warped to
+
+    Args:
+        quads: Ordered quads of shape (N, 4, 2)
+
+    Returns:
+        int array of shape (N, 2) holding (width, height)
+    """
+    sides = side_lengths(quads)
+    widths = np.maximum(sides[:, 0], sides[:, 2])
+    heights = np.maximum(sides[:, 1], sides[:, 3])
+    return np.stack([widths, heights], axis=1).astype(int)
+
+
+def rectangle_corners(sizes):
+    """
+    Destination corners (TL, TR, BR, BL) for rectangles of the given sizes
+
+    Args:
+        sizes: Array of shape (N, 2) holding (width, height)
+
+    Returns:
+        float32 array of shape (N, 4, 2)
+    """
+    sizes = np.asarray(sizes, dtype=np.float32).reshape(-1, 2)
+    w = sizes[:, 0] - 1
+    h = sizes[:, 1] - 1
+    zero = np.zeros_like(w)
+    return np.stack([
+        np.stack([zero, zero], axis=1),
+        np.stack([w, zero], axis=1),
+        np.stack([w, h], axis=1),
+        np.stack([zero, h], axis=1),
+    ], axis=1)
+
+
+def _edge_cross_products(quads):
+    quads = as_quads(quads)
+    edges = np.roll(quads, -1, axis=1) - quads
+    nxt = np.roll(edges, -1, axis=1)
+    return edges[:, :, 0] * nxt[:, :, 1] - edges[:, :, 1] * nxt[:, :, 0]
+
+
+def is_degenerate(quads):
+    """
+    Test whether any three consecutive corners of each quad are collinear
+
+    Such quads (including zero-area ones) have no homography to a
+    rectangle and no meaningful warp path.
+
+    Args:
+        quads: Array of shape (N, 4, 2), corners in boundary order
+
+    Returns:
+        bool array of shape (N,)
+    """
+    return np.any(np.abs(_edge_cross_products(quads)) <= 1e-9, axis=1)
+
+
+def valid_homographies(matrices):
+    """
+    Mask of the matrices homographies solved (the others are all NaN)
+
+    Args:
+        matrices: Array of shape (N, 3, 3), e.g. from warp_targets
+
+    Returns:
+        bool array of shape (N,)
+    """
+    return np.isfinite(np.asarray(matrices)).all(axis=(1, 2))
+
+
+def is_convex(quads):
+    """
+    Test whether every quad is strictly convex
+
+    Args:
+        quads: Array of shape (N, 4, 2), corners in boundary order
+
+    Returns:
+        bool array of shape (N,)
+    """
+    cross = _edge_cross_products(quads)
+    return np.all(cross > 0, axis=1) | np.all(cross < 0, axis=1)
+
+
+def corner_angles(quads):
+    """
+    Interior angle at each corner of every quad
+
+    Args:
+        quads: Array of shape (N, 4, 2), corners in boundary order
+
+    Returns:
+        Angles in degrees, shape (N, 4)
+    """
+    quads = as_quads(quads)
+    to_prev = np.roll(quads, 1, axis=1) - quads
+    to_next = np.roll(quads, -1, axis=1) - quads
+    dot = (to_prev * to_next).sum(axis=2)
+    norms = np.linalg.norm(to_prev, axis=2) * np.linalg.norm(to_next, axis=2)
+    cos = np.divide(dot, norms, out=np.ones_like(dot), where=norms > 0)
+    return np.degrees(np.arccos(np.clip(cos, -1.0, 1.0)))
+
+
+def quad_areas(quads):
+    """
+    Area of every quad (shoelace formula)
+
+    Args:
+        quads: Array of shape (N, 4, 2), corners in boundary order
+
+    Returns:
+        Array of shape (N,)
+    """
+    quads = as_quads(quads)
+    x, y = quads[:, :, 0], quads[:, :, 1]
+    return 0.5 * np.abs((x * np.roll(y, -1, axis=1) - np.roll(x, -1, axis=1) * y).sum(axis=1))
+
+
+def homographies(src, dst):
+    """
+    Solve the N perspective transforms mapping src quads onto dst quads
+
+    Builds the standard 8x8 linear system per quad (h33 fixed to 1) and
+    solves all of them with one batched np.linalg.solve, which matches
+    cv2.getPerspectiveTransform.
+
+    Args:
+        src: Source quads, shape (N, 4, 2)
+        dst: Destination quads, shape (N, 4, 2)
+
+    Returns:
+        Array of shape (N, 3, 3); degenerate quads give all-NaN matrices
+        (see valid_homographies)
+    """
+    src = as_quads(src)
+    dst = as_quads(dst)
+    n = len(src)
+    x, y = src[:, :, 0], src[:, :, 1]
+    u, v = dst[:, :, 0], dst[:, :, 1]
+    one = np.ones_like(x)
+    zero = np.zeros_like(x)
+
+    # Rows for u: [x, y, 1, 0, 0, 0, -u*x, -u*y]; rows for v likewise
+    rows_u = np.stack([x, y, one, zero, zero, zero, -u * x, -u * y], axis=2)
+    rows_v = np.stack([zero, zero, zero, x, y, one, -v * x, -v * y], axis=2)
+    A = np.concatenate([rows_u, rows_v], axis=1)
+    b = np.concatenate([u, v], axis=1)
+
+    H = np.full((n, 9), np.nan)
+    # Skip singular systems (three collinear corners) instead of failing the batch
+    ok = ~is_degenerate(src) & ~is_degenerate(dst)
+    if ok.any():
+        H[ok, :8] = np.linalg.solve(A[ok], b[ok][:, :, None])[:, :, 0]
+        H[ok, 8] = 1.0
+    return H.reshape(n, 3, 3)
+
+
+def warp_targets(quads):
+    """
+    Everything needed to rectify a batch of quads in one call
+
+    Args:
+        quads: Unordered quads of shape (N, 4, 2) (or OpenCV contours)
+
+    Returns:
+        Tuple of (ordered_corners (N, 4, 2), sizes (N, 2), matrices (N, 3, 3));
+        matrices of degenerate quads are all NaN (see valid_homographies)
+    """
+    corners = order_corners(quads)
+    sizes = output_sizes(corners)
+    return corners, sizes, homographies(corners, rectangle_corners(sizes))
+
+
+# Rectification paths, cheapest first
+WARP_CROP = "crop"
+WARP_AFFINE = "affine"
+WARP_PERSPECTIVE = "perspective"
+# Undistortion fused with the perspective warp (see calibration.CameraProfile)
+WARP_REMAP = "remap"
+# Three collinear corners: nothing to rectify (see is_degenerate)
+WARP_DEGENERATE = "degenerate"
+
+
+def warp_paths(quads, tolerance=0.005):
+    """
+    Cheapest way to rectify each ordered quad without visible error
+
+    A quad whose sides are horizontal and vertical within tolerance is a
+    plain crop; a parallelogram (e.g. a rotated rectangle) only needs an
+    affine warp; anything else needs the full perspective warp.
+    Degenerate quads cannot be rectified at all and get WARP_DEGENERATE.
+
+    Args:
+        quads: Ordered quads (TL, TR, BR, BL) of shape (N, 4, 2)
+        tolerance: Allowed deviation as a fraction of the quad's longer
+            bounding-box side (0 or None always selects perspective)
+
+    Returns:
+        Array of shape (N,) holding WARP_CROP, WARP_AFFINE, WARP_PERSPECTIVE
+        or WARP_DEGENERATE
+    """
+    quads = as_quads(quads)
+    paths = np.full(len(quads), WARP_PERSPECTIVE, dtype=object)
+    degenerate = is_degenerate(quads)
+    if not tolerance:
+        paths[degenerate] = WARP_DEGENERATE
+        return paths
+
+    extent = np.ptp(quads, axis=1).max(axis=1)
+    tol = tolerance * extent
+    tl, tr, br, bl = (quads[:, i] for i in range(4))
+
+    # Fourth corner predicted by the other three is exact for parallelograms
+    parallelogram = np.abs(tl + br - tr - bl).max(axis=1) <= tol
+    axis_aligned = ((np.abs(tl[:, 1] - tr[:, 1]) <= tol) & (np.abs(bl[:, 1] - br[:, 1]) <= tol)
+                    & (np.abs(tl[:, 0] - bl[:, 0]) <= tol) & (np.abs(tr[:, 0] - br[:, 0]) <= tol))
+
+    paths[parallelogram] = WARP_AFFINE
+    paths[axis_aligned] = WARP_CROP
+    paths[degenerate] = WARP_DEGENERATE
+    return paths
@@ -1,9 +1,29 @@
 import cv2
 import numpy as np
 import os
-import matplotlib.pyplot as plt
 from itertools import product
 import json
+from .frame import as_frame
+from .sources import as_source_list, iter_images, prefetch, source_stem, unique_stem
+from .scheduler import SWEEP_STAGE_MIX, opencv_threads, resolve_plan, run_plan
+
+# Hyperparameter ranges for the full sweep (1,024 combinations)
+HYPERPARAMS = {
+    'blur_kernel': [3, 5, 7, 9],  # Gaussian blur kernel sizes
+    'canny_low': [30, 50, 70, 100],  # Lower Canny threshold
+    'canny_high': [100, 150, 200, 250],  # Upper Canny threshold
+    'epsilon_factor': [0.01, 0.02, 0.03, 0.05],  # Contour approximation factor
+    'min_area': [500, 1000, 2000, 5000]  # Minimum area threshold
+}
+
+# Smaller ranges for quick testing (3×2×2×2×2 = 48 combinations)
+QUICK_HYPERPARAMS = {
+    'blur_kernel': [3, 5, 7],  # 3 values
+    'canny_low': [30, 50],     # 2 values
+    'canny_high': [100, 150],  # 2 values
+    'epsilon_factor': [0.02, 0.03],  # 2 values
+    'min_area': [1000, 2000]   # 2 values
+}
 
 
 def document_scanner_with_hyperparams(image_path, blur_kernel, canny_low, canny_high, 
@@ -12,7 +32,7 @@ def document_scanner_with_hyperparams(image_path, blur_kernel, canny_low, canny_
     Document scanner with configurable hyperparameters
     
     Args:
-        image_path: Path to input image
+        image_path: Path to input image, image array or Frame
         blur_kernel: Gaussian blur kernel size (odd number)
         canny_low: Lower threshold for Canny edge detection
         canny_high: Upper threshold for Canny edge detection
@@ -24,20 +44,23 @@ def document_scanner_with_hyperparams(image_path, blur_kernel, canny_low, canny_
         Number of quadrilaterals found, result images
     """
     # Load image
-    img = cv2.imread(image_path)
-    if img is None:
-        print(f"Error: Could not load image from {image_path}")
+    frame = as_frame(image_path)
+    if frame is None:
         return 0, None, None, None
     
+    img = frame.image
     original = img.copy()
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
     
-    # Preprocess with hyperparameters
-    blurred = cv2.GaussianBlur(gray, (blur_kernel, blur_kernel), 0)
-    edges = cv2.Canny(blurred, canny_low, canny_high)
+    # Preprocess with hyperparameters (cached on the frame, so combinations
+    # that only differ in epsilon_factor or min_area reuse the edge map)
+    blurred = frame.blurred((blur_kernel, blur_kernel), 0)
+    edges = frame.canny(canny_low, canny_high, blur=blur_kernel)
     
     # Find contours
-    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    contours = frame.cached(
+        ("contours", blur_kernel, canny_low, canny_high),
+        lambda: cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[0]
+    )
     
     # Filter quadrilaterals with hyperparameters
     quads = []
@@ -105,25 +128,103 @@ def document_scanner_with_hyperparams(image_path, blur_kernel, canny_low, canny_
     return len(quads), result_original, result_edges, result_contours
 
 
-def hyperparameter_tuning(image_path, base_output_dir="hyperparameter_results"):
+def run_combination(frame, index, param_dict, base_output_dir):
+    """
+    Run one hyperparameter combination and build its summary entry
+    
+    Args:
+        frame: Frame (or image path) to scan
+        index: Zero-based combination index
+        param_dict: Hyperparameter values
+        base_output_dir: Base directory for saving results
+    
+    Returns:
+        Summary dictionary for hyperparameter_summary.json
+    """
+    # Create directory name from parameters
+    dir_name = f"blur{param_dict['blur_kernel']}_canny{param_dict['canny_low']}-{param_dict['canny_high']}_eps{param_dict['epsilon_factor']}_area{param_dict['min_area']}"
+    save_dir = os.path.join(base_output_dir, dir_name)
+    
+    # Run scanner with these parameters
+    num_quads, original, edges, contours = document_scanner_with_hyperparams(
+        frame, 
+        param_dict['blur_kernel'],
+        param_dict['canny_low'],
+        param_dict['canny_high'],
+        param_dict['epsilon_factor'],
+        param_dict['min_area'],
+        save_dir
+    )
+    
+    # Store results
+    return {
+        'combination': index + 1,
+        'parameters': param_dict,
+        'num_quadrilaterals': num_quads,
+        'directory': dir_name
+    }
+
+
+def _combination_task(task):
+    return run_combination(*task)
+
+
+def _run_combinations(frame, param_combinations, param_names, base_output_dir, plan,
+                      progress_every):
+    """
+    Run every combination, serially or across worker processes
+    
+    Args:
+        frame: Frame shared by all combinations
+        param_combinations: Tuples of hyperparameter values
+        param_names: Names matching each tuple position
+        base_output_dir: Base directory for saving results
+        plan: None (serial), "auto" or a scheduler.ExecutionPlan
+        progress_every: Print progress every this many combinations (serial)
+    
+    Returns:
+        List of summary dictionaries, in combination order
+    """
+    tasks = [(frame, i, dict(zip(param_names, params)), base_output_dir)
+             for i, params in enumerate(param_combinations)]
+    plan = resolve_plan(plan, len(tasks), SWEEP_STAGE_MIX)
+    
+    if plan.processes > 1:
+        # Consecutive combinations share edge maps, and run_plan keeps them
+        # together in contiguous chunks on the same worker
+        print(f"Using {plan.processes} processes x {plan.threads_per_process} OpenCV threads")
+        return run_plan(_combination_task, tasks, plan)
+    
+    results_summary = []
+    with opencv_threads(plan.threads_per_process):
+        for task in tasks:
+            results_summary.append(_combination_task(task))
+            
+            # Print progress
+            if len(results_summary) % progress_every == 0:
+                print(f"Completed {len(results_summary)}/{len(tasks)} combinations")
+    return results_summary
+
+
+def hyperparameter_tuning(image_path, base_output_dir="hyperparameter_results", plan=None):
     """
     Perform hyperparameter tuning for document scanner
     
     Args:
-        image_path: Path to input image
+        image_path: Path to input image, image array or Frame
         base_output_dir: Base directory for saving results
+        plan: None to run serially, "auto" to let the scheduler pick processes
+            and OpenCV threads, or a scheduler.ExecutionPlan
     
     Returns:
         Tuple of (results_summary, best_result)
     """
-    # Define hyperparameter ranges
-    hyperparams = {
-        'blur_kernel': [3, 5, 7, 9],  # Gaussian blur kernel sizes
-        'canny_low': [30, 50, 70, 100],  # Lower Canny threshold
-        'canny_high': [100, 150, 200, 250],  # Upper Canny threshold
-        'epsilon_factor': [0.01, 0.02, 0.03, 0.05],  # Contour approximation factor
-        'min_area': [500, 1000, 2000, 5000]  # Minimum area threshold
-    }
+    # Load the image once; every combination shares its derived images
+    frame = as_frame(image_path)
+    if frame is None:
+        return [], None
+    
+    hyperparams = HYPERPARAMS
     
     # Create base output directory
     os.makedirs(base_output_dir, exist_ok=True)
@@ -134,38 +235,8 @@ def hyperparameter_tuning(image_path, base_output_dir="hyperparameter_results"):
     
     print(f"Testing {len(param_combinations)} hyperparameter combinations...")
     
-    results_summary = []
-    
-    for i, params in enumerate(param_combinations):
-        # Create parameter dictionary
-        param_dict = dict(zip(param_names, params))
-        
-        # Create directory name from parameters
-        dir_name = f"blur{param_dict['blur_kernel']}_canny{param_dict['canny_low']}-{param_dict['canny_high']}_eps{param_dict['epsilon_factor']}_area{param_dict['min_area']}"
-        save_dir = os.path.join(base_output_dir, dir_name)
-        
-        # Run scanner with these parameters
-        num_quads, original, edges, contours = document_scanner_with_hyperparams(
-            image_path, 
-            param_dict['blur_kernel'],
-            param_dict['canny_low'],
-            param_dict['canny_high'],
-            param_dict['epsilon_factor'],
-            param_dict['min_area'],
-            save_dir
-        )
-        
-        # Store results
-        results_summary.append({
-            'combination': i + 1,
-            'parameters': param_dict,
-            'num_quadrilaterals': num_quads,
-            'directory': dir_name
-        })
-        
-        # Print progress
-        if (i + 1) % 50 == 0:
-            print(f"Completed {i + 1}/{len(param_combinations)} combinations")
+    results_summary = _run_combinations(frame, param_combinations, param_names,
+                                        base_output_dir, plan, progress_every=50)
     
     # Save summary results
     with open(os.path.join(base_output_dir, "hyperparameter_summary.json"), "w") as f:
@@ -183,25 +254,25 @@ def hyperparameter_tuning(image_path, base_output_dir="hyperparameter_results"):
     return results_summary, best_result
 
 
-def quick_hyperparameter_test(image_path, base_output_dir="quick_test_results"):
+def quick_hyperparameter_test(image_path, base_output_dir="quick_test_results", plan=None):
     """
     Quick test with a smaller set of hyperparameters
     
     Args:
-        image_path: Path to input image
+        image_path: Path to input image, image array or Frame
         base_output_dir: Base directory for saving results
+        plan: None to run serially, "auto" to let the scheduler pick processes
+            and OpenCV threads, or a scheduler.ExecutionPlan
     
     Returns:
         Tuple of (results_summary, best_result)
     """
-    # Define smaller hyperparameter ranges for quick testing
-    hyperparams = {
-        'blur_kernel': [3, 5, 7],  # 3 values
-        'canny_low': [30, 50],     # 2 values
-        'canny_high': [100, 150],  # 2 values
-        'epsilon_factor': [0.02, 0.03],  # 2 values
-        'min_area': [1000, 2000]   # 2 values
-    }
+    # Load the image once; every combination shares its derived images
+    frame = as_frame(image_path)
+    if frame is None:
+        return [], None
+    
+    hyperparams = QUICK_HYPERPARAMS
     
     # Create base output directory
     os.makedirs(base_output_dir, exist_ok=True)
@@ -212,38 +283,8 @@ def quick_hyperparameter_test(image_path, base_output_dir="quick_test_results"):
     
     print(f"Quick testing {len(param_combinations)} hyperparameter combinations...")
     
-    results_summary = []
-    
-    for i, params in enumerate(param_combinations):
-        # Create parameter dictionary
-        param_dict = dict(zip(param_names, params))
-        
-        # Create directory name from parameters
-        dir_name = f"blur{param_dict['blur_kernel']}_canny{param_dict['canny_low']}-{param_dict['canny_high']}_eps{param_dict['epsilon_factor']}_area{param_dict['min_area']}"
-        save_dir = os.path.join(base_output_dir, dir_name)
-        
-        # Run scanner with these parameters
-        num_quads, original, edges, contours = document_scanner_with_hyperparams(
-            image_path, 
-            param_dict['blur_kernel'],
-            param_dict['canny_low'],
-            param_dict['canny_high'],
-            param_dict['epsilon_factor'],
-            param_dict['min_area'],
-            save_dir
-        )
-        
-        # Store results
-        results_summary.append({
-            'combination': i + 1,
-            'parameters': param_dict,
-            'num_quadrilaterals': num_quads,
-            'directory': dir_name
-        })
-        
-        # Print progress
-        if (i + 1) % 10 == 0:
-            print(f"Completed {i + 1}/{len(param_combinations)} combinations")
+    results_summary = _run_combinations(frame, param_combinations, param_names,
+                                        base_output_dir, plan, progress_every=10)
     
     # Save summary results
     with open(os.path.join(base_output_dir, "hyperparameter_summary.json"), "w") as f:
@@ -258,3 +299,32 @@ def quick_hyperparameter_test(image_path, base_output_dir="quick_test_results"):
     print(f"Best parameters: {best_result['parameters']}")
     
     return results_summary, best_result
+
+
+def sweep_sources(sources, base_output_dir="hyperparameter_results", quick=False, plan=None,
+                  every_nth_frame=1, prefetch_items=2):
+    """
+    Sweep every image in directories, zip/tar archives and videos, reading
+    the next image in the background while the current one is swept
+    
+    Args:
+        sources: Path or list of paths (see sources.iter_images)
+        base_output_dir: Each image's results go to base_output_dir/<name>,
+            with name its path below the source directory (see
+            sources.source_stem)
+        quick: Sweep QUICK_HYPERPARAMS instead of HYPERPARAMS
+        plan: None, "auto" or a scheduler.ExecutionPlan, per image
+        every_nth_frame: Keep every n-th video frame
+        prefetch_items: Decoded images allowed to wait for the sweep
+    
+    Yields:
+        Tuples of (ref, results_summary, best_result), one per image
+    """
+    tune = quick_hyperparameter_test if quick else hyperparameter_tuning
+    sources = as_source_list(sources)
+    seen = {}
+    for ref, image in prefetch(iter_images(sources, every_nth_frame), max_items=prefetch_items):
+        print(f"\nSweeping {ref}")
+        stem = unique_stem(source_stem(ref, sources), seen)
+        results_summary, best_result = tune(image, os.path.join(base_output_dir, stem), plan)
+        yield ref, results_summary, best_result
@@ -0,0 +1,308 @@
+import time
+import cv2
+import numpy as np
+from itertools import combinations
+from .edge_params import DEFAULT_EDGE_PARAMS
+from .frame import as_frame
+from . import geometry
+
+# Tuning of find_line_quad(); lengths are fractions of the shorter side
+LINE_QUAD_DEFAULTS = {
+    "max_height": 480,            # Segments are extracted at this height
+    "min_length": 0.08,           # Shortest segment kept
+    "max_gap": 0.02,              # Largest gap bridged within one segment
+    "angle_tolerance": 25,        # Degrees a side may deviate from its direction
+    "min_direction_gap": 30,      # Degrees between the two side directions
+    "merge_distance": 0.015,      # Segments closer than this form one side
+    "min_side_length": 0.25,      # Total segment length for a side line
+    "max_lines": 8,               # Candidate sides kept per direction
+    "min_separation": 0.2,        # Distance between opposite sides
+    "min_area": 0.05,             # Quad area range, as a fraction of the frame
+    "max_area": 0.98,
+    "min_side_support": 0.3,      # Share of each side that must lie on edges
+    "min_mean_support": 0.5,      # ... and of the whole outline
+    "contrast_offset": 0.01,      # Distance either side of a side for its contrast
+}
+
+
+def detect_segments(edges, min_length, max_gap):
+    """
+    Probabilistic Hough line segments of an edge map
+
+    Args:
+        edges: Binary edge image
+        min_length: Shortest segment in pixels
+        max_gap: Largest gap bridged within a segment, in pixels
+
+    Returns:
+        float64 array (N, 4) of x1, y1, x2, y2
+    """
+    segments = cv2.HoughLinesP(edges, 1, np.pi / 180, threshold=max(10, int(min_length / 2)),
+                               minLineLength=min_length, maxLineGap=max_gap)
+    if segments is None:
+        return np.empty((0, 4))
+    return segments.reshape(-1, 4).astype(np.float64)
+
+
+def _dominant_directions(angles, lengths, tolerance, min_gap):
+    # Length-weighted orientation histogram (1 degree bins, circular over 180)
+    hist = np.bincount(np.round(angles).astype(int) % 180, weights=lengths, minlength=180)
+    window = np.ones(2 * int(tolerance // 2) + 1)
+    smoothed = np.convolve(np.concatenate([hist[-len(window):], hist, hist[:len(window)]]),
+                           window, mode="same")[len(window):-len(window)]
+    first = int(np.argmax(smoothed))
+    distance = np.abs((np.arange(180) - first + 90) % 180 - 90)
+    smoothed = np.where(distance >= min_gap, smoothed, 0)
+    second = int(np.argmax(smoothed))
+    if smoothed[second] <= 0:
+        return None
+    return first, second
+
+
+def _side_lines(segments, lengths, direction, merge_distance, min_length, max_lines):
+    # Merge collinear segments into side lines, longest segment first; a
+    # segment joins a line when both its ends lie within merge_distance
+    ends = np.concatenate([segments.reshape(-1, 2, 2), np.ones((len(segments), 2, 1))], axis=2)
+    free = np.ones(len(segments), dtype=bool)
+    lines = []
+    for seed in np.argsort(-lengths):
+        if not free[seed]:
+            continue
+        line = np.cross(ends[seed, 0], ends[seed, 1])
+        line /= np.hypot(line[0], line[1])
+        members = free & (np.abs(ends @ line).max(axis=1) <= merge_distance)
+        members[seed] = True
+        free &= ~members
+
+        points = segments[members].reshape(-1, 2).astype(np.float32)
+        vx, vy, x0, y0 = cv2.fitLine(points, cv2.DIST_L2, 0, 0.01, 0.01).ravel()
+        # Homogeneous line through (x0, y0) with direction (vx, vy)
+        fitted = np.cross([x0, y0, 1.0], [x0 + vx, y0 + vy, 1.0])
+        if lengths[members].sum() >= min_length:
+            lines.append((np.array([x0, y0, 1.0]), fitted / np.hypot(vx, vy)))
+
+    # Text lines, rulings and table borders run parallel to the page sides
+    # inside the page, so keep the outermost lines on both sides rather
+    # than the strongest ones
+    normal = np.deg2rad(direction + 90)
+    lines.sort(key=lambda item: item[0][0] * np.cos(normal) + item[0][1] * np.sin(normal))
+    if len(lines) > max_lines:
+        lines = lines[:max_lines // 2] + lines[-(max_lines - max_lines // 2):]
+    return lines
+
+
+def _side_points(quads, samples):
+    # (N, 4, samples, 2) points along each side, and each side's unit normal
+    t = np.linspace(0, 1, samples)[None, None, :, None]
+    start = quads[:, :, None, :]
+    end = np.roll(quads, -1, axis=1)[:, :, None, :]
+    direction = end - start
+    normal = np.stack([-direction[..., 1], direction[..., 0]], axis=-1)
+    normal /= np.maximum(np.linalg.norm(normal, axis=-1, keepdims=True), 1e-9)
+    return start + direction * t, normal
+
+
+def _sample(image, points):
+    h, w = image.shape
+    x = np.clip(np.rint(points[..., 0]).astype(int), 0, w - 1)
+    y = np.clip(np.rint(points[..., 1]).astype(int), 0, h - 1)
+    return image[y, x]
+
+
+def _side_support(edges, quads, samples=64):
+    # Share of points along each side of each quad that fall on an edge
+    points, _ = _side_points(quads, samples)
+    return (_sample(edges, points) > 0).mean(axis=2)
+
+
+def outline_support(edges, corners, radius=1, samples=64):
+    """
+    Share of a quad's outline that lies on edges, e.g. as a detection
+    confidence
+
+    Args:
+        edges: Binary edge image
+        corners: (4, 2) corners in edges' pixel coordinates, in cyclic order
+        radius: Pixels a point may be off an edge and still count
+        samples: Points checked per side
+
+    Returns:
+        float64 array (4,) of per-side support in 0-1
+    """
+    points, _ = _side_points(np.asarray(corners, dtype=np.float64)[None], samples)
+    hit = np.zeros(points.shape[:-1], dtype=bool)
+    for dy in range(-radius, radius + 1):
+        for dx in range(-radius, radius + 1):
+            hit |= _sample(edges, points + (dx, dy)) > 0
+    return hit.mean(axis=2)[0]
+
+
+def _side_contrast(gray, quads, offset, samples=64):
+    # Mean intensity step across each side (0-1); the page boundary separates
+    # paper from background, a parallel line in the background usually not
+    points, normal = _side_points(quads, samples)
+    step = (_sample(gray, points + normal * offset).astype(np.float64)
+            - _sample(gray, points - normal * offset))
+    return np.abs(step.mean(axis=2)) / 255
+
+
+def candidate_quads(segments, shape, **options):
+    """
+    Group segments into two side directions and intersect pairs of sides
+
+    Args:
+        segments: (N, 4) segments from detect_segments
+        shape: (height, width) of the edge map
+        **options: Overrides for LINE_QUAD_DEFAULTS
+
+    Returns:
+        float64 array (M, 4, 2) of candidate quads, corners in cyclic order
+    """
+    o = dict(LINE_QUAD_DEFAULTS, **options)
+    h, w = shape
+    short = min(h, w)
+    if len(segments) < 4:
+        return np.empty((0, 4, 2))
+
+    delta = segments[:, 2:] - segments[:, :2]
+    lengths = np.hypot(delta[:, 0], delta[:, 1])
+    angles = np.rad2deg(np.arctan2(delta[:, 1], delta[:, 0])) % 180
+    directions = _dominant_directions(angles, lengths, o["angle_tolerance"], o["min_direction_gap"])
+    if directions is None:
+        return np.empty((0, 4, 2))
+
+    sides = []
+    for direction in directions:
+        mask = np.abs((angles - direction + 90) % 180 - 90) <= o["angle_tolerance"]
+        sides.append(_side_lines(segments[mask], lengths[mask], direction,
+                                 o["merge_distance"] * short, o["min_side_length"] * short,
+                                 o["max_lines"]))
+
+    def pairs(lines):
+        # Opposite sides: each line's centre is far enough from the other line
+        return [(a, b) for a, b in combinations(lines, 2)
+                if min(abs(a[0] @ b[1]), abs(b[0] @ a[1])) >= o["min_separation"] * short]
+
+    quads = []
+    for (_, a0), (_, a1) in pairs(sides[0]):
+        for (_, b0), (_, b1) in pairs(sides[1]):
+            corners = np.array([np.cross(a0, b0), np.cross(b0, a1),
+                                np.cross(a1, b1), np.cross(b1, a0)])
+            if np.any(np.abs(corners[:, 2]) < 1e-9):
+                continue
+            quads.append(corners[:, :2] / corners[:, 2:])
+    if not quads:
+        return np.empty((0, 4, 2))
+
+    quads = np.array(quads)
+    # Corners may sit slightly outside the frame (page cut by the border)
+    margin = 0.1 * short
+    inside = np.all((quads[..., 0] > -margin) & (quads[..., 0] < w + margin)
+                    & (quads[..., 1] > -margin) & (quads[..., 1] < h + margin), axis=1)
+    area = geometry.quad_areas(quads) / (h * w)
+    keep = inside & geometry.is_convex(quads) & (area > o["min_area"]) & (area < o["max_area"])
+    return quads[keep]
+
+
+def find_line_quad(image, params=None, info=None, **options):
+    """
+    Find the page as four dominant straight sides instead of one contour
+
+    Segments survive clutter that touches the page, which merges the page
+    into the background for the contour search. Segments are extracted on a
+    downscaled edge map, grouped into two side directions, merged into side
+    lines and every pair of pairs is intersected into a candidate quad. The
+    candidate whose four sides are best covered by edges (weighted towards
+    larger quads, so the page wins over its own text block) is returned.
+
+    Args:
+        image: Image or Frame, at processing resolution
+        params: EdgeParams supplying the Canny thresholds (default
+            DEFAULT_EDGE_PARAMS)
+        info: Optional dict, filled with "segments" (count) and
+            "side_support" (per-side edge coverage of the chosen quad)
+        **options: Overrides for LINE_QUAD_DEFAULTS
+
+    Returns:
+        Tuple of (corners, edges): float32 corners (4, 2) ordered TL, TR,
+        BR, BL in the input's pixel coordinates (None if no quad qualified),
+        and the downscaled edge map
+    """
+    o = dict(LINE_QUAD_DEFAULTS, **options)
+    frame = as_frame(image)
+    small = frame.resized(o["max_height"])
+    scale = frame.image.shape[0] / small.image.shape[0]
+    params = params or DEFAULT_EDGE_PARAMS
+    edges = small.canny(params.canny_low, params.canny_high, blur=(5, 5))
+
+    h, w = edges.shape
+    short = min(h, w)
+    segments = detect_segments(edges, o["min_length"] * short, o["max_gap"] * short)
+    quads = candidate_quads(segments, (h, w), **options)
+    if info is not None:
+        info["segments"] = len(segments)
+    if len(quads) == 0:
+        return None, edges
+
+    support = _side_support(cv2.dilate(edges, np.ones((3, 3), np.uint8)), quads)
+    area = geometry.quad_areas(quads) / (h * w)
+    # Hands and the frame border often hide part of one side
+    valid = (support.min(axis=1) >= o["min_side_support"]) & (support.mean(axis=1) >= o["min_mean_support"])
+    contrast = _side_contrast(small.blurred((5, 5)), quads, o["contrast_offset"] * short)
+    score = np.where(valid, support.mean(axis=1) * contrast.mean(axis=1) * np.sqrt(area), -1)
+    best = int(np.argmax(score))
+    if score[best] < 0:
+        return None, edges
+    if info is not None:
+        info["side_support"] = support[best]
+    corners = geometry.order_corners(quads[best] * scale)[0]
+    return corners, edges
+
+
+def benchmark_detectors(images, detectors=("contour", "lines"), repeats=3):
+    """
+    Compare document detectors on the same images
+
+    Args:
+        images: Paths or images
+        detectors: Values of find_document_corners' detector argument
+        repeats: Timed runs per image (the median is reported)
+
+    Returns:
+        List of dicts with "image", "detector", "ms", "fallback_level" and
+        "corners"
+    """
+    from .document_scanner import find_document_corners
+
+    rows = []
+    for index, image in enumerate(images):
+        frame = as_frame(image)
+        if frame is None:
+            print(f"Could not load {image}")
+            continue
+        frame = frame.resized(1000)
+        for detector in detectors:
+            times = []
+            for _ in range(repeats):
+                # Fresh cache per run so no detector reuses another's edge maps
+                run_frame = as_frame(frame.image)
+                run_info = {}
+                start = time.perf_counter()
+                corners, _ = find_document_corners(run_frame, info=run_info, detector=detector)
+                times.append(time.perf_counter() - start)
+            rows.append({"image": image if isinstance(image, str) else index,
+                         "detector": detector, "ms": float(np.median(times)) * 1000,
+                         "fallback_level": run_info["fallback_level"], "corners": corners})
+    return rows
+
+
+if __name__ == "__main__":
+    import sys
+    from .document_scanner import FALLBACK_LEVELS
+
+    paths = sys.argv[1:] or ["document_1_1752701340839.jpg", "document_2_1752701338803.jpg",
+                             "quadrilateral.png", "img.png"]
+    print(f"{'image':<34}{'detector':>10}{'ms':>9}  fallback")
+    for row in benchmark_detectors(paths):
+        print(f"{str(row['image']):<34}{row['detector']:>10}{row['ms']:>9.1f}  "
+              f"{FALLBACK_LEVELS[row['fallback_level']]}")
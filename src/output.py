@@ -0,0 +1,383 @@
+import io
+import os
+import struct
+import zlib
+import cv2
+import numpy as np
+from collections import namedtuple
+
+PackedPage = namedtuple("PackedPage", [
+    "bits",    # uint8 array (height, ceil(width / 8)), 8 pixels per byte, 1 = white
+    "width",   # Page width in pixels
+    "height",  # Page height in pixels
+])
+
+# Page compression inside TIFF and PDF files
+COMPRESSION_G4 = "g4"            # CCITT Group 4 (needs Pillow)
+COMPRESSION_DEFLATE = "deflate"  # zlib on the packed bits (standard library only)
+
+# TIFF tag values
+_TIFF_DEFLATE = 8
+_TIFF_G4 = 4
+_TIFF_BLACK_IS_ZERO = 1
+
+
+def pack_page(scanned, threshold=127):
+    """
+    Bit-pack a binarized page, 8 pixels per byte
+
+    Args:
+        scanned: 2D uint8 image holding (close to) 0 and 255
+        threshold: Pixels above this are white
+
+    Returns:
+        PackedPage, 8x smaller than the uint8 image
+    """
+    if isinstance(scanned, PackedPage):
+        return scanned
+    bits = np.packbits(scanned > threshold, axis=1)
+    return PackedPage(bits, scanned.shape[1], scanned.shape[0])
+
+
+def unpack_page(page):
+    """
+    Expand a PackedPage back to a uint8 0/255 image
+
+    Args:
+        page: PackedPage
+
+    Returns:
+        2D uint8 image
+    """
+    bits = np.unpackbits(page.bits, axis=1, count=page.width)
+    return bits * np.uint8(255)
+
+
+def _pillow():
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    return Image
+
+
+def resolve_compression(compression=None):
+    """
+    Pick the page compression for TIFF and PDF output
+
+    Args:
+        compression: COMPRESSION_G4, COMPRESSION_DEFLATE, or None for G4
+            when Pillow is installed and Deflate otherwise
+
+    Returns:
+        COMPRESSION_G4 or COMPRESSION_DEFLATE
+    """
+    if compression in (None, COMPRESSION_G4):
+        if _pillow() is not None:
+            return COMPRESSION_G4
+        if compression == COMPRESSION_G4:
+            print("Warning: CCITT G4 needs Pillow (pip install document-scanner[tiff]); "
+                  "using Deflate")
+        return COMPRESSION_DEFLATE
+    return compression
+
+
+def encode_png(page):
+    """
+    Encode a page as a 1-bit PNG
+
+    Args:
+        page: PackedPage or binarized uint8 image
+
+    Returns:
+        PNG file contents as bytes
+    """
+    image = unpack_page(page) if isinstance(page, PackedPage) else page
+    ok, buf = cv2.imencode(".png", image, [cv2.IMWRITE_PNG_BILEVEL, 1])
+    return buf.tobytes()
+
+
+def _tiff_value(data, endian, typ, count, value_field):
+    size = {3: 2, 4: 4}[typ]
+    fmt = endian + ("H" if typ == 3 else "I") * count
+    if size * count <= 4:
+        return struct.unpack(fmt, value_field[:size * count])
+    offset, = struct.unpack(endian + "I", value_field)
+    return struct.unpack(fmt, data[offset:offset + size * count])
+
+
+def _read_tiff_strips(data):
+    """Strips and photometric interpretation of the first page of a TIFF"""
+    endian = "<" if data[:2] == b"II" else ">"
+    ifd, = struct.unpack(endian + "I", data[4:8])
+    count, = struct.unpack(endian + "H", data[ifd:ifd + 2])
+    tags = {}
+    for i in range(count):
+        entry = data[ifd + 2 + 12 * i:ifd + 14 + 12 * i]
+        tag, typ, n = struct.unpack(endian + "HHI", entry[:8])
+        if tag in (262, 273, 278, 279):
+            tags[tag] = _tiff_value(data, endian, typ, n, entry[8:])
+    strips = [data[offset:offset + size] for offset, size in zip(tags[273], tags[279])]
+    return strips, tags[262][0], tags[278][0]
+
+
+def encode_g4(page):
+    """
+    CCITT Group 4 encode a page with Pillow
+
+    Args:
+        page: PackedPage
+
+    Returns:
+        Tuple of (strips, photometric, rows_per_strip). Pillow versions
+        without the strip_size option may return several strips.
+    """
+    Image = _pillow()
+    image = Image.frombytes("1", (page.width, page.height), page.bits.tobytes())
+    buf = io.BytesIO()
+    image.save(buf, "TIFF", compression="group4", strip_size=2 ** 31 - 1)
+    return _read_tiff_strips(buf.getvalue())
+
+
+def _encode_strips(page, compression):
+    """Compressed strips of one page: (tiff_code, strips, photometric, rows_per_strip)"""
+    if compression == COMPRESSION_G4:
+        strips, photometric, rows = encode_g4(page)
+        return _TIFF_G4, strips, photometric, rows
+    return _TIFF_DEFLATE, [zlib.compress(page.bits.tobytes(), 6)], _TIFF_BLACK_IS_ZERO, page.height
+
+
+class TiffWriter:
+    """
+    Streaming multi-page bilevel TIFF writer.
+
+    Each add_page() appends the page's strips and directory to the file and
+    links it from the previous directory, so only one page is ever held in
+    memory regardless of how many pages the file gets.
+    """
+
+    def __init__(self, path, compression=None, dpi=300):
+        """
+        Args:
+            path: Output .tif path
+            compression: COMPRESSION_G4, COMPRESSION_DEFLATE or None (see
+                resolve_compression)
+            dpi: Resolution recorded for every page
+        """
+        self.compression = resolve_compression(compression)
+        self.dpi = dpi
+        self.pages = 0
+        self._file = open(path, "wb")
+        self._file.write(b"II*\x00\x00\x00\x00\x00")
+        # Where the offset of the next directory has to be written
+        self._link = 4
+
+    def add_page(self, page):
+        """
+        Append one page
+
+        Args:
+            page: PackedPage or binarized uint8 image
+        """
+        page = pack_page(page)
+        code, strips, photometric, rows = _encode_strips(page, self.compression)
+        f = self._file
+
+        offsets = []
+        for strip in strips:
+            offsets.append(f.tell())
+            f.write(strip)
+        if f.tell() % 2:
+            f.write(b"\x00")
+
+        resolution = f.tell()
+        f.write(struct.pack("<IIII", self.dpi, 1, self.dpi, 1))
+        if len(strips) > 1:
+            offsets_at = f.tell()
+            f.write(struct.pack(f"<{len(strips)}I", *offsets))
+            counts_at = f.tell()
+            f.write(struct.pack(f"<{len(strips)}I", *(len(s) for s in strips)))
+        else:
+            offsets_at, counts_at = offsets[0], len(strips[0])
+
+        # (tag, type, count, value); type 3 = SHORT, 4 = LONG, 5 = RATIONAL
+        entries = [
+            (256, 4, 1, page.width),
+            (257, 4, 1, page.height),
+            (258, 3, 1, 1),               # BitsPerSample
+            (259, 3, 1, code),            # Compression
+            (262, 3, 1, photometric),
+            (273, 4, len(strips), offsets_at),
+            (277, 3, 1, 1),               # SamplesPerPixel
+            (278, 4, 1, rows),
+            (279, 4, len(strips), counts_at),
+            (282, 5, 1, resolution),
+            (283, 5, 1, resolution + 8),
+            (296, 3, 1, 2),               # ResolutionUnit: inch
+        ]
+        if code == _TIFF_G4:
+            entries.append((293, 4, 1, 0))  # T6Options
+        # Readers (libtiff) require directory entries in ascending tag order
+        entries.sort()
+
+        directory = f.tell()
+        f.write(struct.pack("<H", len(entries)))
+        for tag, typ, count, value in entries:
+            if typ == 3:
+                f.write(struct.pack("<HHIHH", tag, typ, count, value, 0))
+            else:
+                f.write(struct.pack("<HHII", tag, typ, count, value))
+        next_link = f.tell()
+        f.write(b"\x00\x00\x00\x00")
+
+        f.seek(self._link)
+        f.write(struct.pack("<I", directory))
+        f.seek(0, os.SEEK_END)
+        self._link = next_link
+        self.pages += 1
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PdfWriter:
+    """
+    Streaming multi-page PDF writer for bilevel pages.
+
+    Every page becomes a 1-bit image XObject (CCITT G4 or Flate) written to
+    the file as soon as it is added; close() writes the page tree and the
+    cross-reference table, which only hold byte offsets.
+    """
+
+    def __init__(self, path, compression=None, dpi=300):
+        """
+        Args:
+            path: Output .pdf path
+            compression: COMPRESSION_G4, COMPRESSION_DEFLATE or None (see
+                resolve_compression)
+            dpi: Resolution used to size each page
+        """
+        self.compression = resolve_compression(compression)
+        self.dpi = dpi
+        self.pages = 0
+        self._file = open(path, "wb")
+        self._file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._offsets = {}
+        self._page_objects = []
+        # 1 is the catalog and 2 the page tree, both written by close()
+        self._next_object = 3
+
+    def _write_object(self, number, dictionary, stream=None):
+        self._offsets[number] = self._file.tell()
+        self._file.write(f"{number} 0 obj\n".encode())
+        if stream is None:
+            self._file.write(dictionary.encode() + b"\nendobj\n")
+            return
+        self._file.write(f"{dictionary[:-2]} /Length {len(stream)} >>\nstream\n".encode())
+        self._file.write(stream)
+        self._file.write(b"\nendstream\nendobj\n")
+
+    def _image_stream(self, page):
+        if self.compression == COMPRESSION_G4:
+            strips, photometric, _ = encode_g4(page)
+            # CCITTFaxDecode needs one continuous G4 stream
+            if len(strips) == 1:
+                black_is_1 = "true" if photometric == _TIFF_BLACK_IS_ZERO else "false"
+                return ("/Filter /CCITTFaxDecode /DecodeParms << /K -1 "
+                        f"/Columns {page.width} /Rows {page.height} /BlackIs1 {black_is_1} >>",
+                        strips[0])
+        # Packed bits are already DeviceGray 1-bit samples (1 = white)
+        return "/Filter /FlateDecode", zlib.compress(page.bits.tobytes(), 6)
+
+    def add_page(self, page):
+        """
+        Append one page
+
+        Args:
+            page: PackedPage or binarized uint8 image
+        """
+        page = pack_page(page)
+        image, content, page_object = range(self._next_object, self._next_object + 3)
+        self._next_object += 3
+
+        filters, data = self._image_stream(page)
+        self._write_object(image, (
+            f"<< /Type /XObject /Subtype /Image /Width {page.width} /Height {page.height} "
+            f"/ColorSpace /DeviceGray /BitsPerComponent 1 {filters} >>"), data)
+
+        width = page.width * 72.0 / self.dpi
+        height = page.height * 72.0 / self.dpi
+        self._write_object(content, "<< >>",
+                           f"q {width:.2f} 0 0 {height:.2f} 0 0 cm /Im0 Do Q".encode())
+        self._write_object(page_object, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width:.2f} {height:.2f}] "
+            f"/Resources << /XObject << /Im0 {image} 0 R >> >> /Contents {content} 0 R >>"))
+        self._page_objects.append(page_object)
+        self.pages += 1
+
+    def close(self):
+        kids = " ".join(f"{number} 0 R" for number in self._page_objects)
+        self._write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._page_objects)} >>")
+        self._write_object(1, "<< /Type /Catalog /Pages 2 0 R >>")
+
+        xref = self._file.tell()
+        lines = [f"xref\n0 {self._next_object}\n", "0000000000 65535 f \n"]
+        lines += [f"{self._offsets[n]:010d} 00000 n \n" for n in range(1, self._next_object)]
+        lines.append(f"trailer\n<< /Size {self._next_object} /Root 1 0 R >>\n"
+                     f"startxref\n{xref}\n%%EOF\n")
+        self._file.write("".join(lines).encode())
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_document(path, compression=None, dpi=300):
+    """
+    Multi-page writer chosen by file extension (.tif/.tiff or .pdf)
+
+    Args:
+        path: Output path
+        compression: Page compression (see resolve_compression)
+        dpi: Page resolution
+
+    Returns:
+        TiffWriter or PdfWriter, usable as a context manager
+    """
+    if path.lower().endswith(".pdf"):
+        return PdfWriter(path, compression, dpi)
+    return TiffWriter(path, compression, dpi)
+
+
+def save_page(path, scanned, compression=None, dpi=300):
+    """
+    Save one binarized page compactly, choosing the format by extension
+
+    .png is written as 1-bit PNG, .tif/.tiff and .pdf as single-page
+    documents; any other extension falls back to cv2.imwrite.
+
+    Args:
+        path: Output path
+        scanned: PackedPage or binarized uint8 image
+        compression: Page compression for TIFF/PDF (see resolve_compression)
+        dpi: Page resolution for TIFF/PDF
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".png":
+        with open(path, "wb") as f:
+            f.write(encode_png(scanned))
+    elif ext in (".tif", ".tiff", ".pdf"):
+        with open_document(path, compression, dpi) as writer:
+            writer.add_page(scanned)
+    else:
+        image = unpack_page(scanned) if isinstance(scanned, PackedPage) else scanned
+        cv2.imwrite(path, image)
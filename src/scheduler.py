@@ -0,0 +1,362 @@
+import math
+import multiprocessing
+import os
+import queue
+import time
+from collections import Counter, namedtuple
+from contextlib import contextmanager
+import cv2
+
+ExecutionPlan = namedtuple("ExecutionPlan", [
+    "processes",            # Worker processes
+    "threads_per_process",  # cv2.setNumThreads per worker (None keeps OpenCV's default)
+    "affinity",             # Per-worker CPU sets, or None to leave affinity alone; a
+                            # pinned worker runs one OpenCV thread per CPU in its set
+])
+
+# How well each pipeline stage uses OpenCV's internal threads (0 = serial)
+STAGE_PARALLELISM = {
+    "decode": 0.0,
+    "bilateral": 0.9,
+    "edges": 0.6,
+    "contours": 0.0,
+    "warp": 0.9,
+    "threshold": 0.8,
+    "python": 0.0,
+}
+
+# Typical share of per-image time spent in each stage
+SCAN_STAGE_MIX = {"decode": 0.15, "bilateral": 0.45, "edges": 0.15, "contours": 0.05,
+                  "warp": 0.1, "threshold": 0.1}
+SWEEP_STAGE_MIX = {"edges": 0.3, "contours": 0.2, "python": 0.2, "decode": 0.3}
+
+# Fork/join cost of each extra OpenCV thread, as a share of a task's
+# single-thread time
+THREAD_OVERHEAD = 0.01
+
+
+def available_cores():
+    """Number of CPUs this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def parallel_fraction(stage_mix):
+    """
+    Fraction of the work that speeds up with more OpenCV threads
+
+    Args:
+        stage_mix: Dictionary of stage name to share of time
+
+    Returns:
+        Value between 0 and 1
+    """
+    total = sum(stage_mix.values())
+    return sum(share * STAGE_PARALLELISM.get(stage, 0.0)
+               for stage, share in stage_mix.items()) / total
+
+
+def task_time(p, threads):
+    """
+    Predicted time of one task relative to its single-thread time
+
+    Amdahl's law plus a fork/join cost per extra thread, so past some
+    point more threads make a task slower.
+
+    Args:
+        p: Parallel fraction of the task (see parallel_fraction)
+        threads: OpenCV threads
+
+    Returns:
+        Relative task time
+    """
+    return (1 - p) + p / threads + THREAD_OVERHEAD * (threads - 1)
+
+
+def useful_threads(p, cores):
+    """
+    Thread count at which a task with parallel fraction p is fastest
+
+    Args:
+        p: Parallel fraction of the task
+        cores: Upper bound on the thread count
+
+    Returns:
+        Thread count between 1 and cores
+    """
+    return min(range(1, cores + 1), key=lambda threads: task_time(p, threads))
+
+
+def predicted_makespan(n_tasks, task_times):
+    """
+    Time until the last of n identical tasks finishes when every worker
+    takes the next task as soon as it is free
+
+    Args:
+        n_tasks: Number of tasks
+        task_times: Time one task takes on each worker
+
+    Returns:
+        Makespan in the same unit as task_times
+    """
+    if n_tasks <= 0:
+        return 0.0
+    counts = Counter(task_times)
+    rate = sum(workers / t for t, workers in counts.items())
+    best = math.inf
+    for t in counts:
+        # The last task ends at a multiple of some worker's task time; start
+        # from the bound set by the total rate and step up
+        m = max(1, math.floor(n_tasks / rate / t))
+        while sum(workers * math.floor(m * t / u + 1e-9) for u, workers in counts.items()) < n_tasks:
+            m += 1
+        best = min(best, m * t)
+    return best
+
+
+def split_cores(processes, cores, max_threads):
+    """
+    Share cores between workers as evenly as possible
+
+    Args:
+        processes: Number of workers
+        cores: CPUs to share
+        max_threads: Most threads worth giving one worker
+
+    Returns:
+        List of thread counts, one per worker, larger first
+    """
+    base, extra = divmod(cores, processes)
+    return [min(max_threads, base + (i < extra)) for i in range(processes)]
+
+
+def plan_execution(n_tasks, stage_mix=SCAN_STAGE_MIX, cores=None):
+    """
+    Choose processes x OpenCV threads so the machine is used without
+    oversubscription
+
+    For every process count the cores are split as evenly as possible
+    (when they do not divide, some workers get one more thread), capped at
+    the thread count past which the stage mix stops getting faster (see
+    task_time). Each split is scored by its predicted makespan with
+    workers pulling tasks as they finish. The shortest makespan wins; ties
+    go to the split keeping more cores busy, then to more processes.
+
+    Args:
+        n_tasks: Number of independent work items
+        stage_mix: Share of time per stage (see STAGE_PARALLELISM)
+        cores: CPUs to use (defaults to available_cores())
+
+    Returns:
+        ExecutionPlan; with uneven splits threads_per_process is the
+        smaller thread count and affinity carries each worker's CPUs
+    """
+    cores = cores or available_cores()
+    p = parallel_fraction(stage_mix)
+    max_threads = useful_threads(p, cores)
+
+    best = None
+    for processes in range(1, min(cores, max(1, n_tasks)) + 1):
+        threads = split_cores(processes, cores, max_threads)
+        makespan = predicted_makespan(n_tasks, [task_time(p, t) for t in threads])
+        key = (round(makespan, 9), -sum(threads), -processes)
+        if best is None or key < best[0]:
+            best = (key, threads)
+
+    _, threads = best
+    return ExecutionPlan(len(threads), min(threads), pin_cores(threads, cores))
+
+
+def pin_cores(threads, cores=None):
+    """
+    Split the available CPUs into one contiguous block per worker
+
+    Args:
+        threads: CPUs for each worker
+        cores: Number of CPUs to split (defaults to available_cores())
+
+    Returns:
+        List of CPU sets, or None where affinity is unsupported or the
+        blocks do not fit in the CPUs this process may run on
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        return None
+    cpus = sorted(os.sched_getaffinity(0))[:cores or None]
+    if sum(threads) > len(cpus):
+        return None
+    starts = [0]
+    for count in threads:
+        starts.append(starts[-1] + count)
+    return [set(cpus[start:end]) for start, end in zip(starts, starts[1:])]
+
+
+@contextmanager
+def opencv_threads(threads):
+    """
+    Temporarily set OpenCV's thread count in this process
+
+    Args:
+        threads: Thread count, or None to leave the current setting
+    """
+    previous = cv2.getNumThreads()
+    if threads is not None:
+        cv2.setNumThreads(threads)
+    try:
+        yield
+    finally:
+        cv2.setNumThreads(previous)
+
+
+def _init_worker(threads, cpu_sets):
+    if cpu_sets is not None:
+        # Each worker takes the next free CPU block. A worker the pool
+        # respawns finds the queue empty and keeps the parent's affinity
+        try:
+            cpus = cpu_sets.get(timeout=1)
+        except queue.Empty:
+            pass
+        else:
+            os.sched_setaffinity(0, cpus)
+            threads = len(cpus)
+    if threads is not None:
+        cv2.setNumThreads(threads)
+
+
+def iter_plan(func, items, plan):
+    """
+    Lazily map a picklable function over items following an execution plan
+
+    Results are yielded in item order as they complete, so callers can
+    stream them (e.g. into a multi-page file) instead of holding them all.
+
+    Args:
+        func: Module-level function taking one item
+        items: Work items
+        plan: ExecutionPlan
+
+    Yields:
+        Results, in item order
+    """
+    items = list(items)
+    if plan.processes <= 1:
+        with opencv_threads(plan.threads_per_process):
+            for item in items:
+                yield func(item)
+        return
+
+    ctx = multiprocessing.get_context()
+    cpu_sets = None
+    if plan.affinity:
+        cpu_sets = ctx.Queue()
+        for cpus in plan.affinity:
+            cpu_sets.put(cpus)
+
+    # Contiguous chunks keep similar items (e.g. same image) on one worker
+    chunksize = max(1, len(items) // (plan.processes * 4))
+    with ctx.Pool(plan.processes, initializer=_init_worker,
+                  initargs=(plan.threads_per_process, cpu_sets)) as pool:
+        yield from pool.imap(func, items, chunksize=chunksize)
+
+
+def run_plan(func, items, plan):
+    """
+    Map a picklable function over items following an execution plan
+
+    Args:
+        func: Module-level function taking one item
+        items: Work items
+        plan: ExecutionPlan
+
+    Returns:
+        List of results, in item order
+    """
+    return list(iter_plan(func, items, plan))
+
+
+def resolve_plan(plan, n_tasks, stage_mix=SCAN_STAGE_MIX):
+    """
+    Turn a plan argument into an ExecutionPlan
+
+    Args:
+        plan: None (serial, OpenCV defaults), "auto", or an ExecutionPlan
+        n_tasks: Number of work items
+        stage_mix: Stage mix used for "auto"
+
+    Returns:
+        ExecutionPlan
+    """
+    if plan is None:
+        return ExecutionPlan(1, None, None)
+    if plan == "auto":
+        return plan_execution(n_tasks, stage_mix)
+    return plan
+
+
+def _benchmark_task(size):
+    # Import here so worker processes do not need the package at spawn time
+    from .document_scanner import document_scanner
+    image = _benchmark_image(size)
+    document_scanner(image)
+    return size
+
+
+def _benchmark_image(size):
+    import numpy as np
+    rng = np.random.default_rng(size[0])
+    image = rng.integers(40, 80, (size[1], size[0], 3), dtype=np.uint8)
+    w, h = size
+    quad = np.array([[w // 8, h // 8], [w * 7 // 8, h // 6], [w * 6 // 7, h * 7 // 8],
+                     [w // 7, h * 6 // 7]], dtype=np.int32)
+    cv2.fillConvexPoly(image, quad, (230, 230, 230))
+    return image
+
+
+def benchmark_plans(func=_benchmark_task, items=None, stage_mix=SCAN_STAGE_MIX, cores=None):
+    """
+    Compare the chosen plan with the two naive configurations
+
+    The naive settings are one process per core with OpenCV's default
+    threads (processes x threads oversubscribes the machine), and a single
+    process using every core through OpenCV threads.
+
+    Args:
+        func: Module-level function taking one item
+        items: Work items (defaults to 4 synthetic 1280x960 scans per core)
+        stage_mix: Stage mix used to choose the plan
+        cores: CPUs to use (defaults to available_cores())
+
+    Returns:
+        Dictionary of configuration name to (plan, items_per_second)
+    """
+    cores = cores or available_cores()
+    items = list(items) if items is not None else [(1280, 960)] * (4 * cores)
+    plans = {
+        "naive: process per core, default threads": ExecutionPlan(cores, None, None),
+        "naive: one process, all threads": ExecutionPlan(1, cores, None),
+        "chosen": plan_execution(len(items), stage_mix, cores),
+    }
+
+    results = {}
+    for name, plan in plans.items():
+        start = time.perf_counter()
+        run_plan(func, items, plan)
+        elapsed = time.perf_counter() - start
+        results[name] = (plan, len(items) / elapsed)
+        print(f"{name:<42} processes={plan.processes:<3} threads={plan.threads_per_process!s:<5}"
+              f" {len(items) / elapsed:8.2f} items/s")
+
+    # The plan comes from a model; say plainly whether it paid off here
+    chosen = results["chosen"][1]
+    beaten = [name for name, (_, rate) in results.items() if name != "chosen" and rate >= chosen]
+    if cores == 1:
+        print("Single core: every configuration runs serially, nothing to compare")
+    elif beaten:
+        print(f"Chosen plan did not beat: {', '.join(beaten)}")
+    else:
+        print("Chosen plan beat both naive configurations")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_plans()
@@ -246,6 +246,107 @@ class CVUtils {
     }
 }
 
+interface BackendResult {
+    frameId: number;
+    status: number;
+    processingMs: number;
+    corners: Point[] | null;
+}
+
+// Streams downscaled grayscale frames to the Python backend (src/ws_server.py)
+// and keeps the latest detected document corners
+class BackendDetector {
+    static readonly FRAME_HEADER_SIZE = 9;
+    static readonly RESULT_HEADER_SIZE = 9;
+    static readonly FLAG_GATE = 1;
+    static readonly STATUS_OK = 0;
+    static readonly STATUS_DROPPED = 2;
+    
+    private socket: WebSocket;
+    private canvas: HTMLCanvasElement;
+    private ctx: CanvasRenderingContext2D;
+    private nextFrameId: number = 0;
+    private inFlight: number = 0;
+    private readonly maxInFlight: number = 2;
+    private readonly width: number;
+    private scale: number = 1;
+    public latest: BackendResult | null = null;
+    
+    constructor(url: string, width: number = 480) {
+        this.width = width;
+        this.canvas = document.createElement('canvas');
+        this.ctx = this.canvas.getContext('2d', { willReadFrequently: true })!;
+        this.socket = new WebSocket(url);
+        this.socket.binaryType = 'arraybuffer';
+        this.socket.onmessage = (event: MessageEvent) => this.onResult(event.data as ArrayBuffer);
+        this.socket.onclose = () => { this.inFlight = 0; };
+    }
+    
+    get connected(): boolean {
+        return this.socket.readyState === WebSocket.OPEN;
+    }
+    
+    submit(video: HTMLVideoElement): boolean {
+        // Drop frames here too: never queue more than maxInFlight on the socket
+        if (!this.connected || this.inFlight >= this.maxInFlight) return false;
+        
+        this.scale = video.videoWidth / this.width;
+        const height = Math.round(video.videoHeight / this.scale);
+        if (this.canvas.width !== this.width || this.canvas.height !== height) {
+            this.canvas.width = this.width;
+            this.canvas.height = height;
+        }
+        this.ctx.drawImage(video, 0, 0, this.width, height);
+        const rgba = this.ctx.getImageData(0, 0, this.width, height).data;
+        
+        // Header (frame id, width, height, flags) followed by one byte per pixel
+        const message = new ArrayBuffer(BackendDetector.FRAME_HEADER_SIZE + this.width * height);
+        const header = new DataView(message, 0, BackendDetector.FRAME_HEADER_SIZE);
+        header.setUint32(0, this.nextFrameId++, true);
+        header.setUint16(4, this.width, true);
+        header.setUint16(6, height, true);
+        header.setUint8(8, BackendDetector.FLAG_GATE);
+        const gray = new Uint8Array(message, BackendDetector.FRAME_HEADER_SIZE);
+        for (let i = 0, j = 0; j < gray.length; i += 4, j++) {
+            gray[j] = (77 * rgba[i] + 150 * rgba[i + 1] + 29 * rgba[i + 2]) >> 8;
+        }
+        
+        this.socket.send(message);
+        this.inFlight++;
+        return true;
+    }
+    
+    private onResult(data: ArrayBuffer): void {
+        this.inFlight = Math.max(0, this.inFlight - 1);
+        const view = new DataView(data);
+        const status = view.getUint8(4);
+        // A dropped frame carries no corners; keep showing the last real result
+        if (status === BackendDetector.STATUS_DROPPED) return;
+        
+        let corners: Point[] | null = null;
+        if (status === BackendDetector.STATUS_OK && data.byteLength >= BackendDetector.RESULT_HEADER_SIZE + 32) {
+            corners = [];
+            for (let k = 0; k < 4; k++) {
+                const offset = BackendDetector.RESULT_HEADER_SIZE + 8 * k;
+                corners.push({
+                    x: view.getFloat32(offset, true) * this.scale,
+                    y: view.getFloat32(offset + 4, true) * this.scale
+                });
+            }
+        }
+        this.latest = {
+            frameId: view.getUint32(0, true),
+            status,
+            processingMs: view.getUint32(5, true) / 1000,
+            corners
+        };
+    }
+    
+    close(): void {
+        this.socket.close();
+    }
+}
+
 class DocumentScanner {
     private video: HTMLVideoElement;
     private overlayCanvas: HTMLCanvasElement;
@@ -261,6 +362,7 @@ class DocumentScanner {
     private resultsContainer: HTMLElement;
     
     public stream: MediaStream | null = null;
+    private backend: BackendDetector | null = null;
     private detectionEnabled: boolean = true;
     private isProcessing: boolean = false;
     private documentCount: number = 0;
@@ -294,6 +396,12 @@ class DocumentScanner {
         this.toggleDetectionBtn = document.getElementById('toggle-detection') as HTMLButtonElement;
         this.resultsContainer = document.getElementById('results-container') as HTMLElement;
         
+        // Optional Python backend, e.g. index.html?backend=ws://localhost:8765
+        const backendUrl = new URLSearchParams(window.location.search).get('backend');
+        if (backendUrl) {
+            this.backend = new BackendDetector(backendUrl);
+        }
+        
         this.initializeEventListeners();
         this.initializeParameterControls();
         this.showMessage('Document scanner ready! Custom computer vision algorithms loaded.', 'success');
@@ -377,6 +485,17 @@ class DocumentScanner {
             // Clear overlay
             this.overlayCtx.clearRect(0, 0, this.overlayCanvas.width, this.overlayCanvas.height);
             
+            // Let the Python backend detect the document when it is connected
+            if (this.backend?.connected) {
+                this.backend.submit(this.video);
+                const result = this.backend.latest;
+                if (result?.corners) {
+                    this.drawDocumentQuad(result.corners);
+                }
+                this.updatePerformanceInfo(result ? result.processingMs : 0, result?.corners ? 4 : 0);
+                return;
+            }
+            
             // Draw video frame to hidden canvas for processing
             this.hiddenCtx.drawImage(this.video, 0, 0, this.hiddenCanvas.width, this.hiddenCanvas.height);
             
@@ -479,6 +598,27 @@ class DocumentScanner {
         this.overlayCtx.fillText(`Corners detected: ${corners.length}`, 20, 35);
     }
     
+    public closeBackend(): void {
+        this.backend?.close();
+    }
+    
+    private drawDocumentQuad(corners: Point[]): void {
+        this.overlayCtx.strokeStyle = '#00FFFF';
+        this.overlayCtx.lineWidth = 3;
+        this.overlayCtx.beginPath();
+        corners.forEach((corner, index) => {
+            if (index === 0) {
+                this.overlayCtx.moveTo(corner.x, corner.y);
+            } else {
+                this.overlayCtx.lineTo(corner.x, corner.y);
+            }
+        });
+        this.overlayCtx.closePath();
+        this.overlayCtx.stroke();
+        
+        this.drawColoredCorners(corners.map(corner => ({ ...corner, response: 0 })));
+    }
+    
     private drawDocumentOutline(edgeImageData: ImageData): void {
         const { width, height, data } = edgeImageData;
         
@@ -826,4 +966,5 @@ document.addEventListener('DOMContentLoaded', () => {
 // Handle page unload to clean up camera stream
 window.addEventListener('beforeunload', () => {
     scanner?.stream?.getTracks().forEach(track => track.stop());
+    scanner?.closeBackend();
 });
@@ -0,0 +1,418 @@
+import os
+import posixpath
+import queue
+import tarfile
+import threading
+import zipfile
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+# An image inside a container is referenced as "<container>::<member>": a
+# zip/tar member name, or a frame index for videos. References are plain
+# strings, so they go into sweep manifests and worker tasks unchanged and
+# every entry point that takes an image path also takes a reference.
+ARCHIVE_SEPARATOR = "::"
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp")
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".webm")
+ZIP_EXTENSIONS = (".zip",)
+TAR_EXTENSIONS = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+
+# Decoded images waiting in prefetch() at most (besides the one being decoded)
+DEFAULT_PREFETCH_ITEMS = 4
+DEFAULT_PREFETCH_BYTES = 256 * 1024 * 1024
+
+# Archives read_image keeps open per thread (see _open_archive)
+MAX_OPEN_ARCHIVES = 8
+
+
+def source_kind(path):
+    """
+    Classify a path by what it holds
+
+    Args:
+        path: File or directory path
+
+    Returns:
+        "dir", "zip", "tar", "video", "image", or None for anything else
+    """
+    if os.path.isdir(path):
+        return "dir"
+    name = str(path).lower()
+    for kind, extensions in (("zip", ZIP_EXTENSIONS), ("tar", TAR_EXTENSIONS),
+                             ("video", VIDEO_EXTENSIONS), ("image", IMAGE_EXTENSIONS)):
+        if name.endswith(extensions):
+            return kind
+    return None
+
+
+def split_ref(ref):
+    """
+    Split a reference into its container and member
+
+    Args:
+        ref: Image path or "<container>::<member>" reference
+
+    Returns:
+        Tuple of (path, member), member None for a plain path
+    """
+    path, sep, member = str(ref).partition(ARCHIVE_SEPARATOR)
+    return path, (member if sep else None)
+
+
+def source_stem(ref, roots=None):
+    """
+    File-name-safe name for a reference, e.g. for output files
+
+    Args:
+        ref: Image path or reference
+        roots: Optional directory (or list of sources, e.g. those passed to
+            iter_images) the reference was found under; the stem then keeps
+            the path below the directory holding it, so a walk of d names
+            d/a.jpg "a" and d/sub/a.png "sub_a"
+
+    Returns:
+        The file stem for plain paths; container stem plus member path (or
+        frame number) otherwise, so members with the same base name in
+        different archive folders do not collide
+    """
+    path, member = split_ref(ref)
+    stem = os.path.basename(path)
+    for root in as_source_list(roots or []):
+        if os.path.isdir(root):
+            relative = os.path.relpath(path, root)
+            if relative != os.pardir and not relative.startswith(os.pardir + os.sep):
+                stem = relative.replace(os.sep, "_")
+                break
+    for extension in TAR_EXTENSIONS + ZIP_EXTENSIONS + VIDEO_EXTENSIONS + IMAGE_EXTENSIONS:
+        if stem.lower().endswith(extension):
+            stem = stem[:-len(extension)]
+            break
+    if member is None:
+        return stem
+    if member.isdigit():
+        return f"{stem}_f{int(member):06d}"
+    # Tars written as "tar -C dir ." name their members "./a.png"
+    member = posixpath.normpath(member).lstrip("/")
+    return f"{stem}_" + posixpath.splitext(member)[0].replace("/", "_")
+
+
+def common_root(refs):
+    """
+    Deepest directory holding every path or container in refs
+
+    Args:
+        refs: Image paths or references
+
+    Returns:
+        Directory path (source_stem roots), or None if there is none
+    """
+    directories = [os.path.dirname(os.path.abspath(split_ref(ref)[0])) for ref in refs]
+    if not directories:
+        return None
+    try:
+        return os.path.commonpath(directories)
+    except ValueError:
+        # Paths on different drives
+        return None
+
+
+def unique_stem(stem, seen):
+    """
+    Suffix stem with a counter if it was handed out before
+
+    Args:
+        stem: Stem from source_stem
+        seen: Dictionary of stem to uses, updated in place (one per batch)
+
+    Returns:
+        stem, or "<stem>_<n>" for its n-th repeat
+    """
+    count = seen.get(stem, 0)
+    seen[stem] = count + 1
+    if count == 0:
+        return stem
+    return unique_stem(f"{stem}_{count + 1}", seen)
+
+
+def decode_image(data):
+    """
+    Decode an encoded image held in memory
+
+    Args:
+        data: bytes (e.g. a zip or tar member)
+
+    Returns:
+        BGR image, or None if the bytes are not a readable image
+    """
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def _is_image_member(name):
+    return name.lower().endswith(IMAGE_EXTENSIONS) and not os.path.basename(name).startswith(".")
+
+
+def _iter_zip(path, decode):
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            if not info.is_dir() and _is_image_member(info.filename):
+                ref = f"{path}{ARCHIVE_SEPARATOR}{info.filename}"
+                yield ref, (decode_image(archive.read(info)) if decode else None)
+
+
+def _iter_tar(path, decode):
+    # Stream mode reads the archive front to back once, so compressed tars
+    # are never re-decompressed to seek
+    with tarfile.open(path, "r|*") as archive:
+        for member in archive:
+            if member.isfile() and _is_image_member(member.name):
+                ref = f"{path}{ARCHIVE_SEPARATOR}{member.name}"
+                yield ref, (decode_image(archive.extractfile(member).read()) if decode else None)
+
+
+def _iter_video(path, decode, every_nth_frame):
+    capture = cv2.VideoCapture(path)
+    try:
+        if not decode:
+            count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+            for index in range(0, count, every_nth_frame):
+                yield f"{path}{ARCHIVE_SEPARATOR}{index}", None
+            return
+        index = 0
+        while True:
+            # grab() skips decoding the frames that are not kept
+            if not capture.grab():
+                break
+            if index % every_nth_frame == 0:
+                ok, image = capture.retrieve()
+                if ok:
+                    yield f"{path}{ARCHIVE_SEPARATOR}{index}", image
+            index += 1
+    finally:
+        capture.release()
+
+
+def _iter_path(path, decode, every_nth_frame):
+    if split_ref(path)[1] is not None:
+        # Already a reference, e.g. from a sweep manifest
+        yield path, (read_image(path) if decode else None)
+        return
+    kind = source_kind(path)
+    if kind == "dir":
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                child = os.path.join(root, name)
+                if source_kind(child) is not None and not name.startswith("."):
+                    yield from _iter_path(child, decode, every_nth_frame)
+    elif kind == "zip":
+        yield from _iter_zip(path, decode)
+    elif kind == "tar":
+        yield from _iter_tar(path, decode)
+    elif kind == "video":
+        yield from _iter_video(path, decode, every_nth_frame)
+    else:
+        # Named explicitly, so an unknown extension (.jp2, .heic, none) is
+        # still handed to the image reader; directory walks skip such files
+        yield path, (cv2.imread(path) if decode else None)
+
+
+def as_source_list(sources):
+    """
+    Normalize a sources argument (one path or an iterable of paths)
+
+    Args:
+        sources: Path or iterable of paths
+
+    Returns:
+        List of path strings
+    """
+    if isinstance(sources, (str, os.PathLike)):
+        return [os.fspath(sources)]
+    return [os.fspath(source) for source in sources]
+
+
+def iter_images(sources, every_nth_frame=1):
+    """
+    Lazily decode every image in directories, archives, videos and files
+
+    Archive members are read into memory and decoded there; nothing is
+    extracted to disk. Images that fail to decode are reported and skipped.
+
+    Args:
+        sources: A path or list of paths (directories are walked recursively,
+            including the archives and videos inside them)
+        every_nth_frame: Keep every n-th video frame
+
+    Yields:
+        Tuples of (ref, image) with ref the image path or "<container>::<member>"
+    """
+    for source in as_source_list(sources):
+        for ref, image in _iter_path(source, True, every_nth_frame):
+            if image is None:
+                print(f"Error: Could not decode {ref}")
+                continue
+            yield ref, image
+
+
+def iter_refs(sources, every_nth_frame=1):
+    """
+    List the images in sources without decoding them
+
+    Args:
+        sources: As for iter_images
+        every_nth_frame: As for iter_images
+
+    Yields:
+        Image references, in iter_images order
+    """
+    for source in as_source_list(sources):
+        for ref, _ in _iter_path(source, False, every_nth_frame):
+            yield ref
+
+
+class _OpenArchives(threading.local):
+    def __init__(self):
+        self.entries = OrderedDict()
+
+
+_OPEN_ARCHIVES = _OpenArchives()
+
+
+def _open_archive(path, kind):
+    # Workers load many members of the same archive; keep it open. Each
+    # thread has its own LRU, since TarFile is not thread-safe and a handle
+    # must not be closed under another thread still reading it. Entries are
+    # keyed by process so forked workers never share the parent's file
+    # offset. Reading tar members in archive order then only seeks forward,
+    # so a compressed tar is decompressed about twice per worker (once for
+    # the member index) rather than up to each member again for every member
+    entries = _OPEN_ARCHIVES.entries
+    key = (path, os.getpid())
+    archive = entries.get(key)
+    if archive is None:
+        archive = zipfile.ZipFile(path) if kind == "zip" else tarfile.open(path, "r:*")
+        entries[key] = archive
+        while len(entries) > MAX_OPEN_ARCHIVES:
+            entries.popitem(last=False)[1].close()
+    entries.move_to_end(key)
+    return archive
+
+
+def close_archives():
+    """Close the archives read_image keeps open on the calling thread"""
+    entries = _OPEN_ARCHIVES.entries
+    while entries:
+        entries.popitem()[1].close()
+
+
+def read_image(ref):
+    """
+    Load one image by path or reference
+
+    Zip members and video frames are read directly. Archives are kept open
+    per process and thread (at most MAX_OPEN_ARCHIVES each, see
+    close_archives): tar members read in archive order (as sweep workers
+    do) cost one pass over a compressed tar, but reading them out of order
+    decompresses again from the start, so stream tars with iter_images()
+    when the order is up to you.
+
+    Args:
+        ref: Image path or "<container>::<member>" reference
+
+    Returns:
+        BGR image, or None if it could not be loaded
+    """
+    path, member = split_ref(ref)
+    if member is None:
+        return cv2.imread(path)
+    try:
+        kind = source_kind(path)
+        if kind == "zip":
+            return decode_image(_open_archive(path, kind).read(member))
+        if kind == "tar":
+            return decode_image(_open_archive(path, kind).extractfile(member).read())
+        if kind == "video":
+            capture = cv2.VideoCapture(path)
+            capture.set(cv2.CAP_PROP_POS_FRAMES, int(member))
+            ok, image = capture.read()
+            capture.release()
+            return image if ok else None
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile, tarfile.TarError) as e:
+        print(f"Error: Could not read {ref}: {e}")
+    return None
+
+
+_DONE = object()
+
+
+def prefetch(items, max_items=DEFAULT_PREFETCH_ITEMS, max_bytes=DEFAULT_PREFETCH_BYTES):
+    """
+    Produce (ref, image) items on a background thread, ahead of the consumer
+
+    Reading and decoding overlap with processing, while at most max_items
+    decoded images (and about max_bytes of pixels) wait in memory.
+
+    Args:
+        items: Iterable of (ref, image), e.g. iter_images(...)
+        max_items: Most decoded images waiting at once
+        max_bytes: Most image bytes waiting at once (None for no byte limit);
+            a single larger image is still passed through
+
+    Yields:
+        The items of items, in order
+    """
+    ready = queue.Queue(maxsize=max_items)
+    stop = threading.Event()
+    budget = threading.Condition()
+    in_flight = [0]
+
+    def put(entry):
+        while not stop.is_set():
+            try:
+                ready.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        iterator = iter(items)
+        try:
+            for item in iterator:
+                size = item[1].nbytes if max_bytes else 0
+                with budget:
+                    budget.wait_for(lambda: stop.is_set() or in_flight[0] == 0
+                                    or in_flight[0] + size <= max_bytes)
+                    in_flight[0] += size
+                if not put((item, size)):
+                    return
+            put((_DONE, 0))
+        except Exception as e:
+            put((e, 0))
+        finally:
+            # Close open archives and videos on this thread, which ran them
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item, size = ready.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            with budget:
+                in_flight[0] -= size
+                budget.notify()
+            yield item
+    finally:
+        # Consumer stopped early (or finished): release the producer
+        stop.set()
+        with budget:
+            budget.notify()
+        producer.join()
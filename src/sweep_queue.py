@@ -0,0 +1,446 @@
+import os
+import json
+import time
+import socket
+from itertools import product
+from .frame import as_frame
+from .hyperparameter_tuning import HYPERPARAMS, run_combination
+from .scheduler import opencv_threads
+from .sources import iter_refs, source_stem
+
+# Layout of a queue directory (shared between all nodes, e.g. over NFS):
+#   manifest.json          what to sweep, written once by enqueue_sweep()
+#   claims/<item>.claim    created atomically by the worker processing <item>
+#   done/<item>.done       written once the item's results are in its shard
+#   shards/<worker>.jsonl  one summary entry per line, appended by one worker
+MANIFEST = "manifest.json"
+CLAIMS_DIR = "claims"
+DONE_DIR = "done"
+SHARDS_DIR = "shards"
+
+# Seconds without a heartbeat after which another worker may take over a claim
+DEFAULT_LEASE_SECONDS = 600
+
+
+def enqueue_sweep(queue_dir, image_paths, base_output_dir="hyperparameter_results",
+                  hyperparams=None, combinations_per_item=64,
+                  lease_seconds=DEFAULT_LEASE_SECONDS):
+    """
+    Create a sharded sweep over image x hyperparameter combination work items
+
+    Each work item is one image with a block of consecutive combinations, so
+    a worker loads the image once and reuses its cached edge maps for the
+    whole block.
+
+    Args:
+        queue_dir: Shared directory holding the queue
+        image_paths: Images to sweep (paths must be valid on every node);
+            directories, zip/tar archives and videos are expanded into one
+            "<archive>::<member>" reference per image, which workers read
+            without extracting
+        base_output_dir: Shared directory for per-combination results and the
+            merged hyperparameter_summary.json
+        hyperparams: Dictionary of parameter name to values (default HYPERPARAMS)
+        combinations_per_item: Combinations per work item
+        lease_seconds: Heartbeat timeout before a claim is considered abandoned
+
+    Returns:
+        Manifest dictionary
+    """
+    hyperparams = hyperparams or HYPERPARAMS
+    n_combinations = 1
+    for values in hyperparams.values():
+        n_combinations *= len(values)
+    blocks = -(-n_combinations // combinations_per_item)
+
+    image_paths = list(iter_refs(image_paths))
+    manifest = {
+        "images": image_paths,
+        "base_output_dir": base_output_dir,
+        "hyperparams": hyperparams,
+        "combinations_per_item": combinations_per_item,
+        "blocks_per_image": blocks,
+        "n_items": len(image_paths) * blocks,
+        "lease_seconds": lease_seconds,
+    }
+    for sub in (CLAIMS_DIR, DONE_DIR, SHARDS_DIR):
+        os.makedirs(os.path.join(queue_dir, sub), exist_ok=True)
+
+    # Write then rename, so workers never read a half-written manifest
+    tmp = os.path.join(queue_dir, MANIFEST + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(queue_dir, MANIFEST))
+
+    print(f"Queued {manifest['n_items']} work items "
+          f"({len(image_paths)} images x {n_combinations} combinations)")
+    return manifest
+
+
+def load_manifest(queue_dir):
+    """
+    Load the manifest written by enqueue_sweep()
+
+    Args:
+        queue_dir: Queue directory
+
+    Returns:
+        Manifest dictionary, or None if the queue does not exist
+    """
+    path = os.path.join(queue_dir, MANIFEST)
+    if not os.path.exists(path):
+        print(f"No sweep queued in {queue_dir}")
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _item_name(item):
+    return f"{item:08d}"
+
+
+def _claim_path(queue_dir, item):
+    return os.path.join(queue_dir, CLAIMS_DIR, _item_name(item) + ".claim")
+
+
+def _done_path(queue_dir, item):
+    return os.path.join(queue_dir, DONE_DIR, _item_name(item) + ".done")
+
+
+def _create_exclusive(path, content):
+    """Atomically create path; False if it already exists"""
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, "w") as f:
+        f.write(content)
+    return True
+
+
+def _read_claim(path):
+    """(content, mtime) of a claim file, or None if it does not exist"""
+    try:
+        with open(path, "r") as f:
+            return f.read(), os.fstat(f.fileno()).st_mtime
+    except FileNotFoundError:
+        return None
+
+
+def claim_item(queue_dir, item, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """
+    Try to claim one work item
+
+    The claim file is created with O_CREAT | O_EXCL, so exactly one worker
+    wins. A claim whose heartbeat is older than the lease is taken over by
+    renaming it to a name only this worker uses and checking that the
+    renamed file is still the stale claim that was read (same content and
+    mtime). If another worker took the claim over or renewed it in between,
+    the renamed file is its live claim: it is linked back into place and
+    this worker backs off. A worker that still loses its claim notices at
+    its next heartbeat (see _renew_claim) and stops working on the item.
+
+    Args:
+        queue_dir: Queue directory
+        item: Work item index
+        worker_id: Identifier of the claiming worker
+        lease_seconds: Heartbeat timeout of existing claims
+
+    Returns:
+        True if this worker now owns the item
+    """
+    if os.path.exists(_done_path(queue_dir, item)):
+        return False
+
+    claim = _claim_path(queue_dir, item)
+    content = json.dumps({"worker": worker_id, "claimed_at": time.time()})
+    if _create_exclusive(claim, content):
+        return True
+
+    observed = _read_claim(claim)
+    if observed is None:
+        # Released between the two calls
+        return _create_exclusive(claim, content)
+    if time.time() - observed[1] <= lease_seconds:
+        return False
+
+    aside = f"{claim}.expired-{worker_id}-{time.time_ns()}"
+    try:
+        os.rename(claim, aside)
+    except FileNotFoundError:
+        # Another worker moved it first and is taking over
+        return False
+    if _read_claim(aside) != observed:
+        # Not the stale claim: put the live one back (unless yet another
+        # worker has claimed the item meanwhile) and back off
+        try:
+            os.link(aside, claim)
+        except FileExistsError:
+            pass
+        os.remove(aside)
+        return False
+    return _create_exclusive(claim, content)
+
+
+def _renew_claim(claim, worker_id):
+    """Heartbeat; False if worker_id no longer owns the claim"""
+    current = _read_claim(claim)
+    try:
+        owner = current and json.loads(current[0]).get("worker")
+    except ValueError:
+        # A new owner is still writing its claim
+        owner = None
+    if owner != worker_id:
+        return False
+    os.utime(claim)
+    return True
+
+
+def item_work(manifest, item):
+    """
+    Image and combinations covered by one work item
+
+    Args:
+        manifest: Manifest dictionary
+        item: Work item index
+
+    Returns:
+        Tuple of (image_index, list of (combination_index, param_dict))
+    """
+    image_index, block = divmod(item, manifest["blocks_per_image"])
+    hyperparams = manifest["hyperparams"]
+    names = list(hyperparams.keys())
+    start = block * manifest["combinations_per_item"]
+    stop = start + manifest["combinations_per_item"]
+
+    combinations = []
+    for index, values in enumerate(product(*hyperparams.values())):
+        if index >= stop:
+            break
+        if index >= start:
+            combinations.append((index, dict(zip(names, values))))
+    return image_index, combinations
+
+
+def image_output_dir(manifest, image_index):
+    """Directory, relative to base_output_dir, holding one image's results"""
+    # The index keeps same-named images from different folders apart
+    return f"{image_index:05d}_{source_stem(manifest['images'][image_index])}"
+
+
+def run_worker(queue_dir, worker_id=None, max_items=None, poll_seconds=5.0,
+               wait=True, threads=None):
+    """
+    Claim and process work items until the sweep is complete
+
+    Results go to base_output_dir/<image dir>/<combination dir> as in
+    hyperparameter_tuning(), and one summary entry per combination is
+    appended to this worker's shard file.
+
+    Args:
+        queue_dir: Queue directory
+        worker_id: Unique worker name (default: hostname-pid)
+        max_items: Stop after this many items (None for no limit)
+        poll_seconds: Sleep between passes while other workers hold claims
+        wait: Keep polling for abandoned claims until every item is done;
+            when False, return as soon as nothing is left to claim
+        threads: OpenCV threads for this worker (None keeps the default)
+
+    Returns:
+        Number of work items processed by this worker
+    """
+    manifest = load_manifest(queue_dir)
+    if manifest is None:
+        return 0
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    lease = manifest["lease_seconds"]
+    shard_path = os.path.join(queue_dir, SHARDS_DIR, f"{worker_id}.jsonl")
+    base_output_dir = manifest["base_output_dir"]
+
+    processed = 0
+    frame, frame_index = None, None
+    with opencv_threads(threads), open(shard_path, "a") as shard:
+        while max_items is None or processed < max_items:
+            claimed_any = False
+            remaining = 0
+            for item in range(manifest["n_items"]):
+                if max_items is not None and processed >= max_items:
+                    break
+                if os.path.exists(_done_path(queue_dir, item)):
+                    continue
+                remaining += 1
+                if not claim_item(queue_dir, item, worker_id, lease):
+                    continue
+                claimed_any = True
+
+                image_index, combinations = item_work(manifest, item)
+                if image_index != frame_index:
+                    frame = as_frame(manifest["images"][image_index])
+                    frame_index = image_index
+                image_dir = image_output_dir(manifest, image_index)
+                claim = _claim_path(queue_dir, item)
+
+                lost = False
+                for index, param_dict in combinations:
+                    if frame is None:
+                        entry = {"combination": index + 1, "parameters": param_dict,
+                                 "num_quadrilaterals": 0, "directory": image_dir}
+                    else:
+                        entry = run_combination(frame, index, param_dict,
+                                                os.path.join(base_output_dir, image_dir))
+                        entry["directory"] = os.path.join(image_dir, entry["directory"])
+                    entry["image"] = manifest["images"][image_index]
+                    shard.write(json.dumps(entry) + "\n")
+                    # Heartbeat: keep the lease alive while the item runs, and
+                    # leave the item to its new owner if it was taken over
+                    if not _renew_claim(claim, worker_id):
+                        lost = True
+                        break
+
+                shard.flush()
+                os.fsync(shard.fileno())
+                if lost:
+                    print(f"Worker {worker_id} lost its claim on item {item}")
+                    continue
+                _create_exclusive(_done_path(queue_dir, item), worker_id)
+                processed += 1
+
+            if remaining == 0 or not wait:
+                break
+            if not claimed_any:
+                time.sleep(poll_seconds)
+
+    print(f"Worker {worker_id} processed {processed} work items")
+    return processed
+
+
+def queue_status(queue_dir):
+    """
+    Progress of a sharded sweep
+
+    Args:
+        queue_dir: Queue directory
+
+    Returns:
+        Dictionary with total, done and in_progress item counts
+    """
+    manifest = load_manifest(queue_dir)
+    if manifest is None:
+        return {"total": 0, "done": 0, "in_progress": 0}
+    done = len(os.listdir(os.path.join(queue_dir, DONE_DIR)))
+    claimed = sum(name.endswith(".claim")
+                  for name in os.listdir(os.path.join(queue_dir, CLAIMS_DIR)))
+    return {"total": manifest["n_items"], "done": done, "in_progress": claimed - done}
+
+
+def merge_shards(queue_dir):
+    """
+    Merge every worker's shard into base_output_dir/hyperparameter_summary.json
+
+    Entries are deduplicated by (image, combination), since an item whose
+    lease expired may have been processed twice, and sorted by image then
+    combination. The result is readable by analysis.analyze_results().
+
+    Args:
+        queue_dir: Queue directory
+
+    Returns:
+        List of merged summary entries
+    """
+    manifest = load_manifest(queue_dir)
+    if manifest is None:
+        return []
+
+    entries = {}
+    shards_dir = os.path.join(queue_dir, SHARDS_DIR)
+    for name in sorted(os.listdir(shards_dir)):
+        if not name.endswith(".jsonl"):
+            continue
+        with open(os.path.join(shards_dir, name), "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn last line from a worker that died mid-write
+                    continue
+                entries[(entry["image"], entry["combination"])] = entry
+
+    order = {path: i for i, path in enumerate(manifest["images"])}
+    results = sorted(entries.values(), key=lambda e: (order.get(e["image"], -1), e["combination"]))
+
+    status = queue_status(queue_dir)
+    if status["done"] < status["total"]:
+        print(f"Warning: {status['total'] - status['done']} of {status['total']} "
+              f"work items are not done yet")
+
+    base_output_dir = manifest["base_output_dir"]
+    os.makedirs(base_output_dir, exist_ok=True)
+    with open(os.path.join(base_output_dir, "hyperparameter_summary.json"), "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Merged {len(results)} results into {base_output_dir}")
+    return results
+
+
+def _local_worker(queue_dir, worker_id, threads):
+    run_worker(queue_dir, worker_id, poll_seconds=0.5, threads=threads)
+
+
+def run_local_cluster(queue_dir, workers=2, threads=1):
+    """
+    Run a queued sweep with several local processes standing in for nodes
+
+    Args:
+        queue_dir: Queue directory (see enqueue_sweep)
+        workers: Number of worker processes
+        threads: OpenCV threads per worker
+
+    Returns:
+        Merged summary entries
+    """
+    import multiprocessing
+    ctx = multiprocessing.get_context()
+    processes = [ctx.Process(target=_local_worker, args=(queue_dir, f"local-{i}", threads))
+                 for i in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    return merge_shards(queue_dir)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Sharded hyperparameter sweeps")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = commands.add_parser("enqueue", help="Create a sweep queue")
+    enqueue.add_argument("queue_dir")
+    enqueue.add_argument("images", nargs="+")
+    enqueue.add_argument("--output", default="hyperparameter_results")
+    enqueue.add_argument("--per-item", type=int, default=64)
+
+    worker = commands.add_parser("worker", help="Process work items")
+    worker.add_argument("queue_dir")
+    worker.add_argument("--id", default=None)
+    worker.add_argument("--threads", type=int, default=None)
+
+    for name in ("merge", "status"):
+        commands.add_parser(name).add_argument("queue_dir")
+
+    local = commands.add_parser("local", help="Run a queue with local worker processes")
+    local.add_argument("queue_dir")
+    local.add_argument("--workers", type=int, default=2)
+
+    args = parser.parse_args()
+    if args.command == "enqueue":
+        enqueue_sweep(args.queue_dir, args.images, args.output,
+                      combinations_per_item=args.per_item)
+    elif args.command == "worker":
+        run_worker(args.queue_dir, args.id, threads=args.threads)
+    elif args.command == "merge":
+        merge_shards(args.queue_dir)
+    elif args.command == "status":
+        print(queue_status(args.queue_dir))
+    else:
+        run_local_cluster(args.queue_dir, args.workers)
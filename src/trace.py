@@ -0,0 +1,581 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import cv2
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from .document_scanner import FALLBACK_LEVELS, document_scanner, scan_batch
+from .sources import iter_images, prefetch
+from .ws_server import MAX_FRAME_PIXELS, STATUS_DROPPED, STATUS_OK, FrameClient
+
+# Entry points replay() can drive
+REPLAY_TARGETS = ("scanner", "batch", "service")
+
+# Percentiles reported for latencies
+PERCENTILES = (50, 95, 99)
+
+# Rows of an image hashed by image_hash, evenly spaced
+HASH_ROWS = 256
+
+
+def image_hash(image):
+    """
+    Short content hash of an image, identifying repeated inputs in a trace
+
+    Hashes the shape and HASH_ROWS evenly spaced full rows rather than every
+    pixel, since it runs on the request path: about 5 ms instead of 60 ms
+    for a 12 MP frame. Camera frames differ in noise on every row, so
+    distinct frames still get distinct hashes.
+
+    Args:
+        image: Image array
+
+    Returns:
+        16 hex digits
+    """
+    step = max(1, -(-image.shape[0] // HASH_ROWS))
+    digest = hashlib.blake2b(str(image.shape).encode(), digest_size=8)
+    digest.update(np.ascontiguousarray(image[::step]).data)
+    return digest.hexdigest()
+
+
+def _sampled(digest, sample_rate):
+    # Decided by the hash, so the same input is always (or never) sampled
+    # and a repeated frame is stored once
+    return sample_rate > 0 and int(digest, 16) / 2 ** 64 < sample_rate
+
+
+class TraceRecorder:
+    """
+    Appends one JSON line per scanner request to a trace file.
+
+    Each record holds the arrival time, entry point, input shape and hash,
+    latency, per-stage timings, fallback level, detector, warp path and
+    confidence. With sample_rate > 0 that share of inputs is also saved
+    (lossless PNG, next to the trace) so replay() can feed them back.
+    Safe to share between threads.
+    """
+
+    def __init__(self, path, sample_rate=0.0, sample_dir=None):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.sample_dir = sample_dir or os.path.splitext(path)[0] + "_samples"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a")
+        self._lock = threading.Lock()
+        self.records = 0
+
+    def record(self, image, info=None, latency_s=None, arrival=None, entry="scanner", **fields):
+        """
+        Log one request
+
+        Args:
+            image: Input image
+            info: The info dict document_scanner / find_document_corners
+                filled for this request
+            latency_s: Time the request took
+            arrival: time.time() the request arrived (default: now minus
+                latency_s)
+            entry: Entry point that served it ("scanner", "stream",
+                "service", ...)
+            **fields: Extra JSON-serializable fields
+
+        Returns:
+            The record written
+        """
+        info = info or {}
+        digest = image_hash(image)
+        if arrival is None:
+            arrival = time.time() - (latency_s or 0)
+        gate = info.get("gate")
+        record = {
+            "arrival": arrival,
+            "entry": entry,
+            "shape": list(image.shape),
+            "hash": digest,
+            "latency_ms": None if latency_s is None else latency_s * 1000,
+            "timings_ms": info.get("timings_ms"),
+            "fallback_level": info.get("fallback_level"),
+            "detector": info.get("detector"),
+            "warp_path": info.get("warp_path"),
+            "confidence": info.get("confidence"),
+            "gate_accepted": None if gate is None else bool(gate.accepted),
+            "sample": None,
+        }
+        record.update(fields)
+        if _sampled(digest, self.sample_rate):
+            record["sample"] = os.path.relpath(self._save_sample(image, digest),
+                                               os.path.dirname(os.path.abspath(self.path)))
+        line = json.dumps(record)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self.records += 1
+        return record
+
+    def _save_sample(self, image, digest):
+        path = os.path.join(self.sample_dir, f"{digest}.png")
+        if not os.path.exists(path):
+            os.makedirs(self.sample_dir, exist_ok=True)
+            cv2.imwrite(path, image)
+        return path
+
+    def scan(self, image, **scanner_kwargs):
+        """
+        Run document_scanner on image and log the request
+
+        Args:
+            image: Input image
+            **scanner_kwargs: Forwarded to document_scanner
+
+        Returns:
+            document_scanner's result
+        """
+        info = scanner_kwargs.pop("info", None)
+        info = {} if info is None else info
+        arrival = time.time()
+        start = time.perf_counter()
+        result = document_scanner(image, info=info, **scanner_kwargs)
+        self.record(image, info, time.perf_counter() - start, arrival)
+        return result
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_trace(path):
+    """
+    Read a trace written by TraceRecorder
+
+    Args:
+        path: Trace file
+
+    Returns:
+        List of records, in arrival order
+    """
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return sorted(records, key=lambda r: r["arrival"])
+
+
+def percentiles(values):
+    """
+    Latency summary
+
+    Args:
+        values: Latencies (ms)
+
+    Returns:
+        Dictionary with "p50", "p95", "p99", "mean" and "max" (None values
+        when empty)
+    """
+    values = np.asarray([v for v in values if v is not None], dtype=np.float64)
+    if values.size == 0:
+        return {**{f"p{p}": None for p in PERCENTILES}, "mean": None, "max": None}
+    summary = {f"p{p}": float(np.percentile(values, p)) for p in PERCENTILES}
+    summary["mean"] = float(values.mean())
+    summary["max"] = float(values.max())
+    return summary
+
+
+def fallback_rates(levels):
+    """
+    Share of requests per fallback level
+
+    Args:
+        levels: Fallback levels (None for requests without a detection)
+
+    Returns:
+        Dictionary mapping level name to rate (None when no request
+        reported a level, e.g. the service, which only returns corners)
+    """
+    levels = [level for level in levels if level is not None]
+    return {name: (levels.count(level) / len(levels) if levels else None)
+            for level, name in enumerate(FALLBACK_LEVELS)}
+
+
+def summarize_trace(records):
+    """
+    What production saw, in the same terms as a replay report
+
+    Args:
+        records: Records from load_trace
+
+    Returns:
+        Dictionary with "requests", "duration_s", "offered_rps", "latency_ms",
+        "stage_ms" (per-stage percentiles), "fallback_rates" and
+        "confidence"
+    """
+    duration = records[-1]["arrival"] - records[0]["arrival"] if records else 0.0
+    stages = {}
+    for record in records:
+        for stage, ms in (record.get("timings_ms") or {}).items():
+            stages.setdefault(stage, []).append(ms)
+    return {
+        "requests": len(records),
+        "duration_s": duration,
+        "offered_rps": (len(records) - 1) / duration if duration > 0 else None,
+        "latency_ms": percentiles(r.get("latency_ms") for r in records),
+        "stage_ms": {stage: percentiles(ms) for stage, ms in stages.items()},
+        "fallback_rates": fallback_rates([r.get("fallback_level") for r in records]),
+        "confidence": percentiles(r.get("confidence") for r in records),
+    }
+
+
+def replay_inputs(records, trace_path=None, images=()):
+    """
+    One input image per record
+
+    A record's own sample is used when it was captured. Otherwise another
+    input of the same shape stands in, or else any input resized to the
+    recorded shape, so the replayed load keeps production's resolutions.
+
+    Args:
+        records: Records from load_trace
+        trace_path: Trace file the records came from (samples are stored
+            relative to it)
+        images: Extra stand-in images or paths
+
+    Returns:
+        List of images, parallel to records
+    """
+    base = os.path.dirname(os.path.abspath(trace_path)) if trace_path else "."
+    samples = {}
+    for record in records:
+        if record.get("sample") and record["hash"] not in samples:
+            image = cv2.imread(os.path.join(base, record["sample"]), cv2.IMREAD_UNCHANGED)
+            if image is not None:
+                samples[record["hash"]] = image
+    pool = list(samples.values()) + [cv2.imread(image) if isinstance(image, str) else image
+                                     for image in images]
+    pool = [image for image in pool if image is not None]
+    if not pool:
+        raise ValueError("The trace has no sampled inputs; record with sample_rate > 0 "
+                         "or pass stand-in images")
+
+    by_shape = {}
+    for image in pool:
+        by_shape.setdefault(image.shape, image)
+    inputs = []
+    for i, record in enumerate(records):
+        shape = tuple(record["shape"])
+        image = samples.get(record["hash"])
+        if image is None:
+            image = by_shape.get(shape)
+        if image is None:
+            image = pool[i % len(pool)]
+            if image.ndim == len(shape) and image.shape[2:] == shape[2:]:
+                image = cv2.resize(image, (shape[1], shape[0]))
+            by_shape[shape] = image
+        inputs.append(image)
+    return inputs
+
+
+def arrival_schedule(records, speed=1.0, rate=None):
+    """
+    Offsets (s) at which to send each request
+
+    Args:
+        records: Records from load_trace
+        speed: Replay the recorded arrivals this many times faster
+        rate: Instead, send at this fixed rate (requests per second)
+
+    Returns:
+        float64 array of offsets from the start of the replay
+    """
+    if rate:
+        return np.arange(len(records)) / rate
+    arrivals = np.array([r["arrival"] for r in records], dtype=np.float64)
+    return (arrivals - arrivals[0]) / speed if len(arrivals) else arrivals
+
+
+def replay(trace_path, target="scanner", speed=1.0, rate=None, workers=1, images=(),
+           limit=None, uri=None, plan=None, batch_size=8, **scanner_kwargs):
+    """
+    Drive an entry point with a recorded load and measure how it keeps up
+
+    Requests are sent open loop on the recorded (or scaled) schedule, so a
+    slower build shows up as queueing rather than as a slower sender.
+
+    Args:
+        trace_path: Trace written by TraceRecorder
+        target: "scanner" (document_scanner on a pool of worker threads),
+            "batch" (scan_batch over every batch_size arrivals, one batch
+            at a time) or "service" (the WebSocket backend at uri)
+        speed: Replay the recorded arrivals this many times faster
+        rate: Instead, send at this fixed rate (requests per second)
+        workers: Scanner threads for target="scanner"
+        images: Stand-in inputs for records without a sample (see
+            replay_inputs)
+        limit: Replay only the first limit records
+        uri: Backend address for target="service", e.g. "ws://localhost:8765"
+        plan: scan_batch plan for target="batch"
+        batch_size: Requests per scan_batch call for target="batch"; a
+            batch is submitted when its last request arrives, so latency
+            includes the wait for the batch to fill
+        **scanner_kwargs: Forwarded to document_scanner / scan_batch
+
+    Returns:
+        Report dictionary (see print_replay_report)
+    """
+    if target not in REPLAY_TARGETS:
+        raise ValueError(f"Unknown target {target!r}, expected one of {REPLAY_TARGETS}")
+    records = load_trace(trace_path)[:limit]
+    inputs = replay_inputs(records, trace_path, images)
+    schedule = arrival_schedule(records, speed, rate)
+
+    if target == "service":
+        rows = _replay_service(inputs, schedule, uri)
+    elif target == "batch":
+        rows = _replay_batch(inputs, schedule, batch_size, plan, scanner_kwargs)
+    else:
+        rows = _replay_scanner(inputs, schedule, workers, scanner_kwargs)
+    report = _replay_report(target, rows, schedule, records)
+    if target == "batch":
+        report["batch_size"] = batch_size
+    return report
+
+
+def _run_open_loop(schedule, submit):
+    # Send each request at its offset; returns the replay's start time
+    start = time.perf_counter()
+    for i, offset in enumerate(schedule):
+        delay = start + offset - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        submit(i, start + offset)
+    return start
+
+
+def _color_inputs(inputs):
+    # The scanner takes color images; service traces hold grayscale frames
+    return [cv2.cvtColor(image, cv2.COLOR_GRAY2BGR) if image.ndim == 2 else image
+            for image in inputs]
+
+
+def _replay_scanner(inputs, schedule, workers, scanner_kwargs):
+    inputs = _color_inputs(inputs)
+    rows = [None] * len(inputs)
+
+    def run(i, scheduled):
+        began = time.perf_counter()
+        info = {}
+        try:
+            document_scanner(inputs[i], info=info, **scanner_kwargs)
+            error = None
+        except Exception as e:
+            error = repr(e)
+        rows[i] = {"scheduled": scheduled, "started": began, "finished": time.perf_counter(),
+                   "fallback_level": info.get("fallback_level"), "error": error}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        _run_open_loop(schedule, lambda i, scheduled: pool.submit(run, i, scheduled))
+    return rows
+
+
+def _replay_batch(inputs, schedule, batch_size, plan, scanner_kwargs):
+    inputs = _color_inputs(inputs)
+    rows = [None] * len(inputs)
+    pending = []
+
+    def run(batch):
+        began = time.perf_counter()
+        try:
+            results = scan_batch([inputs[i] for i, _ in batch], plan=plan, **scanner_kwargs)
+            error = None
+        except Exception as e:
+            results, error = [{"info": {}}] * len(batch), repr(e)
+        finished = time.perf_counter()
+        for (i, scheduled), result in zip(batch, results):
+            rows[i] = {"scheduled": scheduled, "started": began, "finished": finished,
+                       "fallback_level": result["info"].get("fallback_level"), "error": error}
+
+    # Batches run one after another, like a batch queue; a batch arriving
+    # while the previous one still runs waits, which shows up as queueing
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        def submit(i, scheduled):
+            pending.append((i, scheduled))
+            if len(pending) == batch_size or i == len(inputs) - 1:
+                pool.submit(run, list(pending))
+                pending.clear()
+
+        _run_open_loop(schedule, submit)
+    return rows
+
+
+def _replay_service(inputs, schedule, uri):
+    grays = []
+    for image in inputs:
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        pixels = gray.shape[0] * gray.shape[1]
+        if pixels > MAX_FRAME_PIXELS:
+            # Clients downscale before sending; so does the replay
+            gray = cv2.resize(gray, None, fx=(MAX_FRAME_PIXELS / pixels) ** 0.5,
+                              fy=(MAX_FRAME_PIXELS / pixels) ** 0.5, interpolation=cv2.INTER_AREA)
+        grays.append(gray)
+
+    rows = [None] * len(inputs)
+    sent = {}
+    with FrameClient(uri) as client:
+        def receive():
+            for _ in range(len(inputs)):
+                result = client.receive()
+                i = result["frame_id"]
+                finished = time.perf_counter()
+                service = result["processing_us"] / 1e6
+                rows[i] = {"scheduled": sent[i], "started": finished - service,
+                           "finished": finished, "fallback_level": None,
+                           "status": result["status"],
+                           "error": None if result["status"] in (STATUS_OK, STATUS_DROPPED)
+                           else f"status {result['status']}"}
+
+        receiver = threading.Thread(target=receive, daemon=True)
+        receiver.start()
+
+        def submit(i, scheduled):
+            sent[i] = scheduled
+            client.send(grays[i], i)
+
+        _run_open_loop(schedule, submit)
+        receiver.join()
+    return rows
+
+
+def _replay_report(target, rows, schedule, records):
+    rows = [row for row in rows if row is not None]
+    completed = [row for row in rows if row["error"] is None and row.get("status", STATUS_OK) == STATUS_OK]
+    start = min((row["scheduled"] for row in rows), default=0.0)
+    end = max((row["finished"] for row in rows), default=start)
+    elapsed = end - start
+    report = {
+        "target": target,
+        "requests": len(schedule),
+        "completed": len(completed),
+        "errors": sum(row["error"] is not None for row in rows),
+        "first_error": next((row["error"] for row in rows if row["error"] is not None), None),
+        "duration_s": elapsed,
+        "offered_rps": (len(schedule) - 1) / schedule[-1] if len(schedule) > 1 and schedule[-1] > 0 else None,
+        "throughput_rps": len(completed) / elapsed if elapsed > 0 else None,
+        "latency_ms": percentiles((row["finished"] - row["scheduled"]) * 1000 for row in completed),
+        "queue_ms": percentiles((row["started"] - row["scheduled"]) * 1000 for row in completed),
+        "service_ms": percentiles((row["finished"] - row["started"]) * 1000 for row in completed),
+        "fallback_rates": fallback_rates([row["fallback_level"] for row in completed]),
+        "recorded": summarize_trace(records),
+    }
+    if target == "service":
+        report["dropped"] = sum(row.get("status") == STATUS_DROPPED for row in rows)
+    return report
+
+
+def _format_percentiles(summary):
+    if summary["p50"] is None:
+        return "n/a"
+    return "  ".join(f"{key} {summary[key]:8.1f}" for key in ("p50", "p95", "p99", "max"))
+
+
+def print_replay_report(report):
+    """
+    Print a replay report next to what the trace recorded
+
+    Args:
+        report: Result of replay()
+    """
+    recorded = report["recorded"]
+    print(f"Target: {report['target']}  requests: {report['requests']}")
+    rps = report.get("throughput_rps")
+    print(f"Throughput: {rps:.2f} req/s" if rps else "Throughput: n/a",
+          f"(offered {report['offered_rps']:.2f} req/s)" if report.get("offered_rps") else "")
+    for key in ("completed", "errors", "dropped"):
+        if key in report:
+            print(f"{key.capitalize()}: {report[key]}")
+    if report.get("first_error"):
+        print(f"First error: {report['first_error']}")
+    for key, label in (("latency_ms", "Latency ms"), ("queue_ms", "Queueing ms"),
+                       ("service_ms", "Service ms")):
+        if key in report:
+            print(f"{label:<13}{_format_percentiles(report[key])}")
+    print(f"{'Recorded ms':<13}{_format_percentiles(recorded['latency_ms'])}")
+    for stage, summary in recorded["stage_ms"].items():
+        print(f"  {stage:<11}{_format_percentiles(summary)}")
+    print("Fallback levels (replay / recorded): " + ", ".join(
+        f"{name} {_format_rate(report['fallback_rates'][name])}/"
+        f"{_format_rate(recorded['fallback_rates'][name])}" for name in FALLBACK_LEVELS))
+
+
+def _format_rate(rate):
+    return "-" if rate is None else f"{rate:.0%}"
+
+
+def capture(sources, trace_path, sample_rate=1.0, rate=None, **scanner_kwargs):
+    """
+    Build a trace from images on disk, e.g. to replay a corpus as load
+
+    Args:
+        sources: Paths (see sources.iter_images)
+        trace_path: Trace file to append to
+        sample_rate: Share of inputs stored with the trace
+        rate: Arrival rate (requests per second) written into the trace;
+            None records the actual back-to-back arrivals
+        **scanner_kwargs: Forwarded to document_scanner
+
+    Returns:
+        Number of records written
+    """
+    with TraceRecorder(trace_path, sample_rate) as recorder:
+        first = time.time()
+        for i, (ref, image) in enumerate(prefetch(iter_images(sources))):
+            info = {}
+            start = time.perf_counter()
+            document_scanner(image, info=info, **scanner_kwargs)
+            recorder.record(image, info, time.perf_counter() - start,
+                            first + i / rate if rate else None, entry="capture", source=ref)
+        return recorder.records
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Capture and replay scanner load")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    capture_cmd = commands.add_parser("capture", help="Trace a scan of images on disk")
+    capture_cmd.add_argument("trace")
+    capture_cmd.add_argument("sources", nargs="+")
+    capture_cmd.add_argument("--sample-rate", type=float, default=1.0)
+    capture_cmd.add_argument("--rate", type=float, default=None)
+
+    summary_cmd = commands.add_parser("summary", help="Latency percentiles recorded in a trace")
+    summary_cmd.add_argument("trace")
+
+    replay_cmd = commands.add_parser("replay", help="Replay a trace against an entry point")
+    replay_cmd.add_argument("trace")
+    replay_cmd.add_argument("--target", choices=REPLAY_TARGETS, default="scanner")
+    replay_cmd.add_argument("--speed", type=float, default=1.0)
+    replay_cmd.add_argument("--rate", type=float, default=None)
+    replay_cmd.add_argument("--workers", type=int, default=1)
+    replay_cmd.add_argument("--limit", type=int, default=None)
+    replay_cmd.add_argument("--batch-size", type=int, default=8,
+                            help="Requests per scan_batch call for --target batch")
+    replay_cmd.add_argument("--uri", default="ws://localhost:8765")
+    replay_cmd.add_argument("--images", nargs="*", default=())
+    replay_cmd.add_argument("--workspace", action="store_true",
+                            help="Reuse scanner buffers (see src.workspace)")
+    args = parser.parse_args()
+
+    if args.command == "capture":
+        print(f"Recorded {capture(args.sources, args.trace, args.sample_rate, args.rate)} requests")
+    elif args.command == "summary":
+        print(json.dumps(summarize_trace(load_trace(args.trace)), indent=2))
+    else:
+        kwargs = {"workspace": True} if args.workspace and args.target == "scanner" else {}
+        print_replay_report(replay(args.trace, args.target, args.speed, args.rate, args.workers,
+                                   args.images, args.limit, args.uri, batch_size=args.batch_size,
+                                   **kwargs))
@@ -0,0 +1,155 @@
+import threading
+import numpy as np
+from collections import OrderedDict
+
+# Workspaces kept by WORKSPACES (one per input resolution and thread)
+DEFAULT_MAX_WORKSPACES = 8
+
+# A buffer that has to grow is given this much headroom, so page sizes that
+# creep up frame by frame do not reallocate every time
+GROWTH_FACTOR = 1.25
+
+
+class Workspace:
+    """
+    Reusable image buffers for processing a stream of frames.
+
+    Every intermediate image of the scanner (gray, filtered, edge maps,
+    warped page, scanned page, visualization...) gets a named buffer that
+    OpenCV fills in place through its dst= arguments. A buffer is a view of
+    a flat byte array that only grows, so once the first frames at a
+    resolution have sized every buffer, a frame allocates no image memory.
+
+    Buffers are overwritten by the next frame processed with the same
+    workspace: copy results that must outlive it, and never share one
+    workspace between threads.
+    """
+
+    def __init__(self):
+        self._arenas = {}
+        self.allocations = 0
+
+    def buffer(self, key, shape, dtype=np.uint8):
+        """
+        Buffer for one intermediate image
+
+        Args:
+            key: Hashable name of the intermediate
+            shape: Shape of the image
+            dtype: dtype of the image
+
+        Returns:
+            C-contiguous array of the given shape and dtype (contents are
+            whatever the previous frame left)
+        """
+        dtype = np.dtype(dtype)
+        size = int(np.prod(shape)) * dtype.itemsize
+        arena = self._arenas.get(key)
+        if arena is None or arena.size < size:
+            grown = size if arena is None else max(size, int(arena.size * GROWTH_FACTOR))
+            arena = self._arenas[key] = np.empty(grown, dtype=np.uint8)
+            self.allocations += 1
+        return arena[:size].view(dtype).reshape(shape)
+
+    def copy(self, key, image):
+        """
+        Copy an image into the buffer for key
+
+        Args:
+            key: Hashable name of the copy
+            image: Image to copy
+
+        Returns:
+            The copy
+        """
+        out = self.buffer(key, image.shape, image.dtype)
+        np.copyto(out, image)
+        return out
+
+    @property
+    def nbytes(self):
+        return sum(arena.nbytes for arena in self._arenas.values())
+
+    def clear(self):
+        """Release every buffer"""
+        self._arenas.clear()
+
+
+def workspace_buffer(workspace, key, shape, dtype=np.uint8):
+    """
+    dst= argument for an OpenCV call
+
+    Args:
+        workspace: Workspace, or None
+        key, shape, dtype: As for Workspace.buffer
+
+    Returns:
+        The workspace buffer, or None (OpenCV then allocates the result)
+    """
+    if workspace is None:
+        return None
+    return workspace.buffer(key, shape, dtype)
+
+
+class WorkspacePool:
+    """
+    Small LRU of workspaces keyed by input resolution.
+
+    A worker that sees several cameras keeps one set of exactly sized
+    buffers per resolution instead of regrowing a single set. Workspaces are
+    also keyed by thread, so threads never share buffers.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_WORKSPACES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, shape):
+        """
+        Workspace for frames of the given shape on the calling thread
+
+        Args:
+            shape: Input image shape
+
+        Returns:
+            Workspace
+        """
+        key = (tuple(shape), threading.get_ident())
+        with self._lock:
+            workspace = self._entries.get(key)
+            if workspace is None:
+                workspace = self._entries[key] = Workspace()
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            self._entries.move_to_end(key)
+            return workspace
+
+    @property
+    def nbytes(self):
+        return sum(workspace.nbytes for workspace in self._entries.values())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Shared pool used by document_scanner(workspace=True)
+WORKSPACES = WorkspacePool()
+
+
+def as_workspace(workspace, shape):
+    """
+    Normalize a workspace argument
+
+    Args:
+        workspace: None, True (the calling thread's workspace for this
+            resolution in WORKSPACES) or a Workspace
+        shape: Input image shape
+
+    Returns:
+        Workspace, or None
+    """
+    if workspace is True:
+        return WORKSPACES.get(shape)
+    return workspace or None
@@ -0,0 +1,343 @@
+import asyncio
+import struct
+import threading
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import partial
+from .document_scanner import find_document_corners
+from .frame import Frame
+from .frame_gate import gate_frame
+from .workspace import Workspace
+
+# Client -> server, one binary message per frame:
+#   frame_id uint32, width uint16, height uint16, flags uint8, then
+#   width * height grayscale bytes, row-major
+FRAME_HEADER = struct.Struct("<IHHB")
+FLAG_GATE = 1  # Run the frame gate before detection
+
+# Server -> client, one binary message per frame:
+#   frame_id uint32, status uint8, processing time in microseconds uint32,
+#   then 8 float32 corner coordinates (TL, TR, BR, BL as x, y) if STATUS_OK
+RESULT_HEADER = struct.Struct("<IBI")
+CORNERS = struct.Struct("<8f")
+
+STATUS_OK = 0
+STATUS_REJECTED = 1  # Frame gate rejected the frame
+STATUS_DROPPED = 2   # A newer frame arrived before this one was processed
+STATUS_BAD_FRAME = 3  # Malformed message
+
+# Largest accepted frame; clients are expected to downscale (e.g. 480 px wide)
+MAX_FRAME_PIXELS = 1280 * 1280
+
+
+def encode_frame(gray, frame_id, flags=0):
+    """
+    Build the binary message for one grayscale frame
+
+    Args:
+        gray: 2D uint8 image
+        frame_id: Client-chosen frame counter
+        flags: Bitwise OR of FLAG_* values
+
+    Returns:
+        bytes
+    """
+    h, w = gray.shape
+    return FRAME_HEADER.pack(frame_id, w, h, flags) + np.ascontiguousarray(gray).tobytes()
+
+
+def decode_frame(message):
+    """
+    Parse a frame message without copying the pixels
+
+    Args:
+        message: bytes received from the client
+
+    Returns:
+        Tuple of (frame_id, flags, gray) where gray is a read-only view of
+        the message, or None if the message is malformed
+    """
+    if len(message) < FRAME_HEADER.size:
+        return None
+    frame_id, w, h, flags = FRAME_HEADER.unpack_from(message)
+    if w * h == 0 or w * h > MAX_FRAME_PIXELS or len(message) != FRAME_HEADER.size + w * h:
+        return None
+    gray = np.frombuffer(message, dtype=np.uint8, count=w * h,
+                         offset=FRAME_HEADER.size).reshape(h, w)
+    return frame_id, flags, gray
+
+
+def _frame_id(message):
+    return struct.unpack_from("<I", message)[0] if len(message) >= 4 else 0
+
+
+def encode_result(frame_id, status, processing_us=0, corners=None):
+    """
+    Build the binary result message for one frame
+
+    Args:
+        frame_id: Frame the result belongs to
+        status: One of the STATUS_* codes
+        processing_us: Server processing time in microseconds
+        corners: (4, 2) corners for STATUS_OK
+
+    Returns:
+        bytes (9 bytes, or 41 with corners)
+    """
+    header = RESULT_HEADER.pack(frame_id, status, min(int(processing_us), 2 ** 32 - 1))
+    if corners is None:
+        return header
+    return header + CORNERS.pack(*np.asarray(corners, dtype=np.float32).ravel())
+
+
+def decode_result(message):
+    """
+    Parse a result message
+
+    Args:
+        message: bytes received from the server
+
+    Returns:
+        Dictionary with "frame_id", "status", "processing_us" and "corners"
+        ((4, 2) float32 array, or None)
+    """
+    frame_id, status, processing_us = RESULT_HEADER.unpack_from(message)
+    corners = None
+    if len(message) >= RESULT_HEADER.size + CORNERS.size:
+        corners = np.array(CORNERS.unpack_from(message, RESULT_HEADER.size),
+                           dtype=np.float32).reshape(4, 2)
+    return {"frame_id": frame_id, "status": status, "processing_us": processing_us,
+            "corners": corners}
+
+
+def process_frame(message, gate_thresholds=None, params=None, device=None, detector="contour",
+                  workspace=None, recorder=None):
+    """
+    Run the detection-only path on one frame message
+
+    Args:
+        message: Frame message (see FRAME_HEADER)
+        gate_thresholds: Optional gate_frame threshold overrides
+        params, device, detector: Detection options, as for
+            find_document_corners
+        workspace: Optional Workspace reused for the frame's edge maps
+        recorder: Optional trace.TraceRecorder logging the request
+
+    Returns:
+        Result message bytes
+    """
+    start = time.perf_counter()
+    decoded = decode_frame(message)
+    if decoded is None:
+        return encode_result(_frame_id(message), STATUS_BAD_FRAME)
+    frame_id, flags, gray = decoded
+
+    frame = Frame(gray, workspace=workspace)
+    info = None if recorder is None else {}
+    if flags & FLAG_GATE:
+        gate_result = gate_frame(frame, **(gate_thresholds or {}))
+        if info is not None:
+            info["gate"] = gate_result
+        if not gate_result.accepted:
+            elapsed = time.perf_counter() - start
+            if recorder is not None:
+                recorder.record(gray, info, elapsed, entry="service", status=STATUS_REJECTED)
+            return encode_result(frame_id, STATUS_REJECTED, elapsed * 1e6)
+
+    corners, _ = find_document_corners(frame, params, info, device=device, detector=detector)
+    elapsed = time.perf_counter() - start
+    if recorder is not None:
+        recorder.record(gray, info, elapsed, entry="service", status=STATUS_OK)
+    return encode_result(frame_id, STATUS_OK, elapsed * 1e6, corners)
+
+
+class LatestFrameSlot:
+    """
+    Single-slot mailbox holding only the newest frame.
+
+    put() replaces a frame that has not been picked up yet and returns it,
+    so the backend always works on the most recent frame and never builds
+    a queue when it falls behind the camera.
+    """
+
+    def __init__(self):
+        self._message = None
+        self._ready = asyncio.Event()
+
+    def put(self, message):
+        dropped = self._message
+        self._message = message
+        self._ready.set()
+        return dropped
+
+    async def get(self):
+        await self._ready.wait()
+        self._ready.clear()
+        message, self._message = self._message, None
+        return message
+
+
+async def _receive_frames(websocket, slot):
+    async for message in websocket:
+        if isinstance(message, str):
+            continue
+        dropped = slot.put(message)
+        if dropped is not None:
+            await websocket.send(encode_result(_frame_id(dropped), STATUS_DROPPED))
+
+
+async def _handle_connection(websocket, executor, gate_thresholds, params, detector, recorder):
+    slot = LatestFrameSlot()
+    # A connection detects one frame at a time, so it can own a workspace
+    workspace = Workspace()
+    receiver = asyncio.ensure_future(_receive_frames(websocket, slot))
+    loop = asyncio.get_running_loop()
+    try:
+        while not receiver.done():
+            getter = asyncio.ensure_future(slot.get())
+            done, _ = await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if getter not in done:
+                getter.cancel()
+                break
+            # Detection runs off the event loop (OpenCV releases the GIL), so
+            # newer frames keep arriving and replacing the pending one
+            # Each connection is one camera, so adaptive edge parameters are
+            # cached per connection
+            result = await loop.run_in_executor(executor, process_frame, getter.result(),
+                                                gate_thresholds, params, websocket.id, detector,
+                                                workspace, recorder)
+            await websocket.send(result)
+    finally:
+        receiver.cancel()
+
+
+async def serve(host="localhost", port=8765, workers=1, gate_thresholds=None, params=None,
+                detector="contour", ready=None, stop=None, recorder=None):
+    """
+    Run the frame ingestion server until stop is set (or forever)
+
+    Args:
+        host: Interface to bind
+        port: TCP port (0 picks a free port)
+        workers: Detection threads shared by all connections
+        gate_thresholds: Optional gate_frame threshold overrides
+        params: Edge detection parameters (e.g. "adaptive"), as for
+            find_document_corners
+        detector: "contour" or "lines", as for find_document_corners
+        ready: Optional callable receiving the bound port once listening
+        stop: Optional asyncio.Event that shuts the server down
+        recorder: Optional trace.TraceRecorder logging every processed frame
+            (see src.trace for replaying the log as load)
+    """
+    import websockets
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    handler = partial(_handle_connection, executor=executor, gate_thresholds=gate_thresholds,
+                      params=params, detector=detector, recorder=recorder)
+    async with websockets.serve(handler, host, port, max_size=FRAME_HEADER.size + MAX_FRAME_PIXELS,
+                                compression=None) as server:
+        bound_port = next(iter(server.sockets)).getsockname()[1]
+        print(f"Frame server listening on ws://{host}:{bound_port}")
+        if ready is not None:
+            ready(bound_port)
+        await (stop.wait() if stop is not None else asyncio.Future())
+    executor.shutdown()
+
+
+def start_server_thread(host="localhost", port=0, **kwargs):
+    """
+    Run the server on a background thread (for tests and notebooks)
+
+    Args:
+        host: Interface to bind
+        port: TCP port (0 picks a free port)
+        **kwargs: Forwarded to serve()
+
+    Returns:
+        Tuple of (port, stop) where calling stop() shuts the server down
+    """
+    loop = asyncio.new_event_loop()
+    stop_event = None
+    bound = threading.Event()
+    bound_port = []
+
+    def on_ready(port):
+        bound_port.append(port)
+        bound.set()
+
+    def run():
+        nonlocal stop_event
+        asyncio.set_event_loop(loop)
+        stop_event = asyncio.Event()
+        loop.run_until_complete(serve(host, port, stop=stop_event, ready=on_ready, **kwargs))
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    bound.wait()
+
+    def stop():
+        loop.call_soon_threadsafe(stop_event.set)
+        thread.join()
+
+    return bound_port[0], stop
+
+
+class FrameClient:
+    """
+    Minimal blocking client, e.g. for tests or a capture script.
+    """
+
+    def __init__(self, uri):
+        from websockets.sync.client import connect
+        self._stack = ExitStack()
+        self._connection = self._stack.enter_context(connect(uri, max_size=None, compression=None))
+
+    def send(self, gray, frame_id, flags=0):
+        """Send one grayscale frame without waiting for its result"""
+        self._connection.send(encode_frame(gray, frame_id, flags))
+
+    def receive(self, timeout=None):
+        """Next result message, decoded (see decode_result)"""
+        return decode_result(self._connection.recv(timeout))
+
+    def detect(self, gray, frame_id=0, flags=0):
+        """Send one frame and wait for its result"""
+        self.send(gray, frame_id, flags)
+        while True:
+            result = self.receive()
+            if result["frame_id"] == frame_id:
+                return result
+
+    def close(self):
+        self._stack.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="WebSocket frame ingestion server")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Tune edge detection parameters per frame and connection")
+    parser.add_argument("--detector", choices=("contour", "lines"), default="contour")
+    parser.add_argument("--trace", default=None, help="Log every frame to this JSONL trace")
+    parser.add_argument("--trace-sample", type=float, default=0.0,
+                        help="Share of frames stored with the trace for replay")
+    args = parser.parse_args()
+    recorder = None
+    if args.trace:
+        from .trace import TraceRecorder
+        recorder = TraceRecorder(args.trace, args.trace_sample)
+    asyncio.run(serve(args.host, args.port, args.workers,
+                      params="adaptive" if args.adaptive else None, detector=args.detector,
+                      recorder=recorder))
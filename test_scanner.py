@@ -1,12 +1,759 @@
 import os
+import subprocess
 import sys
 
-# Add the src directory to the path
-sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+from src.frame import Frame
+from src.document_scanner import test_scanner, simple_quadrilateral_detection, harris_corner_detection
+from src.hyperparameter_tuning import hyperparameter_tuning, quick_hyperparameter_test
+from src.analysis import analyze_results, visualize_top_results, visualize_quick_results
 
-from document_scanner import test_scanner, simple_quadrilateral_detection, harris_corner_detection
-from hyperparameter_tuning import hyperparameter_tuning, quick_hyperparameter_test
-from analysis import analyze_results, visualize_top_results, visualize_quick_results
+
+# Cold-start budgets (ms) for importing each module in a fresh interpreter
+IMPORT_TIME_BUDGETS_MS = {
+    "FromScratchConvolve2d": 200,
+    "FromScratchGaussianBlur": 200,
+    "FromScratchSobel": 200,
+    "FromScratchHarrisCorners": 200,
+    "src.document_scanner": 350,
+    "src.hyperparameter_tuning": 350,
+    "src.analysis": 350,
+}
+
+# Sample photo shipped with the repository, for checks that need a real frame
+SAMPLE_IMAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "document_1_1752701340839.jpg")
+
+# Optional dependencies that a plain import must not pull in
+LAZY_DEPENDENCIES = ("matplotlib", "scipy", "kagglehub", "PIL", "numba")
+
+
+def measure_import_time(module):
+    """
+    Measure the cumulative import time of a module in a fresh interpreter
+    
+    Args:
+        module: Dotted module name
+        
+    Returns:
+        Tuple of (import_ms, optional dependencies that were imported eagerly)
+    """
+    code = (f"import sys, {module}; "
+            f"print(','.join(m for m in {LAZY_DEPENDENCIES!r} if m in sys.modules))")
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          capture_output=True, text=True, check=True,
+                          cwd=os.path.dirname(os.path.abspath(__file__)))
+    
+    # -X importtime lines look like "import time: self | cumulative | name" (us)
+    import_ms = None
+    for line in proc.stderr.splitlines():
+        fields = [field.strip() for field in line.split("|")]
+        if len(fields) == 3 and fields[2] == module:
+            import_ms = int(fields[1]) / 1000
+    eager = [m for m in proc.stdout.strip().split(",") if m]
+    return import_ms, eager
+
+
+def check_import_budget(budgets=IMPORT_TIME_BUDGETS_MS):
+    """
+    Fail if any module imports slower than its budget or eagerly imports
+    an optional dependency
+    
+    Args:
+        budgets: Dictionary of module name to budget in milliseconds
+    """
+    failures = []
+    for module, budget_ms in budgets.items():
+        import_ms, eager = measure_import_time(module)
+        ok = import_ms <= budget_ms and not eager
+        print(f"{'✓' if ok else '✗'} {module}: {import_ms:.0f} ms (budget {budget_ms} ms)"
+              + (f", eagerly imports {', '.join(eager)}" if eager else ""))
+        if not ok:
+            failures.append(module)
+    assert not failures, f"Import-time budget exceeded: {', '.join(failures)}"
+
+
+def check_gate_blur(width=4000, sigma=15):
+    """
+    Fail if the frame gate accepts a blurred high-resolution frame or
+    rejects the same frame unblurred
+
+    Args:
+        width: Width of the synthetic frame
+        sigma: Gaussian blur applied to the rejected copy, in pixels
+    """
+    import cv2
+    import numpy as np
+    from src.frame_gate import GATE_BLURRY, gate_frame
+
+    # Page of text on a darker background
+    h = width * 3 // 4
+    sharp = np.full((h, width, 3), (60, 90, 120), np.uint8)
+    x0, y0, x1, y1 = width // 5, h // 8, 4 * width // 5, 7 * h // 8
+    cv2.rectangle(sharp, (x0, y0), (x1, y1), (235, 235, 235), -1)
+    scale = width / 1000
+    for y in range(y0 + int(40 * scale), y1 - int(20 * scale), int(28 * scale)):
+        cv2.putText(sharp, "Lorem ipsum dolor sit amet 12345", (x0 + int(20 * scale), y),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6 * scale, (20, 20, 20), int(scale), cv2.LINE_AA)
+    blurred = cv2.GaussianBlur(sharp, (0, 0), sigma)
+
+    accepted, rejected = gate_frame(sharp), gate_frame(blurred)
+    print(f"✓ sharp {width} px frame: {accepted.reason} (blur {accepted.blur:.0f}), "
+          f"sigma {sigma}: {rejected.reason} (blur {rejected.blur:.0f})")
+    assert accepted.accepted, f"Gate rejected a sharp frame: {accepted.reason}"
+    assert rejected.reason == GATE_BLURRY, f"Gate did not reject a blurred frame: {rejected.reason}"
+
+
+def check_tiff_roundtrip(pages=2):
+    """
+    Fail if a multi-page TIFF written by TiffWriter has directory entries
+    out of tag order or does not read back pixel for pixel through Pillow
+    (skipped without Pillow)
+    
+    Args:
+        pages: Number of pages written per compression
+    """
+    import struct
+    import tempfile
+    import cv2
+    import numpy as np
+    from src.output import COMPRESSION_DEFLATE, COMPRESSION_G4, TiffWriter, _pillow
+    
+    Image = _pillow()
+    if Image is None:
+        print("- Pillow not installed, skipping TIFF round trip")
+        return
+    
+    page = np.full((300, 200), 255, np.uint8)
+    for i in range(8):
+        cv2.rectangle(page, (20 + 7 * i, 30 + 31 * i), (60 + 13 * i, 40 + 33 * i), 0, -1)
+    for compression in (COMPRESSION_G4, COMPRESSION_DEFLATE):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "pages.tif")
+            with TiffWriter(path, compression) as writer:
+                for i in range(pages):
+                    writer.add_page(np.roll(page, 10 * i, axis=1))
+            
+            with open(path, "rb") as f:
+                data = f.read()
+            offset = struct.unpack_from("<I", data, 4)[0]
+            while offset:
+                count = struct.unpack_from("<H", data, offset)[0]
+                tags = [struct.unpack_from("<H", data, offset + 2 + 12 * i)[0] for i in range(count)]
+                assert tags == sorted(tags), f"{compression}: unsorted TIFF tags {tags}"
+                offset = struct.unpack_from("<I", data, offset + 2 + 12 * count)[0]
+            
+            with Image.open(path) as img:
+                assert img.n_frames == pages, f"{compression}: read {img.n_frames} of {pages} pages"
+                for i in range(pages):
+                    img.seek(i)
+                    read = np.array(img.convert("L"))
+                    assert np.array_equal(read, np.roll(page, 10 * i, axis=1)), \
+                        f"{compression}: page {i} does not round-trip"
+        print(f"✓ {compression} TIFF: {pages} pages read back through Pillow")
+
+
+def check_ws_ingestion(image_path=SAMPLE_IMAGE, burst=30):
+    """
+    Fail if the WebSocket frame server does not answer a frame with its
+    corners, a burst with dropped frames and a malformed message with
+    STATUS_BAD_FRAME (skipped without websockets)
+    
+    Args:
+        image_path: Image sent as the camera frame
+        burst: Frames sent back to back without waiting for results
+    """
+    import cv2
+    try:
+        import websockets  # noqa: F401
+    except ImportError:
+        print("- websockets not installed, skipping frame server check")
+        return
+    from src.ws_server import (STATUS_BAD_FRAME, STATUS_DROPPED, STATUS_OK, FrameClient,
+                               encode_frame, start_server_thread)
+    
+    gray = cv2.cvtColor(cv2.imread(image_path), cv2.COLOR_BGR2GRAY)
+    gray = cv2.resize(gray, (480, gray.shape[0] * 480 // gray.shape[1]), interpolation=cv2.INTER_AREA)
+    port, stop = start_server_thread()
+    try:
+        with FrameClient(f"ws://localhost:{port}") as client:
+            result = client.detect(gray, frame_id=1)
+            assert result["status"] == STATUS_OK, f"Frame answered with status {result['status']}"
+            assert result["corners"] is not None and result["corners"].shape == (4, 2)
+            
+            # Only the newest pending frame is processed; the rest are dropped
+            first = 100
+            for frame_id in range(first, first + burst):
+                client.send(gray, frame_id)
+            statuses = {}
+            while len(statuses) < burst:
+                result = client.receive(timeout=30)
+                statuses[result["frame_id"]] = result["status"]
+            dropped = sum(status == STATUS_DROPPED for status in statuses.values())
+            assert statuses[first + burst - 1] == STATUS_OK, "Newest frame of the burst was not processed"
+            assert dropped > 0, "No frame of the burst was dropped"
+            
+            # A truncated frame is rejected but keeps its frame id
+            client._connection.send(encode_frame(gray, 7)[:-1])
+            result = client.receive(timeout=30)
+            assert result["frame_id"] == 7 and result["status"] == STATUS_BAD_FRAME, \
+                f"Malformed frame answered with {result}"
+    finally:
+        stop()
+    print(f"✓ frame server: corners returned, {dropped}/{burst} burst frames dropped, "
+          f"malformed frame rejected")
+
+
+def _claim_all(queue_dir, worker_id, n_items, barrier, results):
+    from src.sweep_queue import claim_item
+    barrier.wait()
+    results.put((worker_id, [item for item in range(n_items)
+                             if claim_item(queue_dir, item, worker_id, lease_seconds=60)]))
+
+
+def check_sweep_takeover(n_items=2000):
+    """
+    Fail if two workers racing to take over the same expired claims can
+    both win an item, or if a claim ends up owned by a worker that lost it
+    
+    Args:
+        n_items: Number of expired claims raced for
+    """
+    import json
+    import multiprocessing
+    import tempfile
+    import time
+    from src.sweep_queue import CLAIMS_DIR, DONE_DIR, _claim_path
+    
+    with tempfile.TemporaryDirectory() as queue_dir:
+        os.makedirs(os.path.join(queue_dir, CLAIMS_DIR))
+        os.makedirs(os.path.join(queue_dir, DONE_DIR))
+        expired = time.time() - 3600
+        for item in range(n_items):
+            claim = _claim_path(queue_dir, item)
+            with open(claim, "w") as f:
+                json.dump({"worker": "dead", "claimed_at": expired}, f)
+            os.utime(claim, (expired, expired))
+        
+        ctx = multiprocessing.get_context()
+        barrier, results = ctx.Barrier(2), ctx.Queue()
+        workers = [ctx.Process(target=_claim_all, args=(queue_dir, f"worker-{i}", n_items, barrier, results))
+                   for i in range(2)]
+        for worker in workers:
+            worker.start()
+        won = dict(results.get() for _ in workers)
+        for worker in workers:
+            worker.join()
+        
+        owners = {}
+        for item in range(n_items):
+            with open(_claim_path(queue_dir, item)) as f:
+                owners[item] = json.load(f)["worker"]
+    
+    twice = set(won["worker-0"]) & set(won["worker-1"])
+    winners = {item: worker_id for worker_id, items in won.items() for item in items}
+    wrong = [item for item in range(n_items) if owners[item] != winners.get(item)]
+    print(f"✓ {n_items} expired claims: worker-0 took {len(won['worker-0'])}, "
+          f"worker-1 took {len(won['worker-1'])}")
+    assert not twice, f"Both workers claimed items {sorted(twice)[:10]}"
+    assert not wrong, f"Claims not owned by their winner: {wrong[:10]}"
+
+
+def check_kalman_batched(n_tracks=6, steps=40, seed=0):
+    """
+    Fail if BatchedKalmanFilter drifts from independent KalmanFilter
+    instances, with masked updates and tracks added and removed mid-run,
+    or if steady_state_gain returns silently without converging
+    
+    Args:
+        n_tracks: Number of tracks at the start
+        steps: Number of predict/update steps
+        seed: Random seed for measurements and masks
+    """
+    import importlib.util
+    import warnings
+    import numpy as np
+    
+    # The module name has a hyphen, so it cannot be imported by name
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "kalman-filter.py")
+    spec = importlib.util.spec_from_file_location("kalman_filter", path)
+    kalman = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(kalman)
+    
+    # Constant-velocity corner tracker: state (x, y, vx, vy), measurement (x, y)
+    F = np.eye(4)
+    F[0, 2] = F[1, 3] = 1
+    B = np.zeros((4, 1))
+    H = np.eye(2, 4)
+    Q, R = 0.01 * np.eye(4), 4 * np.eye(2)
+    rng = np.random.default_rng(seed)
+    
+    x0 = rng.uniform(0, 500, (n_tracks, 4))
+    batched = kalman.BatchedKalmanFilter(F, B, H, Q, R, x0, P0=10 * np.eye(4))
+    singles = [kalman.KalmanFilter(F, B, H, Q, R, x.copy(), 10 * np.eye(4)) for x in x0]
+    for step in range(steps):
+        if step == steps // 3:
+            x_new = rng.uniform(0, 500, (3, 4))
+            batched.add_tracks(x_new, P0=np.eye(4))
+            singles += [kalman.KalmanFilter(F, B, H, Q, R, x.copy(), np.eye(4)) for x in x_new]
+        if step == 2 * steps // 3:
+            batched.remove_tracks([0, 4])
+            singles = [f for i, f in enumerate(singles) if i not in (0, 4)]
+        
+        batched.predict()
+        for f in singles:
+            f.predict(np.zeros(1))
+        z = batched.x[:, :2] + rng.normal(0, 2, (len(batched), 2))
+        mask = rng.random(len(batched)) < 0.7
+        batched.update(z, mask=mask)
+        for f, z_i, seen in zip(singles, z, mask):
+            if seen:
+                f.update(z_i)
+        
+        assert len(batched) == len(singles), f"step {step}: {len(batched)} tracks, expected {len(singles)}"
+        assert np.allclose(batched.x, [f.x for f in singles]), f"step {step}: states drifted"
+        assert np.allclose(batched.P, [f.P for f in singles]), f"step {step}: covariances drifted"
+    
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        kalman.steady_state_gain(F, H, Q, R, max_iter=3)
+    assert any(issubclass(w.category, RuntimeWarning) for w in caught), \
+        "steady_state_gain did not warn when it stopped before converging"
+    print(f"✓ batched Kalman filter matches {len(singles)} independent filters over {steps} steps "
+          f"with masked updates and track changes")
+
+
+def check_geometry_batched(n_quads=400, seed=0):
+    """
+    Fail if the batched quad geometry disagrees with the per-quad code it
+    replaced: the legacy corner ordering and output size rule,
+    cv2.getPerspectiveTransform and a per-quad collinearity test
+    
+    Args:
+        n_quads: Number of random quads, a few of them degenerate
+        seed: Random seed
+    """
+    import cv2
+    import numpy as np
+    from src import geometry
+    
+    # Jittered, rotated rectangles in shuffled corner order
+    rng = np.random.default_rng(seed)
+    sizes = rng.uniform(50, 2000, (n_quads, 1, 2))
+    quads = np.array([[0, 0], [1, 0], [1, 1], [0, 1]]) * sizes + rng.normal(0, 15, (n_quads, 4, 2))
+    angle = rng.uniform(-0.3, 0.3, n_quads)
+    rot = np.stack([np.cos(angle), -np.sin(angle), np.sin(angle), np.cos(angle)], axis=1).reshape(-1, 2, 2)
+    quads = quads @ np.swapaxes(rot, 1, 2) + rng.uniform(0, 3000, (n_quads, 1, 2))
+    quads = np.take_along_axis(quads, rng.permuted(np.tile(np.arange(4), (n_quads, 1)), axis=1)[:, :, None], axis=1)
+    # Three collinear corners, and every corner on one point
+    quads[0] = [[10, 10], [110, 10], [210, 10], [60, 200]]
+    quads[1] = [[5, 5]] * 4
+    quads = quads.astype(np.float32)
+    
+    def legacy_order(pts):
+        rect = np.zeros((4, 2), dtype=np.float32)
+        s, diff = pts.sum(axis=1), np.diff(pts, axis=1)
+        rect[0], rect[2] = pts[np.argmin(s)], pts[np.argmax(s)]
+        rect[1], rect[3] = pts[np.argmin(diff)], pts[np.argmax(diff)]
+        return rect
+    
+    def legacy_collinear(pts):
+        edges = np.roll(pts, -1, axis=0) - pts
+        return any(abs(np.cross(edges[i], edges[(i + 1) % 4])) <= 1e-9 for i in range(4))
+    
+    corners, out_sizes, matrices = geometry.warp_targets(quads)
+    degenerate = geometry.is_degenerate(corners)
+    valid = geometry.valid_homographies(matrices)
+    for i, quad in enumerate(quads):
+        rect = legacy_order(quad)
+        assert np.array_equal(corners[i], rect), f"quad {i}: corners ordered differently"
+        assert degenerate[i] == legacy_collinear(rect.astype(np.float64)), f"quad {i}: degeneracy differs"
+        assert valid[i] == (not degenerate[i]), f"quad {i}: homography validity differs"
+        if degenerate[i]:
+            continue
+        width = int(max(np.linalg.norm(rect[0] - rect[1]), np.linalg.norm(rect[3] - rect[2])))
+        height = int(max(np.linalg.norm(rect[0] - rect[3]), np.linalg.norm(rect[1] - rect[2])))
+        assert tuple(out_sizes[i]) == (width, height), f"quad {i}: size {tuple(out_sizes[i])}, expected {(width, height)}"
+        dst = np.float32([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]])
+        M = cv2.getPerspectiveTransform(rect, dst)
+        # Both are solved in double precision but with different solvers,
+        # so compare matrices loosely and where they send the corners tightly
+        mapped = cv2.perspectiveTransform(rect[None].astype(np.float64), matrices[i])[0]
+        assert np.allclose(matrices[i], M, rtol=1e-4, atol=1e-9), f"quad {i}: homography differs"
+        assert np.abs(mapped - dst).max() < 1e-3, f"quad {i}: homography misses the rectangle corners"
+    assert degenerate[:2].all(), "Collinear and zero-area quads were not flagged degenerate"
+    print(f"✓ {n_quads} quads: batched ordering, sizes and homographies match the per-quad code, "
+          f"{int(degenerate.sum())} degenerate")
+
+
+def check_warp_fast_paths(image_path=SAMPLE_IMAGE):
+    """
+    Fail if the crop and affine fast paths of warp_document are not taken
+    for a near axis-aligned and a rotated page, or if their output differs
+    from the full perspective warp beyond interpolation noise
+    
+    Args:
+        image_path: Photo the pages are cut from
+    """
+    import cv2
+    import numpy as np
+    from src import geometry
+    from src.document_scanner import warp_document
+    
+    image = cv2.imread(image_path)
+    h, w = image.shape[:2]
+    # Page off axis by a pixel or two, well inside the default tolerance
+    crop = np.float32([[0.12, 0.14], [0.82, 0.142], [0.821, 0.83], [0.119, 0.829]]) * np.float32([w, h])
+    # Axis-aligned rectangle rotated by 4 degrees about the image center
+    angle = np.radians(4)
+    rot = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+    center = np.array([w / 2, h / 2])
+    rect = np.float32([[0.25, 0.2], [0.75, 0.2], [0.75, 0.8], [0.25, 0.8]]) * [w, h]
+    rotated = ((rect - center) @ rot.T + center).astype(np.float32)
+    
+    for corners, expected, max_mean_diff in ((crop, geometry.WARP_CROP, 2.0),
+                                             (rotated, geometry.WARP_AFFINE, 0.1)):
+        fast_info, full_info = {}, {}
+        fast, fast_scanned = warp_document(image, corners, info=fast_info)
+        full, full_scanned = warp_document(image, corners, fast_path_tolerance=0, info=full_info)
+        assert fast_info["warp_path"] == expected, f"Took {fast_info['warp_path']}, expected {expected}"
+        assert full_info["warp_path"] == geometry.WARP_PERSPECTIVE
+        
+        # The crop rounds its edges to whole pixels, so sizes may differ slightly
+        size_diff = np.abs(np.subtract(fast.shape[:2], full.shape[:2])).max()
+        assert size_diff <= 3, f"{expected}: page {fast.shape[:2]}, perspective gives {full.shape[:2]}"
+        ph, pw = min(fast.shape[0], full.shape[0]), min(fast.shape[1], full.shape[1])
+        mean_diff = np.abs(fast[:ph, :pw].astype(np.int16) - full[:ph, :pw]).mean()
+        mismatch = (fast_scanned[:ph, :pw] != full_scanned[:ph, :pw]).mean()
+        print(f"✓ {expected} path: mean difference {mean_diff:.2f} gray levels, "
+              f"{100 * mismatch:.2f}% of binarized pixels differ")
+        assert mean_diff <= max_mean_diff, f"{expected}: mean difference {mean_diff:.2f} to the perspective warp"
+        assert mismatch <= 0.02, f"{expected}: {100 * mismatch:.2f}% of binarized pixels differ"
+
+
+def check_scheduler_plans(cores=16):
+    """
+    Fail if the scheduler leaves cores idle that could take tasks, if the
+    scan and sweep stage mixes get the same plan where their parallel
+    fractions call for different thread counts, or if a respawned pool
+    worker blocks waiting for a CPU block
+    
+    Args:
+        cores: Core count the plans are made for
+    """
+    import multiprocessing
+    import time
+    from src.scheduler import SCAN_STAGE_MIX, SWEEP_STAGE_MIX, _init_worker, plan_execution
+    
+    for n_tasks in (cores + 1, 40, 100):
+        for mix in (SCAN_STAGE_MIX, SWEEP_STAGE_MIX):
+            plan = plan_execution(n_tasks, mix, cores)
+            assert plan.processes == cores, \
+                f"{n_tasks} tasks on {cores} cores: {plan.processes} processes x {plan.threads_per_process}"
+    
+    # Fewer tasks than cores: one worker per task, with as many threads as
+    # still speed up its stage mix
+    scan, sweep = plan_execution(3, SCAN_STAGE_MIX, cores), plan_execution(3, SWEEP_STAGE_MIX, cores)
+    assert scan.processes == sweep.processes == 3, f"3 tasks got {scan} and {sweep}"
+    assert scan != sweep, f"Scan and sweep mixes got the same plan {scan}"
+    
+    # The pool's CPU blocks are all taken, as after a worker is respawned
+    start = time.perf_counter()
+    _init_worker(None, multiprocessing.get_context().Queue())
+    waited = time.perf_counter() - start
+    assert waited < 5, f"Worker initializer waited {waited:.1f} s for a CPU block"
+    print(f"✓ {cores} cores: {cores + 1}+ tasks use every core; 3 tasks get "
+          f"{scan.threads_per_process} threads per scan worker and {sweep.threads_per_process} per sweep worker")
+
+
+def check_analysis_compat(results_dir="quick_test_results"):
+    """
+    Fail if analyze_results and compare_hyperparameter_effects stop
+    returning what the per-row implementations returned: the summary
+    sorted by quadrilaterals found, and {param: {value: [counts]}}
+    
+    Args:
+        results_dir: Directory holding a hyperparameter_summary.json
+    """
+    import contextlib
+    import io
+    import json
+    import shutil
+    import tempfile
+    import numpy as np
+    from src.analysis import PARAM_NAMES, compare_hyperparameter_effects, parameter_effects, load_results
+    
+    summary_file = os.path.join(results_dir, "hyperparameter_summary.json")
+    if not os.path.exists(summary_file):
+        print(f"- {summary_file} not found, skipping analysis compatibility check")
+        return
+    with open(summary_file) as f:
+        results = json.load(f)
+    
+    # Work on a copy, since both functions write next to the summary
+    with tempfile.TemporaryDirectory() as tmp:
+        shutil.copy(summary_file, tmp)
+        with contextlib.redirect_stdout(io.StringIO()):
+            ranked = analyze_results(tmp)
+            effects = compare_hyperparameter_effects(tmp)
+        stats = parameter_effects(load_results(tmp))
+    
+    expected_ranked = sorted(results, key=lambda x: x['num_quadrilaterals'], reverse=True)
+    assert list(ranked) == expected_ranked, "analyze_results rows differ from the sorted summary"
+    assert ranked[:10] == expected_ranked[:10], "analyze_results top 10 differs from the sorted summary"
+    
+    expected_effects = {}
+    for param in PARAM_NAMES:
+        expected_effects[param] = {}
+        for result in results:
+            expected_effects[param].setdefault(result['parameters'][param], []).append(
+                result['num_quadrilaterals'])
+    assert effects == expected_effects, "compare_hyperparameter_effects grouping differs"
+    assert all(list(effects[param]) == list(expected_effects[param]) for param in PARAM_NAMES), \
+        "compare_hyperparameter_effects orders parameter values differently"
+    for param in PARAM_NAMES:
+        values = sorted(expected_effects[param])
+        assert np.allclose(stats[param]['mean'], [np.mean(expected_effects[param][v]) for v in values])
+        assert np.allclose(stats[param]['std'], [np.std(expected_effects[param][v]) for v in values])
+    print(f"✓ {len(results)} quick sweep rows: analyze_results and compare_hyperparameter_effects "
+          f"match the per-row implementations")
+
+
+def check_line_quad(width=1200, height=900):
+    """
+    Fail if find_line_quad misses a page with straight sides, or if
+    detector="lines" does not fall back to the contour search on an image
+    without straight lines
+    
+    Args:
+        width: Width of the synthetic frames
+        height: Height of the synthetic frames
+    """
+    import cv2
+    import numpy as np
+    from src.document_scanner import find_document_corners
+    from src.line_quad import find_line_quad
+    
+    # Perspective page with a block of text lines on a darker background
+    page = np.float32([[0.22, 0.17], [0.78, 0.22], [0.73, 0.84], [0.18, 0.78]]) * np.float32([width, height])
+    image = np.full((height, width, 3), (70, 90, 110), np.uint8)
+    cv2.fillConvexPoly(image, page.astype(np.int32), (235, 235, 235))
+    for i in range(12):
+        y = int(0.27 * height) + i * height // 26
+        cv2.rectangle(image, (int(0.28 * width), y), (int(0.63 * width) - 8 * i, y + 15), (30, 30, 30), -1)
+    
+    info = {}
+    corners, _ = find_line_quad(image, info=info)
+    assert corners is not None, f"No line quad found on a straight-sided page ({info['segments']} segments)"
+    error = np.abs(corners - page).max()
+    assert error <= 0.01 * width, f"Line quad is {error:.1f} px off the page corners"
+    scan_info = {}
+    find_document_corners(image, info=scan_info, detector="lines")
+    assert scan_info["detector"] == "lines", f"Page found by {scan_info['detector']}, expected lines"
+    
+    # An ellipse has no straight sides to intersect
+    blob = np.full((height, width, 3), (70, 90, 110), np.uint8)
+    cv2.ellipse(blob, (width // 2, height // 2), (width // 4, height // 4), 0, 0, 360, (235, 235, 235), -1)
+    assert find_line_quad(blob)[0] is None, "find_line_quad found a quad on an ellipse"
+    scan_info = {}
+    corners, _ = find_document_corners(blob, info=scan_info, detector="lines")
+    assert corners is not None and scan_info["detector"] == "contour", \
+        f"detector='lines' did not fall back to the contour search: {scan_info}"
+    print(f"✓ line quad within {error:.1f} px of the page; ellipse fell back to the contour search")
+
+
+def check_sources(n_archives=10):
+    """
+    Fail if directory, zip and tar sources are not walked in order, if a
+    reference does not read back the image the walk decoded, if output
+    stems collide, if prefetch() overshoots its byte bound or leaves its
+    producer running when closed early, or if evicted archives stay open
+    
+    Args:
+        n_archives: Zips read one after another to force evictions
+    """
+    import tarfile
+    import tempfile
+    import threading
+    import zipfile
+    import cv2
+    import numpy as np
+    from src import sources
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        # Same base name at several depths, in a zip and in a "tar -C d ." tar
+        root = os.path.join(tmp, "d")
+        os.makedirs(os.path.join(root, "sub"))
+        images = {}
+        for i, name in enumerate(("a.png", "sub/a.png", "zip/a.png", "zip/sub/a.png", "tar/a.png")):
+            image = np.zeros((40 + i, 60, 3), np.uint8)
+            cv2.rectangle(image, (5 * i, 5), (30, 30), (255, 255 - 40 * i, 0), -1)
+            images[name] = image
+        for name in ("a.png", "sub/a.png"):
+            cv2.imwrite(os.path.join(root, name), images[name])
+        with zipfile.ZipFile(os.path.join(root, "pages.zip"), "w") as archive:
+            for name in ("a.png", "sub/a.png"):
+                archive.writestr(name, cv2.imencode(".png", images["zip/" + name])[1].tobytes())
+        member = os.path.join(tmp, "a.png")
+        cv2.imwrite(member, images["tar/a.png"])
+        with tarfile.open(os.path.join(root, "pages.tar.gz"), "w:gz") as archive:
+            archive.add(member, arcname="./a.png")
+        with open(os.path.join(root, "notes.txt"), "w") as f:
+            f.write("not an image")
+        # Explicitly named, so kept despite the unknown extension
+        odd = os.path.join(tmp, "scan")
+        cv2.imwrite(odd + ".png", images["a.png"])
+        os.rename(odd + ".png", odd)
+        
+        walked = list(sources.iter_images([root, odd]))
+        refs = [ref for ref, _ in walked]
+        expected_refs = [os.path.join(root, "a.png"),
+                         os.path.join(root, "pages.tar.gz") + "::./a.png",
+                         os.path.join(root, "pages.zip") + "::a.png",
+                         os.path.join(root, "pages.zip") + "::sub/a.png",
+                         os.path.join(root, "sub", "a.png"),
+                         odd]
+        assert refs == expected_refs, f"Walked {refs}"
+        assert list(sources.iter_refs([root, odd])) == refs, "iter_refs lists other images than iter_images"
+        for (ref, image), name in zip(walked, ("a.png", "tar/a.png", "zip/a.png", "zip/sub/a.png",
+                                               "sub/a.png", "a.png")):
+            assert np.array_equal(image, images[name]), f"{ref} decoded wrongly"
+            assert np.array_equal(sources.read_image(ref), image), f"read_image({ref!r}) differs from the walk"
+        # A reference given as a source reads that one image
+        assert list(sources.iter_refs([refs[2]])) == [refs[2]]
+        
+        seen = {}
+        stems = [sources.unique_stem(sources.source_stem(ref, [root, odd]), seen) for ref in refs]
+        assert stems == ["a", "pages_a", "pages_a_2", "pages_sub_a", "sub_a", "scan"], f"Stems {stems}"
+        
+        # Evicted archives are closed; the most recent ones stay open
+        zips = []
+        for i in range(n_archives):
+            path = os.path.join(tmp, f"z{i}.zip")
+            with zipfile.ZipFile(path, "w") as archive:
+                archive.writestr("a.png", cv2.imencode(".png", images["a.png"])[1].tobytes())
+            zips.append(path)
+        sources.close_archives()
+        opened = []
+        for path in zips:
+            assert sources.read_image(f"{path}::a.png") is not None
+            opened.append(sources._open_archive(path, "zip"))
+        still_open = [archive.fp is not None for archive in opened]
+        sources.close_archives()
+        expected_open = [i >= n_archives - sources.MAX_OPEN_ARCHIVES for i in range(n_archives)]
+        assert still_open == expected_open, f"Open after reading every zip: {still_open}"
+        assert all(archive.fp is None for archive in opened), "close_archives left archives open"
+    
+    # Byte bound: a slow consumer may fall at most one image behind the
+    # producer beyond the one waiting in the queue
+    size = 1 << 20
+    produced, lags = [0], []
+    
+    def frames(count):
+        for i in range(count):
+            produced[0] += 1
+            yield str(i), np.zeros(size, np.uint8)
+    
+    for received, _ in enumerate(sources.prefetch(frames(12), max_items=8, max_bytes=size * 3 // 2), 1):
+        threading.Event().wait(0.01)
+        lags.append(produced[0] - received)
+    assert max(lags) <= 2, f"prefetch ran {max(lags)} images ahead under a {size * 3 // 2}-byte bound"
+    
+    # Closing early stops and joins the producer thread
+    before = threading.active_count()
+    stream = sources.prefetch(frames(1000), max_items=2, max_bytes=None)
+    next(stream)
+    stream.close()
+    assert threading.active_count() == before, "prefetch producer still running after close()"
+    assert produced[0] < 12 + 10, f"prefetch kept producing after close() ({produced[0] - 12} images)"
+    print(f"✓ sources: {len(refs)} images walked and read back, stems {stems}, "
+          f"prefetch ran at most {max(lags)} ahead and stopped on close")
+
+
+def check_workspace_reuse(image_path=SAMPLE_IMAGE, frames=6):
+    """
+    Fail if a workspace keeps allocating once it has seen a resolution, or
+    if scan_batch/scan_stream return pages that alias workspace buffers
+    (and would be overwritten by the next frame)
+    
+    Args:
+        image_path: Photo scanned repeatedly
+        frames: Frames run through one workspace
+    """
+    import tempfile
+    import cv2
+    import numpy as np
+    from src.document_scanner import document_scanner, scan_batch, scan_stream
+    from src.workspace import WORKSPACES, Workspace
+    
+    # Alternate two frames of one resolution, as a camera stream would
+    image = cv2.imread(image_path)
+    variants = (image, np.ascontiguousarray(image[::-1, ::-1]))
+    workspace = Workspace()
+    allocations = []
+    for i in range(frames):
+        document_scanner(variants[i % 2], workspace=workspace)
+        allocations.append(workspace.allocations)
+    assert allocations[-1] == allocations[2], f"Workspace kept allocating: {allocations}"
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i, variant in enumerate(variants):
+            paths.append(os.path.join(tmp, f"page{i}.png"))
+            cv2.imwrite(paths[-1], variant)
+        batch = scan_batch(paths, workspace=True)
+        stream = list(scan_stream(tmp, workspace=True))
+        
+        arenas = list(WORKSPACES.get(image.shape)._arenas.values())
+        for name, results in (("scan_batch", batch), ("scan_stream", stream)):
+            pages = [result["scanned"] for result in results]
+            assert len(pages) == len(variants), f"{name} returned {len(pages)} pages"
+            assert not any(np.shares_memory(page, arena) for page in pages for arena in arenas), \
+                f"{name} returned a page backed by a workspace buffer"
+            assert not np.shares_memory(pages[0], pages[1]), f"{name} returned pages sharing memory"
+            assert not np.array_equal(pages[0], pages[1]), f"{name}: the first page was overwritten"
+    print(f"✓ workspace allocations settled at {allocations[-1]} after {allocations.index(allocations[-1]) + 1} "
+          f"frames; scan_batch and scan_stream return independent pages")
+
+
+def check_trace_replay(image_path=SAMPLE_IMAGE, pages=3):
+    """
+    Fail if a captured trace does not load back with its samples, or if
+    replaying it against the scanner or in batches loses requests
+    
+    Args:
+        image_path: Photo the pages are cut from
+        pages: Distinct images captured
+    """
+    import tempfile
+    import cv2
+    from src.trace import capture, image_hash, load_trace, replay
+    
+    image = cv2.imread(image_path)
+    with tempfile.TemporaryDirectory() as tmp:
+        source_dir = os.path.join(tmp, "pages")
+        os.makedirs(source_dir)
+        expected = {}
+        for i in range(pages):
+            # Distinct crops, so every page gets its own hash and sample
+            page = image[i * 8:, i * 8:]
+            cv2.imwrite(os.path.join(source_dir, f"page{i}.png"), page)
+            expected[image_hash(page)] = page.shape
+        
+        trace_path = os.path.join(tmp, "trace.jsonl")
+        assert capture([source_dir], trace_path, sample_rate=1.0, rate=20) == pages
+        records = load_trace(trace_path)
+        assert len(records) == pages, f"Loaded {len(records)} of {pages} records"
+        assert {r["hash"]: tuple(r["shape"]) for r in records} == expected, "Hashes or shapes changed"
+        for record in records:
+            sample = os.path.join(tmp, record["sample"])
+            assert image_hash(cv2.imread(sample)) == record["hash"], f"Sample {sample} differs"
+        
+        for target in ("scanner", "batch"):
+            report = replay(trace_path, target, speed=10.0, batch_size=2)
+            assert report["requests"] == report["completed"] == pages, \
+                f"{target} replay: {report['completed']}/{report['requests']} ({report['first_error']})"
+            for key in ("latency_ms", "queue_ms", "service_ms"):
+                assert report[key]["p50"] is not None, f"{target} replay has no {key}"
+            print(f"✓ {target} replay: {pages} requests, p50 {report['latency_ms']['p50']:.0f} ms")
 
 
 def main():
@@ -19,49 +766,96 @@ def main():
     print("Document Scanner Test Suite")
     print("=" * 50)
     
-    # Test basic document scanner
-    print("\n1. Testing basic document scanner...")
-    for img_path in test_images:
-        if os.path.exists(img_path):
-            print(f"Processing: {os.path.basename(img_path)}")
-            original, corners_viz, scanned = test_scanner(img_path)
-            if scanned is not None:
-                print("✓ Document scanner completed successfully")
-            break
-    
-    # Test simple quadrilateral detection
-    print("\n2. Testing simple quadrilateral detection...")
-    for img_path in test_images:
-        if os.path.exists(img_path):
-            print(f"Processing: {os.path.basename(img_path)}")
-            quads, result_img = simple_quadrilateral_detection(img_path)
-            print(f"Found {len(quads)} quadrilaterals")
-            break
-    
-    # Test Harris corner detection
-    print("\n3. Testing Harris corner detection...")
-    for img_path in test_images:
-        if os.path.exists(img_path):
-            print(f"Processing: {os.path.basename(img_path)}")
-            corner_img = harris_corner_detection(img_path)
-            if corner_img is not None:
-                print("✓ Harris corner detection completed")
-            break
-    
-    # Test quick hyperparameter tuning
-    print("\n4. Testing quick hyperparameter tuning...")
-    for img_path in test_images:
-        if os.path.exists(img_path):
-            print(f"Running quick test on: {os.path.basename(img_path)}")
-            results, best = quick_hyperparameter_test(img_path)
-            print(f"✓ Quick test completed. Best result: {best['num_quadrilaterals']} quadrilaterals")
-            break
+    # Load the first available test image once; every detector below shares
+    # its cached grayscale, blur and edge images
+    img_path = next((p for p in test_images if os.path.exists(p)), None)
+    frame = Frame.from_path(img_path) if img_path else None
+    
+    if frame is not None:
+        # Test basic document scanner
+        print("\n1. Testing basic document scanner...")
+        print(f"Processing: {os.path.basename(img_path)}")
+        original, corners_viz, scanned = test_scanner(frame)
+        if scanned is not None:
+            print("✓ Document scanner completed successfully")
+        
+        # Test simple quadrilateral detection
+        print("\n2. Testing simple quadrilateral detection...")
+        print(f"Processing: {os.path.basename(img_path)}")
+        quads, result_img = simple_quadrilateral_detection(frame)
+        print(f"Found {len(quads)} quadrilaterals")
+        
+        # Test Harris corner detection
+        print("\n3. Testing Harris corner detection...")
+        print(f"Processing: {os.path.basename(img_path)}")
+        corner_img = harris_corner_detection(frame)
+        if corner_img is not None:
+            print("✓ Harris corner detection completed")
+        
+        # Test quick hyperparameter tuning
+        print("\n4. Testing quick hyperparameter tuning...")
+        print(f"Running quick test on: {os.path.basename(img_path)}")
+        results, best = quick_hyperparameter_test(frame)
+        print(f"✓ Quick test completed. Best result: {best['num_quadrilaterals']} quadrilaterals")
     
     # Analyze results if available
     print("\n5. Analyzing results...")
     if os.path.exists("quick_test_results/hyperparameter_summary.json"):
         visualize_quick_results("quick_test_results")
         print("✓ Quick test analysis completed")
+    check_analysis_compat()
+    
+    # Check that blur rejection holds at high resolution
+    print("\n6. Checking frame gate blur rejection...")
+    check_gate_blur()
+    
+    # Check the WebSocket ingestion protocol end to end
+    print("\n7. Checking WebSocket frame server...")
+    check_ws_ingestion()
+    
+    # Check that racing workers never both take over an expired claim
+    print("\n8. Checking sweep claim takeover...")
+    check_sweep_takeover()
+    
+    # Check that multi-page TIFFs are readable by standard readers
+    print("\n9. Checking TIFF round trip...")
+    check_tiff_roundtrip()
+    
+    # Check that batched tracking matches per-track filters
+    print("\n10. Checking batched Kalman filter...")
+    check_kalman_batched()
+    
+    # Check that batched quad geometry matches the per-quad code
+    print("\n11. Checking batched geometry...")
+    check_geometry_batched()
+    
+    # Check that the warp fast paths agree with the perspective warp
+    print("\n12. Checking warp fast paths...")
+    check_warp_fast_paths()
+    
+    # Check that the scheduler uses every core and follows the stage mix
+    print("\n13. Checking scheduler plans...")
+    check_scheduler_plans()
+    
+    # Check the line-based detector and its contour fallback
+    print("\n14. Checking line quad detector...")
+    check_line_quad()
+    
+    # Check streaming sources, references and prefetch
+    print("\n15. Checking image sources...")
+    check_sources()
+    
+    # Check that workspaces stop allocating and never leak into results
+    print("\n16. Checking workspace reuse...")
+    check_workspace_reuse()
+    
+    # Check that a captured trace loads and replays against each target
+    print("\n17. Checking trace capture and replay...")
+    check_trace_replay()
+    
+    # Check worker cold-start cost
+    print("\n18. Checking import-time budget...")
+    check_import_budget()
     
     print("\nTest suite completed!")
 